@@ -1,12 +1,13 @@
 #encoding: utf-8
 import datetime
-from django.db.models.signals import post_save, pre_delete, post_delete
+from django.db.models.signals import post_save, pre_save, pre_delete, post_delete
 from django.contrib.contenttypes.models import ContentType
 from planet.models import Feed, Post
 from actstream import action
 from actstream.models import Follow
 from knesset.utils import cannonize, disable_for_loaddata
 from agendas.models import AgendaVote, AgendaMeeting, AgendaBill, Agenda
+from laws.models import VoteAction
 from links.models import Link, LinkType
 
 @disable_for_loaddata
@@ -34,6 +35,76 @@ def record_agenda_removal_action(sender, instance, **kwargs):
                 timestamp = datetime.datetime.now())
 pre_delete.connect(record_agenda_removal_action, sender=AgendaVote)
 
+
+def agenda_vote_score_values(agenda_vote):
+    return agenda_vote.agenda_id, agenda_vote.vote_id, agenda_vote.score, agenda_vote.importance
+
+
+@disable_for_loaddata
+def store_agenda_vote_previous_score_values(sender, instance, **kwargs):
+    instance._previous_score_values = None
+    if instance.pk:
+        instance._previous_score_values = AgendaVote.objects.filter(pk=instance.pk).values_list(
+            'agenda_id', 'vote_id', 'score', 'importance').first()
+pre_save.connect(store_agenda_vote_previous_score_values, sender=AgendaVote)
+
+@disable_for_loaddata
+def update_agenda_scores_on_agenda_vote_save(sender, instance, **kwargs):
+    from agendas.scores import AgendaScoreUpdater
+    previous_values = getattr(instance, '_previous_score_values', None)
+    values = agenda_vote_score_values(instance)
+    if previous_values == values:
+        return
+    updater = AgendaScoreUpdater()
+    if previous_values:
+        updater.agenda_votes_changed([previous_values], sign=-1)
+    updater.agenda_votes_changed([values])
+    updater.flush()
+post_save.connect(update_agenda_scores_on_agenda_vote_save, sender=AgendaVote)
+
+@disable_for_loaddata
+def update_agenda_scores_on_agenda_vote_delete(sender, instance, **kwargs):
+    from agendas.scores import AgendaScoreUpdater
+    updater = AgendaScoreUpdater()
+    updater.agenda_votes_changed([agenda_vote_score_values(instance)], sign=-1)
+    updater.flush()
+post_delete.connect(update_agenda_scores_on_agenda_vote_delete, sender=AgendaVote)
+
+
+def vote_action_score_values(vote_action):
+    return vote_action.vote_id, vote_action.member_id, vote_action.party_id, vote_action.type
+
+
+@disable_for_loaddata
+def store_vote_action_previous_score_values(sender, instance, **kwargs):
+    instance._previous_score_values = None
+    if instance.pk:
+        instance._previous_score_values = VoteAction.objects.filter(pk=instance.pk).values_list(
+            'vote_id', 'member_id', 'party_id', 'type').first()
+pre_save.connect(store_vote_action_previous_score_values, sender=VoteAction)
+
+@disable_for_loaddata
+def update_agenda_scores_on_vote_action_save(sender, instance, **kwargs):
+    from agendas.scores import AgendaScoreUpdater
+    previous_values = getattr(instance, '_previous_score_values', None)
+    values = vote_action_score_values(instance)
+    if previous_values == values:
+        return
+    updater = AgendaScoreUpdater()
+    if previous_values:
+        updater.vote_actions_changed([previous_values], sign=-1)
+    updater.vote_actions_changed([values])
+    updater.flush()
+post_save.connect(update_agenda_scores_on_vote_action_save, sender=VoteAction)
+
+@disable_for_loaddata
+def update_agenda_scores_on_vote_action_delete(sender, instance, **kwargs):
+    from agendas.scores import AgendaScoreUpdater
+    updater = AgendaScoreUpdater()
+    updater.vote_actions_changed([vote_action_score_values(instance)], sign=-1)
+    updater.flush()
+post_delete.connect(update_agenda_scores_on_vote_action_delete, sender=VoteAction)
+
 @disable_for_loaddata
 def record_agenda_bill_ascription_action(sender, created, instance, **kwargs):
     if created:
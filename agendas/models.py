@@ -4,17 +4,16 @@ from operator import itemgetter, attrgetter
 from collections import defaultdict
 import math
 
-from django.db import connection
 from django.db import models
-from django.db.models import Sum, Q, Count, F
+from django.db.models import Sum, Q, Count
 from django.utils.translation import ugettext_lazy as _
 
 from django.core.cache import cache
 from django.core.urlresolvers import reverse
-from django.conf import settings
 
 from django.contrib.auth.models import User
 from actstream.models import Follow
+from knesset.utils import chunks
 from laws.models.vote_action import VoteAction
 from laws.models.vote import Vote
 from mks.models import Party, Member, Knesset, Membership
@@ -51,23 +50,10 @@ class UserSuggestedVote(models.Model):
 
 
 class AgendaVoteManager(models.Manager):
-    db_month_trunc_functions = {
-        'sqlite3': {'monthfunc': "strftime('%%Y-%%m-01'", 'nowfunc': 'date()'},
-        'postgresql_psycopg2': {'monthfunc': "date_trunc('month'", 'nowfunc': 'now()'}
-    }
-
     def compute_all(self):
-        db_engine = settings.DATABASES['default']['ENGINE']
-        db_functions = self.db_month_trunc_functions[db_engine.split('.')[-1]]
-        agenda_query = queries.BASE_AGENDA_QUERY % db_functions
-        cursor = connection.cursor()
-        cursor.execute(agenda_query)
-
-        mk_query = queries.BASE_MK_QUERY % db_functions
-        cursor.execute(mk_query)
-
-        party_query = queries.BASE_PARTY_QUERY % db_functions
-        cursor.execute(party_query)
+        """Recalculate all agenda scores and monthly summaries"""
+        from agendas.scores import AgendaScoreUpdater
+        return AgendaScoreUpdater().rebuild()
 
 
 class AgendaVote(models.Model):
@@ -94,59 +80,6 @@ class AgendaVote(models.Model):
     def __unicode__(self):
         return u"%s %s" % (self.agenda, self.vote)
 
-    def update_monthly_counters(self):
-        agendaScore = float(self.score) * float(self.importance)
-        objMonth = dateMonthTruncate(self.vote.time)
-
-        summaryObjects = list(SummaryAgenda.objects.filter(agenda=self.agenda,
-                                                           month=objMonth).all())
-
-        agendaSummary = None
-        if not filter(lambda summary: summary.summary_type == 'AG', summaryObjects):
-            agendaSummary = SummaryAgenda(month=objMonth,
-                                          agenda=self.agenda,
-                                          summary_type='AG',
-                                          score=abs(agendaScore),
-                                          votes=1)
-        else:
-            existingAgenda = filter(lambda summary: summary.summary_type == 'AG', summaryObjects)[0]
-            existingAgenda.votes += 1
-            existingAgenda.score += abs(agendaScore)
-            existingAgenda.save()
-
-        agendasByMk = dict(map(lambda summary: (summary.mk_id, summary),
-                               filter(lambda summary: summary.summary_type == 'MK',
-                                      summaryObjects)))
-        newObjects = []
-        if agendaSummary:
-            newObjects.append(agendaSummary)
-        voters = defaultdict(list)
-        for vote_action in self.vote.actions.all():
-            mkSummary = agendasByMk.get(vote_action.member_id, None)
-            if not mkSummary:
-                mkSummary = SummaryAgenda(month=objMonth,
-                                          agenda=self.agenda,
-                                          summary_type='MK',
-                                          mk_id=vote_action.member_id,
-                                          votes=1,
-                                          score=agendaScore * (1 if vote_action.type == 'for' else -1),
-                                          for_votes=(1 if vote_action.type == 'for' else 0),
-                                          against_votes=(1 if vote_action.type == 'against' else 0))
-                newObjects.append(mkSummary)
-            else:
-                voters[vote_action.type].append(vote_action.member_id)
-
-        SummaryAgenda.objects.filter(agenda=self.agenda, mk_id__in=voters['for'], month=objMonth).update(
-            votes=F('votes') + 1, score=F('score') + agendaScore, for_votes=F('for_votes') + 1)
-        SummaryAgenda.objects.filter(agenda=self.agenda, mk_id__in=voters['against'], month=objMonth).update(
-            votes=F('votes') + 1, score=F('score') - agendaScore, against_votes=F('against_votes') + 1)
-        if newObjects:
-            SummaryAgenda.objects.bulk_create(newObjects)
-
-    def save(self, *args, **kwargs):
-        super(AgendaVote, self).save(*args, **kwargs)
-        self.update_monthly_counters()
-
 
 class AgendaMeeting(models.Model):
     agenda = models.ForeignKey('Agenda', related_name='agendameetings')
@@ -228,8 +161,14 @@ class AgendaManager(models.Manager):
     def get_selected_for_instance(self, instance, user=None, top=3, bottom=3):
         # Returns interesting agendas for model instances such as: member, party
         agendas = list(self.get_relevant_for_user(user))
+        if isinstance(instance, Member):
+            summaries = self.scores_for_member(instance, agendas)
+            for agenda in agendas:
+                agenda.score = summaries[agenda.id]['score']
+        else:
+            for agenda in agendas:
+                agenda.score = agenda.__getattribute__('%s_score' % instance.__class__.__name__.lower())(instance)
         for agenda in agendas:
-            agenda.score = agenda.__getattribute__('%s_score' % instance.__class__.__name__.lower())(instance)
             agenda.significance = agenda.score * agenda.num_followers
         agendas.sort(key=attrgetter('significance'))
         agendas = get_top_bottom(agendas, top, bottom)
@@ -237,6 +176,53 @@ class AgendaManager(models.Manager):
         agendas['bottom'].sort(key=attrgetter('score'), reverse=True)
         return agendas
 
+    def scores_for_member(self, member, agendas):
+        """Returns {agenda id: summary} of a member on many agendas, from the
+        agendas' AgendaScore rows in a single query. A summary has:
+
+        * score - the member's score in the current knesset (as in
+          Agenda.member_score)
+        * votes, for_votes, against_votes - the number of the agenda's votes
+          and the member's votes for and against on them (in all knessets)
+        * totals - the vote counts by type, as returned by
+          Agenda.get_mks_totals
+        """
+        agenda_ids = list(set(agenda.id for agenda in agendas))
+        current_knesset = Knesset.objects.current_knesset()
+        current_knesset_id = current_knesset.id if current_knesset else None
+        # agenda id => [current agenda score, current member score, agenda
+        # votes, member for votes, member against votes]
+        counters = defaultdict(lambda: [0.0, 0.0, 0, 0, 0])
+        for ids in chunks(agenda_ids):
+            rows = AgendaScore.objects.filter(agenda__in=ids).filter(
+                Q(score_type='AG') | Q(score_type='MK', mk=member)).values_list(
+                'agenda_id', 'knesset_id', 'score_type', 'score', 'votes', 'for_votes', 'against_votes')
+            for agenda_id, knesset_id, score_type, score, votes, for_votes, against_votes in rows:
+                agenda_counters = counters[agenda_id]
+                is_current = knesset_id == current_knesset_id
+                if score_type == 'AG':
+                    agenda_counters[0] += score if is_current else 0
+                    agenda_counters[2] += votes
+                else:
+                    agenda_counters[1] += score if is_current else 0
+                    agenda_counters[3] += for_votes
+                    agenda_counters[4] += against_votes
+
+        summaries = {}
+        for agenda_id in agenda_ids:
+            agenda_score, member_score, votes, for_votes, against_votes = counters[agenda_id]
+            totals = [{'type': action_type, 'total': total} for action_type, total in
+                      (('for', for_votes), ('against', against_votes)) if total]
+            totals.append({'type': 'no-vote', 'total': votes - for_votes - against_votes})
+            summaries[agenda_id] = {
+                'score': 100 * member_score / agenda_score if agenda_score > 0 else 0.0,
+                'votes': votes,
+                'for_votes': for_votes,
+                'against_votes': against_votes,
+                'totals': totals,
+            }
+        return summaries
+
     def get_relevant_for_mk(self, mk, agendaId):
         agendas = AgendaVote.objects.filter(agenda__id=agendaId, vote__votes__id=mk).distinct()
         return agendas
@@ -362,43 +348,32 @@ class Agenda(models.Model):
     def get_edit_absolute_url(self):
         return ('agenda-detail-edit', [str(self.id)])
 
+    def _score_totals(self, filters):
+        """Returns a dict of score type => summed score of this agenda's
+        AgendaScore rows matching the given filters"""
+        totals = defaultdict(float)
+        for score_type, score in self.scores.filter(filters).values_list('score_type', 'score'):
+            totals[score_type] += score
+        return totals
+
     def member_score(self, member):
-        values = self.get_mks_values(mks=[member])
-        if values:
-            if len(values) > 1:
-                raise Member.MultipleObjectsReturned
-            return values[0][1]['score']
+        # scores are relative to the agenda's votes in the current knesset
+        totals = self._score_totals(Q(knesset=Knesset.objects.current_knesset()) &
+                                    (Q(score_type='AG') | Q(score_type='MK', mk=member)))
+        if totals['AG'] > 0:
+            return 100 * totals['MK'] / totals['AG']
         else:
             return 0.0
 
     def party_score(self, party):
-        # Since we're already calculating python side, no need to do 2 queries
-        # with joins, select for and against, and calcualte the things
-        qs = AgendaVote.objects.filter(
-            agenda=self, vote__actions__member__in=party.members.all(),
-            vote__actions__type__in=['against', 'for']).extra(
-            select={'weighted_score': 'agendas_agendavote.score*agendas_agendavote.importance'}
-        ).values_list('weighted_score', 'vote__actions__type')
-
-        for_score = 0
-        against_score = 0
-
-        for score, action_type in qs:
-            if action_type == 'against':
-                against_score += score
-            else:
-                for_score += score
-
-        # max_score = sum([abs(x) for x in self.agendavotes.values_list('score', flat=True)]) * party.members.count()
-        # To save the queries, make sure to pass prefetch/select related
-        # Removed the values call, so that we can utilize the prefetched stuf
-        # This reduces the number of queries when called for example from
-        # AgendaResource.dehydrate
-        max_score = sum(abs(x.score * x.importance) for x in
-                        self.agendavotes.all()) * party.number_of_seats
+        # party votes are attributed by the party the members voted as, and
+        # measured against the maximal score all of the party seats could
+        # have achieved on all of the agenda's votes
+        totals = self._score_totals(Q(score_type='AG') | Q(score_type='PR', party=party))
+        max_score = totals['AG'] * (party.number_of_seats or 0)
 
         if max_score > 0:
-            return (for_score - against_score) / max_score * 100
+            return totals['PR'] / max_score * 100
         else:
             return 0.0
 
@@ -496,79 +471,31 @@ class Agenda(models.Model):
         return qs
 
     def get_mks_values(self, ranges=None, mks=None):
+        """Returns the score, rank, volume and vote counts of the members on
+        this agenda in each of the date ranges ([start, end] pairs, with None
+        for an open end). By default the current members are scored over the
+        current knesset.
+
+        For a single range the result is a list of (mk id, values) sorted by
+        rank, otherwise {mk id: [values of each range]}.
+        """
+        from agendas.summaries import agenda_mks_values
         if ranges is None:
             only_current_mks = True
             ranges = [[dateMonthTruncate(Knesset.objects.current_knesset().start_date), None]]
         else:
             only_current_mks = False
-        mks_values = False
-        mk_ids = [mk.id for mk in mks] if mks else []
-
-        fullRange = ranges == [[None, None]]
-        if fullRange:
-            mks_values = cache.get('agenda_%d_mks_values' % self.id)
-            if mks_values and mks:
-                mks_values = [(mk_id, values)
-                              for (mk_id, values) in mks_values
-                              if mk_id in mk_ids]
+        if mks:
+            mk_ids = [mk.id for mk in mks]
+        else:
+            mk_ids = Membership.objects.membership_in_range(ranges, only_current_mks=only_current_mks)
+            if mk_ids is None:  # a range covers all the dates
+                mk_ids = Membership.objects.values_list('member_id', flat=True)
 
-        if not mks_values:
-            # get list of mk ids
-            mk_ids = mk_ids or Membership.objects.membership_in_range(ranges, only_current_mks=only_current_mks)
-
-            # generate summary query
-            filters_folded = self.generateSummaryFilters(ranges, 'month', 'month')
-
-            # query summary
-            baseQuerySet = SummaryAgenda.objects.filter(agenda=self)
-            if filters_folded:
-                baseQuerySet.filter(filters_folded)
-            summaries = list(baseQuerySet)
-            # group summaries for respective ranges
-            summariesForRanges = []
-            for r in ranges:
-                summariesForRange = defaultdict(list)
-                for s in summaries:
-                    if (not r[0] or s.month >= r[0]) and \
-                            (not r[1] or s.month < r[1]):
-                        summariesForRange[s.summary_type].append(s)
-                summariesForRanges.append(summariesForRange)
-
-            # compute agenda measures, store results per MK
-            mk_results = dict(map(lambda mk_id: (mk_id, []), mk_ids))
-            for summaries in summariesForRanges:
-                agenda_data = summaries['AG']
-                total_votes = sum(map(attrgetter('votes'), agenda_data))
-                total_for_votes = sum(map(attrgetter('for_votes'), agenda_data))
-                total_against_votes = sum(map(attrgetter('against_votes'), agenda_data))
-                total_score = sum(map(attrgetter('score'), agenda_data))
-                current_mks_data = indexby(summaries['MK'], attrgetter('mk_id'))
-                # calculate results per mk
-                rangeMkResults = []
-                for mk_id in mk_results.keys():
-                    mk_data = current_mks_data[mk_id]
-                    if mk_data:
-                        mk_votes = sum(map(attrgetter('votes'), mk_data))
-                        mk_for_votes = sum(map(attrgetter('for_votes'), mk_data))
-                        mk_against_votes = sum(map(attrgetter('against_votes'), mk_data))
-                        mk_volume = 100 * mk_votes / total_votes
-                        mk_score = 100 * sum(map(attrgetter('score'), mk_data)) / total_score if total_score != 0 else 0
-                        rangeMkResults.append((mk_id, mk_votes, mk_for_votes, mk_against_votes, mk_score, mk_volume))
-                    else:
-                        rangeMkResults.append(tuple([mk_id] + [0] * 5))
-                # sort results by score descending
-                for rank, (mk_id, mk_votes, mk_for_votes, mk_against_votes, mk_score, mk_volume) in enumerate(
-                        sorted(rangeMkResults, key=itemgetter(4, 0), reverse=True)):
-                    mk_range_data = dict(score=mk_score, rank=rank, volume=mk_volume, numvotes=mk_votes,
-                                         numforvotes=mk_for_votes, numagainstvotes=mk_against_votes)
-                    if len(ranges) == 1:
-                        mk_results[mk_id] = mk_range_data
-                    else:
-                        mk_results[mk_id].append(mk_range_data)
-            if fullRange:
-                cache.set('agenda_%d_mks_values' % self.id, mks_values, 1800)
+        mk_results = agenda_mks_values(self.id, ranges, mk_ids)
         if len(ranges) == 1:
-            mk_results = sorted(mk_results.items(), key=lambda (k, v): v['rank'])
+            return sorted(((mk_id, values[0]) for mk_id, values in mk_results.items()),
+                          key=lambda (k, v): v['rank'])
         return mk_results
 
     def get_mks_values_old(self, knesset_number=None):
@@ -648,6 +575,32 @@ class SummaryAgenda(models.Model):
         self.votes)
 
 
+SCORE_TYPES = (
+    ('AG', 'Agenda Votes'),
+    ('MK', 'MK Counter'),
+    ('PR', 'Party Counter'),
+)
+
+
+class AgendaScore(models.Model):
+    """Running totals of an agenda's votes in a knesset, kept up to date by
+    agendas.scores.AgendaScoreUpdater"""
+    agenda = models.ForeignKey(Agenda, related_name='scores')
+    knesset = models.ForeignKey(Knesset, blank=True, null=True, related_name='agenda_scores')
+    score_type = models.CharField(max_length=2, choices=SCORE_TYPES)
+    score = models.FloatField(default=0.0)
+    votes = models.BigIntegerField(default=0)
+    for_votes = models.BigIntegerField(default=0)
+    against_votes = models.BigIntegerField(default=0)
+    mk = models.ForeignKey(Member, blank=True, null=True, related_name='agenda_scores')
+    party = models.ForeignKey(Party, blank=True, null=True, related_name='agenda_scores')
+
+    def __unicode__(self):
+        return "%s %s %s %s (%f,%d)" % (
+            str(self.agenda_id), str(self.knesset_id), self.score_type,
+            str(self.mk_id or self.party_id or u'n/a'), self.score, self.votes)
+
+
 from listeners import *
 
 
@@ -1,183 +1,62 @@
-from django.db import connection, transaction
+from collections import defaultdict
+from django.db import connection
+from django.db.models import Sum
 from itertools import groupby
 from operator import itemgetter
 
+
+def _percent(value, total):
+    return round(100.0 * value / total, 2) if total else 0.0
+
+
+def _summed_scores(score_type, owner=None):
+    """Returns (agenda_id, [owner_id,] score, votes) rows of the agenda
+    score totals of the given type, summed over all knessets"""
+    from agendas.models import AgendaScore
+    group_by = ['agenda'] + ([owner] if owner else [])
+    return AgendaScore.objects.filter(score_type=score_type).order_by().values(*group_by).annotate(
+        total_score=Sum('score'), total_votes=Sum('votes')).values_list(*(group_by + ['total_score', 'total_votes']))
+
+
+def getAgendaTotals():
+    """Returns a dict of agenda id => (total absolute score, number of votes)
+    for all the agendas that have votes"""
+    return dict((agenda_id, (score, votes)) for agenda_id, score, votes in _summed_scores('AG') if votes)
+
+
 def getAllAgendaPartyVotes():
-    from mks.models import Knesset
-    cursor = connection.cursor()
-    cursor.execute(CURRENT_KNESSET_PARTY_QUERY.format(current_knesset_id=Knesset.objects.current_knesset().pk))
-    results = dict(map(lambda (key,group):(key,map(lambda g:(g[1],float(g[2]),float(g[3])),list(group))),
-                       groupby(cursor.fetchall(),key=itemgetter(0))))
-    return results
+    from mks.models import Party
+    party_seats = dict(Party.current_knesset.values_list('id', 'number_of_seats'))
+    party_totals = defaultdict(dict)
+    for agenda_id, party_id, score, votes in _summed_scores('PR', 'party'):
+        if party_id in party_seats:
+            party_totals[agenda_id][party_id] = (score, votes)
 
-CURRENT_KNESSET_PARTY_QUERY = """
-SELECT a.agendaid,
-       a.partyid,
-       round(coalesce(cast(coalesce(v.totalvotevalue,0.0)/(case when a.totalscore = 0 then 1 else a.totalscore end)*100.0 as numeric),0.0),2) score,
-       round(coalesce(cast(coalesce(v.numvotes,0.0)/a.totalvolume*100.0 as numeric),0.0),2) volume
-FROM   (SELECT agid                   agendaid,
-               m.id                   partyid,
-               sc * m.number_of_seats totalscore,
-               numvotes * m.number_of_seats totalvolume
-        FROM   (SELECT agenda_id               agid,
-                       SUM(abs(score * importance)) sc,
-                       COUNT(*) numvotes
-                FROM   agendas_agendavote
-                GROUP  BY agenda_id) agendavalues
-               left outer join (select * from mks_party where knesset_id={current_knesset_id}) m
-                 on 1=1) a
-       left outer join (SELECT agenda_id,
-                          partyid,
-                          SUM(forvotes) - SUM(againstvotes) totalvotevalue ,
-                          SUM(numvotes) numvotes
-                   FROM   (SELECT a.agenda_id,
-                                  p.partyid,
-                                  CASE p.vtype
-                                    WHEN 'for' THEN p.numvotes * a.VALUE
-                                    ELSE 0
-                                  END forvotes,
-                                  CASE p.vtype
-                                    WHEN 'against' THEN p.numvotes * a.VALUE
-                                    ELSE 0
-                                  END againstvotes,
-                                  p.numvotes numvotes
-                           FROM   (SELECT m.current_party_id      partyid,
-                                          v.vote_id voteid,
-                                          v.TYPE    vtype,
-                                          COUNT(*)  numvotes
-                                   FROM   laws_voteaction v
-                                          inner join mks_member m
-                                            ON v.member_id = m.id
-                                   WHERE  v.TYPE IN ( 'for', 'against' )
-                                   GROUP  BY m.current_party_id,
-                                             v.vote_id,
-                                             v.TYPE) p
-                                  inner join (SELECT vote_id,
-                                                     agenda_id,
-                                                     score * importance as VALUE
-                                              FROM   agendas_agendavote) a
-                                    ON p.voteid = a.vote_id) b
-                   GROUP  BY agenda_id,
-                             partyid
-                             ) v
-         ON a.agendaid = v.agenda_id
-            AND a.partyid = v.partyid
-ORDER BY agendaid,score desc"""
+    results = {}
+    for agenda_id, (total_score, total_votes) in getAgendaTotals().items():
+        party_values = []
+        for party_id, seats in party_seats.items():
+            score, votes = party_totals[agenda_id].get(party_id, (0.0, 0))
+            seats = seats or 0
+            party_values.append((party_id, _percent(score, total_score * seats), _percent(votes, total_votes * seats)))
+        results[agenda_id] = sorted(party_values, key=itemgetter(1), reverse=True)
+    return results
 
-PARTY_QUERY = """
-SELECT a.agendaid,
-       a.partyid,
-       round(coalesce(cast(coalesce(v.totalvotevalue,0.0)/(case when a.totalscore = 0 then 1 else a.totalscore end)*100.0 as numeric),0.0),2) score,
-       round(coalesce(cast(coalesce(v.numvotes,0.0)/a.totalvolume*100.0 as numeric),0.0),2) volume
-FROM   (SELECT agid                   agendaid,
-               m.id                   partyid,
-               sc * m.number_of_seats totalscore,
-               numvotes * m.number_of_seats totalvolume
-        FROM   (SELECT agenda_id               agid,
-                       SUM(abs(score * importance)) sc,
-                       COUNT(*) numvotes
-                FROM   agendas_agendavote
-                GROUP  BY agenda_id) agendavalues
-               left outer join mks_party m
-                 on 1=1) a
-       left outer join (SELECT agenda_id, 
-                          partyid, 
-                          SUM(forvotes) - SUM(againstvotes) totalvotevalue ,
-                          SUM(numvotes) numvotes
-                   FROM   (SELECT a.agenda_id, 
-                                  p.partyid, 
-                                  CASE p.vtype 
-                                    WHEN 'for' THEN p.numvotes * a.VALUE 
-                                    ELSE 0 
-                                  END forvotes, 
-                                  CASE p.vtype 
-                                    WHEN 'against' THEN p.numvotes * a.VALUE 
-                                    ELSE 0 
-                                  END againstvotes,
-                                  p.numvotes numvotes
-                           FROM   (SELECT m.current_party_id      partyid, 
-                                          v.vote_id voteid, 
-                                          v.TYPE    vtype, 
-                                          COUNT(*)  numvotes 
-                                   FROM   laws_voteaction v 
-                                          inner join mks_member m 
-                                            ON v.member_id = m.id 
-                                   WHERE  v.TYPE IN ( 'for', 'against' ) 
-                                   GROUP  BY m.current_party_id, 
-                                             v.vote_id, 
-                                             v.TYPE) p 
-                                  inner join (SELECT vote_id, 
-                                                     agenda_id, 
-                                                     score * importance as VALUE 
-                                              FROM   agendas_agendavote) a 
-                                    ON p.voteid = a.vote_id) b  
-                   GROUP  BY agenda_id, 
-                             partyid 
-                             ) v 
-         ON a.agendaid = v.agenda_id 
-            AND a.partyid = v.partyid 
-ORDER BY agendaid,score desc"""
 
 def agendas_mks_grade():
-    cursor = connection.cursor()
-    cursor.execute(MK_QUERY)
-    results = dict(map(lambda (key,group):(key,map(lambda g:(g[1],float(g[2]),float(g[3]),int(g[4])),list(group))),
-                       groupby(cursor.fetchall(),key=itemgetter(0))))
+    mk_totals = defaultdict(list)
+    for agenda_id, mk_id, score, votes in _summed_scores('MK', 'mk'):
+        if votes:
+            mk_totals[agenda_id].append((mk_id, score, votes))
+
+    results = {}
+    for agenda_id, (total_score, total_votes) in getAgendaTotals().items():
+        results[agenda_id] = sorted(
+            [(mk_id, _percent(score, total_score), _percent(votes, total_votes), int(votes))
+             for mk_id, score, votes in mk_totals[agenda_id]],
+            key=itemgetter(1), reverse=True)
     return results
 
-MK_QUERY = """
-SELECT a.agendaid, 
-       v.memberid, 
-       Round(Coalesce(CAST(Coalesce(v.totalvotevalue, 0.0) / (case when a.totalscore = 0 then 1 else a.totalscore end) * 100.0 AS 
-                  NUMERIC),0.0), 2 
-       ) score,
-       Round(Coalesce(CAST(Coalesce(v.numvotes,0.0) / (case when a.numvotes = 0 then 1 else a.numvotes end) * 100.0 AS
-                  NUMERIC),0.0), 2
-       ) volume,
-       CAST(Coalesce(v.numvotes,0) AS NUMERIC) numvotes 
-FROM   (SELECT agenda_id                    agendaid, 
-               SUM(Abs(score * importance)) totalscore,
-               COUNT(*) numvotes
-        FROM   agendas_agendavote 
-        GROUP  BY agenda_id) a 
-       LEFT OUTER JOIN (SELECT agenda_id, 
-                               memberid, 
-                               SUM(forvotes) - SUM(againstvotes) totalvotevalue,
-                               SUM(numvotes) numvotes
-                        FROM   (SELECT a.agenda_id, 
-                                       p.memberid, 
-                                       CASE p.vtype 
-                                         WHEN 'for' THEN p.numvotes * a.VALUE 
-                                         ELSE 0 
-                                       END forvotes, 
-                                       CASE p.vtype 
-                                         WHEN 'against' THEN 
-                                         p.numvotes * a.VALUE 
-                                         ELSE 0 
-                                       END againstvotes, 
-                                       p.numvotes numvotes 
-                                FROM   (SELECT m.id      memberid, 
-                                               v.vote_id voteid, 
-                                               v.TYPE    vtype, 
-                                               COUNT(*)  numvotes 
-                                        FROM   laws_voteaction v 
-                                               INNER JOIN mks_member m 
-                                                 ON v.member_id = m.id 
-                                        WHERE  v.TYPE IN ( 'for', 'against' ) 
-                                        GROUP  BY m.id, 
-                                                  v.vote_id, 
-                                                  v.TYPE) p 
-                                       INNER JOIN (SELECT vote_id, 
-                                                          agenda_id, 
-                                                          score * importance AS 
-                                                          VALUE 
-                                                   FROM   agendas_agendavote) a 
-                                         ON p.voteid = a.vote_id) b 
-                        GROUP  BY agenda_id, 
-                                  memberid) v 
-         ON a.agendaid = v.agenda_id 
-ORDER  BY agendaid, 
-          score DESC""" 
 
 def getAgendaEditorIds():
     cursor = connection.cursor()
@@ -185,132 +64,3 @@ def getAgendaEditorIds():
     results = dict(map(lambda (key,group):(key,map(itemgetter(1),list(group))),
                        groupby(cursor.fetchall(),key=itemgetter(0))))
     return results
-
-BASE_AGENDA_QUERY = """ 
-INSERT INTO agendas_summaryagenda (month,summary_type,agenda_id,score,votes,for_votes,against_votes,db_created,db_updated)
-SELECT  %(monthfunc)s,v.time) as month,
-        'AG' as summary_type,
-        a.agenda_id               agid,
-        SUM(abs(a.score * a.importance)) sc,
-        COUNT(*) numvotes,
-        COUNT(*) numforvotes,
-        COUNT(*) numagainstvotes,
-        %(nowfunc)s,%(nowfunc)s
-FROM   agendas_agendavote a
-INNER JOIN laws_vote v ON a.vote_id = v.id
-GROUP  BY %(monthfunc)s,v.time),a.agenda_id """
-
-BASE_MK_QUERY = """
-INSERT INTO agendas_summaryagenda (summary_type,agenda_id,mk_id,month,score,votes,for_votes,against_votes,db_created,db_updated)
-SELECT 'MK' as summary_type,
-       agenda_id,
-       memberid,
-       %(monthfunc)s,time) as month,
-       SUM(forvotes) - SUM(againstvotes) totalvotevalue,
-       SUM(numvotes) numvotes,
-       SUM(numforvotes) numforvotes,
-       SUM(numagainstvotes) numagainstvotes,
-       %(nowfunc)s,%(nowfunc)s
-FROM
-  (SELECT a.agenda_id,
-          p.memberid,
-          a.time,
-          CASE p.vtype
-              WHEN 'for' THEN a.VALUE
-              ELSE 0
-          END forvotes,
-          CASE p.vtype
-              WHEN 'against' THEN a.VALUE
-              ELSE 0
-          END againstvotes,
-          1 as numvotes,
-          CASE p.vtype
-              WHEN 'for' THEN 1
-              ELSE 0
-          END numforvotes,
-          CASE p.vtype
-              WHEN 'against' THEN 1
-              ELSE 0
-          END numagainstvotes          
-   FROM
-     (SELECT DISTINCT
-             m.id memberid,
-             v.vote_id voteid,
-             v.TYPE vtype
-      FROM laws_voteaction v
-      INNER JOIN mks_member m ON v.member_id = m.id
-      WHERE v.TYPE IN ('for',
-                       'against')
-      GROUP BY m.id,
-               v.vote_id,
-               v.TYPE) p
-   INNER JOIN
-     (SELECT a.vote_id,
-             a.agenda_id,
-             a.score * a.importance AS VALUE,
-             v.time as time
-      FROM agendas_agendavote a
-      JOIN laws_vote v ON a.vote_id = v.id
-) a ON p.voteid = a.vote_id) b
-GROUP BY agenda_id,
-         memberid,
-         %(monthfunc)s,time)
-"""
-
-BASE_PARTY_QUERY = """
-INSERT INTO agendas_summaryagenda (summary_type,agenda_id,party_id,month,score,votes,for_votes,against_votes,db_created,db_updated)
-SELECT 'PR' as summary_type,
-       agenda_id,
-       partyid,
-       %(monthfunc)s,time) as month,
-       SUM(forvotes) - SUM(againstvotes) totalvotevalue,
-       SUM(numvotes) numvotes,
-       SUM(numforvotes) numforvotes,
-       SUM(numagainstvotes) numagainstvotes,
-       %(nowfunc)s,%(nowfunc)s
-FROM
-  (SELECT a.agenda_id,
-          p.partyid,
-          a.time,
-          a.vote_id,
-          CASE p.vtype
-              WHEN 'for' THEN a.VALUE*p.numoccurences
-              ELSE 0
-          END forvotes,
-          CASE p.vtype
-              WHEN 'against' THEN a.VALUE*p.numoccurences
-              ELSE 0
-          END againstvotes,
-          p.numoccurences as numvotes,
-          CASE p.vtype
-              WHEN 'for' THEN p.numoccurences
-              ELSE 0
-          END numforvotes,
-          CASE p.vtype
-            WHEN 'against' THEN p.numoccurences
-              ELSE 0
-          END numagainstvotes          
-    FROM
-     (SELECT v.party_id partyid,
-             v.vote_id voteid,
-             v.TYPE vtype,
-             count(*) numoccurences
-      FROM laws_voteaction v
-      WHERE v.TYPE IN ('for',
-                       'against')
-       GROUP BY v.party_id,
-               v.vote_id,
-               v.TYPE) p
-   INNER JOIN
-     (SELECT a.vote_id,
-             a.agenda_id,
-             a.score * a.importance AS VALUE,
-             v.time as time
-      FROM agendas_agendavote a
-      JOIN laws_vote v ON a.vote_id = v.id) a ON p.voteid = a.vote_id
-      ) b
-GROUP BY agenda_id,
-         partyid,
-         %(monthfunc)s,time)
-"""
-
@@ -0,0 +1,201 @@
+# encoding: utf-8
+"""
+Incremental agenda scoring.
+
+AgendaScoreUpdater turns changes in agenda votes and vote actions into deltas
+of the agenda's running totals - per knesset in AgendaScore and per month in
+SummaryAgenda - and writes them with a few grouped queries, instead of
+re-aggregating the whole vote actions table.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F
+
+from agendas.models import AgendaVote, AgendaScore, SummaryAgenda, dateMonthTruncate
+from agendas.summaries import invalidate_agenda_summaries
+from knesset.utils import QUERY_CHUNK_SIZE, chunks
+from laws.models import Vote, VoteAction
+from mks.models import Knesset
+import logging
+
+logger = logging.getLogger("open-knesset.agendas.scores")
+
+SCORE_FIELDS = ('score', 'votes', 'for_votes', 'against_votes')
+
+# the field holding the owner of each summary type's rows
+OWNER_FIELDS = {
+    'AG': None,
+    'MK': 'mk_id',
+    'PR': 'party_id',
+}
+
+def _new_delta():
+    return [0.0, 0, 0, 0]
+
+
+def action_delta(weight, action_type):
+    """Returns the SCORE_FIELDS delta of a single vote action on an agenda
+    vote with the given weight (score * importance)"""
+    if action_type == 'for':
+        return weight, 1, 1, 0
+    if action_type == 'against':
+        return -weight, 1, 0, 1
+    return None
+
+
+class AgendaScoreUpdater(object):
+    """Accumulates agenda score deltas and writes them on flush().
+
+    Deltas are kept in memory, so many changes can be collected and written
+    together::
+
+        updater = AgendaScoreUpdater()
+        updater.agenda_votes_changed(added_agenda_votes)
+        updater.agenda_votes_changed(removed_agenda_votes, sign=-1)
+        updater.flush()
+    """
+
+    def __init__(self):
+        self._knessets = None
+        self.reset()
+
+    def reset(self):
+        # (score_type, agenda_id, knesset_id, owner_id) => SCORE_FIELDS delta
+        self._score_deltas = defaultdict(_new_delta)
+        # (summary_type, agenda_id, month, owner_id) => SCORE_FIELDS delta
+        self._summary_deltas = defaultdict(_new_delta)
+
+    def knesset_at(self, a_date):
+        if self._knessets is None:
+            self._knessets = list(Knesset.objects.exclude(start_date=None).order_by('-start_date').values_list(
+                'number', 'start_date'))
+        for number, start_date in self._knessets:
+            if start_date <= a_date:
+                return number
+        return None
+
+    def _add(self, summary_type, agenda_id, vote_time, owner_id, delta, sign):
+        deltas = [self._score_deltas[(summary_type, agenda_id, self.knesset_at(vote_time.date()), owner_id)]]
+        if summary_type != 'PR':
+            deltas.append(self._summary_deltas[(summary_type, agenda_id, dateMonthTruncate(vote_time), owner_id)])
+        for counters in deltas:
+            for i, value in enumerate(delta):
+                counters[i] += sign * value
+
+    def add_agenda_vote(self, agenda_id, vote_time, weight, actions, sign=1):
+        """Add (or with sign=-1 remove) an agenda vote and its vote actions.
+
+        actions is an iterable of (member_id, party_id, type) tuples.
+        """
+        self._add('AG', agenda_id, vote_time, None, (abs(weight), 1, 0, 0), sign)
+        self.add_vote_actions(agenda_id, vote_time, weight, actions, sign)
+
+    def add_vote_actions(self, agenda_id, vote_time, weight, actions, sign=1):
+        """Add (or with sign=-1 remove) vote actions of a vote ascribed to the
+        agenda with the given weight"""
+        for member_id, party_id, action_type in actions:
+            delta = action_delta(weight, action_type)
+            if delta is None:
+                continue
+            self._add('MK', agenda_id, vote_time, member_id, delta, sign)
+            if party_id:
+                self._add('PR', agenda_id, vote_time, party_id, delta, sign)
+
+    def _load_votes(self, vote_ids):
+        """Returns vote times and for/against actions of the given votes"""
+        vote_times = {}
+        vote_actions = defaultdict(list)
+        vote_ids = list(set(vote_ids))
+        for ids in chunks(vote_ids):
+            vote_times.update(Vote.objects.filter(id__in=ids).values_list('id', 'time'))
+            for vote_id, member_id, party_id, action_type in VoteAction.objects.filter(
+                    vote__in=ids, type__in=('for', 'against')).values_list('vote_id', 'member_id', 'party_id',
+                                                                         'type'):
+                vote_actions[vote_id].append((member_id, party_id, action_type))
+        return vote_times, vote_actions
+
+    def agenda_votes_changed(self, agenda_votes, sign=1):
+        """agenda_votes is an iterable of (agenda_id, vote_id, score,
+        importance) tuples that were added (or with sign=-1 removed)"""
+        agenda_votes = list(agenda_votes)
+        vote_times, vote_actions = self._load_votes([agenda_vote[1] for agenda_vote in agenda_votes])
+        for agenda_id, vote_id, score, importance in agenda_votes:
+            if vote_id not in vote_times:  # the vote is being deleted
+                continue
+            self.add_agenda_vote(agenda_id, vote_times[vote_id], float(score) * float(importance),
+                                 vote_actions[vote_id], sign)
+
+    def vote_actions_changed(self, vote_actions, sign=1):
+        """vote_actions is an iterable of (vote_id, member_id, party_id, type)
+        tuples that were added (or with sign=-1 removed)"""
+        actions_by_vote = defaultdict(list)
+        for vote_id, member_id, party_id, action_type in vote_actions:
+            actions_by_vote[vote_id].append((member_id, party_id, action_type))
+        agenda_votes = AgendaVote.objects.filter(vote__in=actions_by_vote.keys()).values_list(
+            'agenda_id', 'vote_id', 'vote__time', 'score', 'importance')
+        for agenda_id, vote_id, vote_time, score, importance in agenda_votes:
+            self.add_vote_actions(agenda_id, vote_time, float(score) * float(importance),
+                                  actions_by_vote[vote_id], sign)
+
+    @transaction.atomic
+    def flush(self, fresh=False):
+        """Write the accumulated deltas.
+
+        With fresh=True the tables are assumed to be empty and the deltas
+        are inserted without looking for existing rows.
+        """
+        self._write_deltas(AgendaScore, 'score_type', 'knesset_id', self._score_deltas, fresh)
+        self._write_deltas(SummaryAgenda, 'summary_type', 'month', self._summary_deltas, fresh)
+        invalidate_agenda_summaries(set(key[1] for key in self._summary_deltas))
+        self.reset()
+
+    @staticmethod
+    def _write_deltas(model, type_field, period_field, deltas, fresh):
+        # rows that change by the same delta are updated together
+        grouped = defaultdict(list)
+        for (summary_type, agenda_id, period, owner_id), delta in deltas.items():
+            if any(delta):
+                grouped[(summary_type, agenda_id, period, tuple(delta))].append(owner_id)
+
+        new_rows = []
+        for (summary_type, agenda_id, period, delta), owner_ids in grouped.items():
+            owner_field = OWNER_FIELDS[summary_type]
+            rows = model.objects.filter(**{type_field: summary_type, 'agenda': agenda_id, period_field: period})
+            update = dict((field, F(field) + value) for field, value in zip(SCORE_FIELDS, delta) if value)
+            for ids in chunks(owner_ids):
+                existing = set()
+                if not fresh:
+                    if owner_field:
+                        owner_rows = rows.filter(**{owner_field + '__in': ids})
+                        existing = set(owner_rows.values_list(owner_field, flat=True))
+                    else:
+                        owner_rows = rows
+                        existing = set([None]) if rows.exists() else set()
+                    if existing:
+                        owner_rows.update(**update)
+                # removals of rows that are already gone (e.g. when deleting
+                # an agenda) should not leave negative rows behind
+                if delta[1] <= 0:
+                    continue
+                for owner_id in ids:
+                    if owner_id not in existing:
+                        row = model(agenda_id=agenda_id, **dict(zip(SCORE_FIELDS, delta)))
+                        setattr(row, type_field, summary_type)
+                        setattr(row, period_field, period)
+                        if owner_field:
+                            setattr(row, owner_field, owner_id)
+                        new_rows.append(row)
+        model.objects.bulk_create(new_rows, batch_size=QUERY_CHUNK_SIZE)
+
+    @transaction.atomic
+    def rebuild(self):
+        """Recalculate all agenda scores and monthly summaries from scratch"""
+        self.reset()
+        AgendaScore.objects.all().delete()
+        SummaryAgenda.objects.all().delete()
+        agenda_votes = list(AgendaVote.objects.values_list('agenda_id', 'vote_id', 'score', 'importance'))
+        for chunk in chunks(agenda_votes):
+            self.agenda_votes_changed(chunk)
+        self.flush(fresh=True)
+        return len(agenda_votes)
@@ -0,0 +1,145 @@
+# encoding: utf-8
+"""
+Date range queries over the monthly agenda summaries.
+
+AgendaMonthlyTotals loads the SummaryAgenda rows of an agenda once and keeps,
+for the agenda and for each member, the running (cumulative) totals of the
+months in order. The totals of any range of months are then the difference
+of two running totals, so the member scores of any list of date ranges are
+computed without scanning the summaries again.
+
+Both the monthly totals and the computed member values are cached. The
+cache keys include a per agenda version that AgendaScoreUpdater bumps when it
+changes the agenda's summaries.
+"""
+from bisect import bisect_left
+from operator import itemgetter
+import hashlib
+import time
+
+from django.core.cache import cache
+
+from agendas.models import SummaryAgenda
+import logging
+
+logger = logging.getLogger("open-knesset.agendas.summaries")
+
+CACHE_TIME = 1800
+# the summed SummaryAgenda fields, in the order of the totals tuples
+TOTAL_FIELDS = ('score', 'votes', 'for_votes', 'against_votes')
+NO_TOTALS = (0.0, 0, 0, 0)
+
+
+def _version_key(agenda_id):
+    return 'agenda_%d_summaries_version' % agenda_id
+
+
+def summaries_version(agenda_id):
+    version = cache.get(_version_key(agenda_id))
+    if version is None:
+        version = '%f' % time.time()
+        cache.set(_version_key(agenda_id), version)
+    return version
+
+
+def invalidate_agenda_summaries(agenda_ids):
+    """Drops the cached totals and member values of the given agendas"""
+    version = '%f' % time.time()
+    cache.set_many(dict((_version_key(agenda_id), version) for agenda_id in agenda_ids))
+
+
+def _values_key(ranges, mk_ids):
+    ranges = [[value and value.strftime('%Y%m%d') for value in r] for r in ranges]
+    return hashlib.md5(repr((ranges, sorted(mk_ids)))).hexdigest()
+
+
+class AgendaMonthlyTotals(object):
+    """The running monthly totals of an agenda and of its members"""
+
+    def __init__(self, agenda_id, rows):
+        """rows are (month, summary_type, mk_id) + TOTAL_FIELDS tuples"""
+        self.agenda_id = agenda_id
+        self.months = sorted(set(row[0] for row in rows))
+        month_index = dict((month, i) for i, month in enumerate(self.months))
+        # owner (None for the agenda, otherwise the member id) => month
+        # index => totals
+        monthly = {}
+        for row in rows:
+            month, summary_type, mk_id = row[:3]
+            owner = None if summary_type == 'AG' else mk_id
+            owner_months = monthly.setdefault(owner, {})
+            i = month_index[month]
+            totals = owner_months.get(i, NO_TOTALS)
+            owner_months[i] = tuple(total + value for total, value in zip(totals, row[3:]))
+
+        # owner => running totals, where running[i] is the sum of the months
+        # before month i
+        self.running = {}
+        for owner, owner_months in monthly.iteritems():
+            running = [NO_TOTALS]
+            for i in xrange(len(self.months)):
+                totals = owner_months.get(i)
+                running.append(tuple(a + b for a, b in zip(running[-1], totals)) if totals else running[-1])
+            self.running[owner] = running
+
+    @classmethod
+    def load(cls, agenda_id):
+        rows = SummaryAgenda.objects.filter(agenda=agenda_id).values_list('month', 'summary_type', 'mk_id',
+                                                                          *TOTAL_FIELDS)
+        return cls(agenda_id, list(rows))
+
+    @classmethod
+    def get(cls, agenda_id):
+        """The cached totals of an agenda, loaded if missing"""
+        key = 'agenda_%d_monthly_totals_%s' % (agenda_id, summaries_version(agenda_id))
+        totals = cache.get(key)
+        if totals is None:
+            totals = cls.load(agenda_id)
+            cache.set(key, totals, CACHE_TIME)
+        return totals
+
+    def _bounds(self, start, end):
+        return (bisect_left(self.months, start) if start else 0,
+                bisect_left(self.months, end) if end else len(self.months))
+
+    def totals(self, owner, start=None, end=None):
+        """The totals of the agenda (owner None) or of a member in the months
+        from start up to (not including) end"""
+        running = self.running.get(owner)
+        if running is None:
+            return NO_TOTALS
+        first, last = self._bounds(start, end)
+        if first >= last:
+            return NO_TOTALS
+        return tuple(b - a for a, b in zip(running[first], running[last]))
+
+    def mks_values(self, ranges, mk_ids):
+        """Returns {mk id: [values of each range]} - the score, rank, volume
+        and vote counts of the members in each range"""
+        results = dict((mk_id, []) for mk_id in mk_ids)
+        for start, end in ranges:
+            total_score, total_votes = self.totals(None, start, end)[:2]
+            range_results = []
+            for mk_id in results:
+                mk_score, mk_votes, mk_for_votes, mk_against_votes = self.totals(mk_id, start, end)
+                range_results.append((
+                    mk_id, mk_votes, mk_for_votes, mk_against_votes,
+                    100 * mk_score / total_score if total_score != 0 else 0,
+                    100 * mk_votes / float(total_votes) if total_votes else 0))
+            for rank, (mk_id, mk_votes, mk_for_votes, mk_against_votes, mk_score, mk_volume) in enumerate(
+                    sorted(range_results, key=itemgetter(4, 0), reverse=True)):
+                results[mk_id].append(dict(score=mk_score, rank=rank, volume=mk_volume, numvotes=mk_votes,
+                                           numforvotes=mk_for_votes, numagainstvotes=mk_against_votes))
+        return results
+
+
+def agenda_mks_values(agenda_id, ranges, mk_ids):
+    """Returns {mk id: [values of each range]} of an agenda, see
+    AgendaMonthlyTotals.mks_values. Cached by the ranges and members"""
+    mk_ids = set(mk_ids)
+    key = 'agenda_%d_mks_values_%s_%s' % (agenda_id, summaries_version(agenda_id), _values_key(ranges, mk_ids))
+    results = cache.get(key)
+    if results is None:
+        results = AgendaMonthlyTotals.get(agenda_id).mks_values(ranges, mk_ids)
+        cache.set(key, results, CACHE_TIME)
+    return results
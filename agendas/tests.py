@@ -8,7 +8,8 @@ from django.contrib.sites.models import Site
 from django.utils import translation
 from django.conf import settings
 
-from models import Agenda, AgendaVote, AgendaBill, AgendaMeeting
+from models import Agenda, AgendaVote, AgendaBill, AgendaMeeting, AgendaScore, SummaryAgenda, dateMonthTruncate
+from summaries import AgendaMonthlyTotals
 from laws.models import Vote, VoteAction, Bill
 from mks.models import Party, Member, Membership, Knesset
 from committees.models import Committee, CommitteeMeeting
@@ -334,6 +335,88 @@ I have a deadline''')
         self.assertEqual(int(res.context['score']), -33)
         self.assertEqual(len(res.context['related_votes']), 2)
 
+    def test_scores_for_member(self):
+        agendas = [self.agenda_1, self.agenda_2, self.agenda_3]
+        Knesset.objects._current_knesset = None
+        with self.assertNumQueries(2):  # the current knesset and the scores
+            summaries = Agenda.objects.scores_for_member(self.mk_1, agendas)
+        for agenda in agendas:
+            self.assertEqual(summaries[agenda.id]['score'], agenda.member_score(self.mk_1))
+            self.assertEqual(sorted(summaries[agenda.id]['totals']), sorted(agenda.get_mks_totals(self.mk_1)))
+        self.assertEqual(summaries[self.agenda_1.id]['votes'], 2)
+        self.assertEqual(summaries[self.agenda_1.id]['for_votes'], 2)
+        self.assertEqual(summaries[self.agenda_3.id]['totals'], [{'type': 'no-vote', 'total': 1}])
+
+    def test_monthly_totals(self):
+        jan, feb, mar = [datetime.datetime(2014, month, 1) for month in (1, 2, 3)]
+        totals = AgendaMonthlyTotals(1, [(jan, 'AG', None, 2.0, 2, 0, 0), (mar, 'AG', None, 1.0, 1, 0, 0),
+                                         (jan, 'MK', 5, 1.0, 1, 1, 0), (mar, 'MK', 5, -1.0, 1, 0, 1)])
+        self.assertEqual(totals.totals(None), (3.0, 3, 0, 0))
+        self.assertEqual(totals.totals(5, feb, None), (-1.0, 1, 0, 1))
+        self.assertEqual(totals.totals(5, jan, feb), (1.0, 1, 1, 0))
+        self.assertEqual(totals.totals(5, feb, mar), (0.0, 0, 0, 0))
+        self.assertEqual(totals.totals(6), (0.0, 0, 0, 0))
+        values = totals.mks_values([[jan, feb], [None, None]], [5, 6])
+        self.assertEqual(values[5][0]['score'], 50.0)
+        self.assertEqual(values[5][1]['volume'], 200.0 / 3)
+        self.assertEqual([values[5][1]['rank'], values[6][1]['rank']], [1, 0])
+
+    def test_get_mks_values(self):
+        Knesset.objects._current_knesset = None
+        mks_values = self.agenda_1.get_mks_values()
+        self.assertEqual([mk_id for mk_id, values in mks_values], [self.mk_2.id, self.mk_1.id])
+        values = dict(mks_values)[self.mk_1.id]
+        self.assertEqual(int(values['score']), -33)
+        self.assertEqual((values['numvotes'], values['volume'], values['rank']), (2, 100, 1))
+
+        this_month = dateMonthTruncate(datetime.datetime.now())
+        ranges = [[None, this_month], [this_month, None]]
+        mks_values = self.agenda_1.get_mks_values(ranges)
+        self.assertEqual([mk_values['numvotes'] for mk_values in mks_values[self.mk_1.id]], [0, 2])
+
+        # the cached values are dropped when the agenda's votes change
+        VoteAction.objects.create(vote=self.vote_1, member=self.mk_2, type='against', party=self.party_1)
+        self.assertEqual(self.agenda_1.get_mks_values(ranges)[self.mk_2.id][1]['numagainstvotes'], 1)
+
+    def _agenda_scores(self):
+        return sorted(AgendaScore.objects.values_list('agenda_id', 'knesset_id', 'score_type', 'mk_id', 'party_id',
+                                                      'score', 'votes', 'for_votes', 'against_votes'))
+
+    def test_agenda_scores_follow_agenda_vote_changes(self):
+        self.assertEqual(int(self.agenda_1.member_score(self.mk_1)), -33)
+
+        self.agendavote_1.score = 1
+        self.agendavote_1.save()
+        self.assertEqual(int(self.agenda_1.member_score(self.mk_1)), 100)
+
+        self.agendavote_3.delete()
+        self.assertEqual(int(self.agenda_1.member_score(self.mk_1)), 100)
+        self.assertEqual(AgendaScore.objects.get(agenda=self.agenda_1, score_type='AG').votes, 1)
+        self.assertEqual(sum(SummaryAgenda.objects.filter(agenda=self.agenda_1, summary_type='AG').values_list(
+            'votes', flat=True)), 1)
+
+    def test_agenda_scores_follow_vote_action_changes(self):
+        vote_action = VoteAction.objects.create(vote=self.vote_1, member=self.mk_2, type='against',
+                                                party=self.party_1)
+        self.assertEqual(int(self.agenda_1.member_score(self.mk_2)), 66)
+
+        vote_action.type = 'for'
+        vote_action.save()
+        self.assertEqual(int(self.agenda_1.member_score(self.mk_2)), -66)
+
+        vote_action.delete()
+        self.assertEqual(self.agenda_1.member_score(self.mk_2), 0.0)
+
+    def test_agenda_scores_rebuild_matches_incremental_updates(self):
+        self.agendavote_1.importance = 0.5
+        self.agendavote_1.save()
+        VoteAction.objects.create(vote=self.vote_2, member=self.mk_2, type='against', party=self.party_1)
+        incremental = self._agenda_scores()
+
+        AgendaVote.objects.compute_all()
+
+        self.assertEqual(self._agenda_scores(), incremental)
+
     def testAgendaDetailOptCacheFail(self):
         res = self.client.get(reverse('agenda-detail',
                                       kwargs={'pk': self.agenda_1.id}))
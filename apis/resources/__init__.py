@@ -14,6 +14,7 @@ from events.api import EventResource
 from polyorg.api import CandidateListResource
 from persons.api import PersonResource
 from lobbyists.api import LobbyistsChangeResource, LobbyistResource, LobbyistCorporationResource
+from search.api import SearchResource
 
 v2_api = Api(api_name='v2')
 
@@ -39,4 +40,5 @@ v2_api.register(CandidateListResource())
 v2_api.register(PersonResource())
 v2_api.register(LobbyistsChangeResource())
 v2_api.register(LobbyistResource())
-v2_api.register(LobbyistCorporationResource())
\ No newline at end of file
+v2_api.register(LobbyistCorporationResource())
+v2_api.register(SearchResource())
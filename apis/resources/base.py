@@ -1,11 +1,13 @@
 import csv
 
 from django.conf import settings
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from tastypie.cache import SimpleCache
+from tastypie.exceptions import ImmediateHttpResponse
 from tastypie.resources import ModelResource, Resource
 from tastypie.throttle import CacheThrottle
 from tastypie.serializers import Serializer
+from tastypie.utils.mime import build_content_type
 
 import ujson
 import StringIO
@@ -15,6 +17,9 @@ _cache = getattr(settings, 'CACHES', {})
 _cache_default = _cache.get('default')
 _is_dummy = _cache_default and _cache_default['BACKEND'].endswith('DummyCache')
 
+# number of objects serialized into each chunk of a streamed response
+STREAMING_CHUNK_SIZE = 100
+
 
 class SmartCacheThrottle(CacheThrottle):
     "Make sure throttling works with DummyCache"
@@ -42,6 +47,10 @@ class IterJSONAndCSVSerializer(Serializer):
         data = self.to_simple(data, options)
         return ujson.dumps(data)
 
+    @staticmethod
+    def _csv_row(values):
+        return [unicode(value).encode("utf-8", "replace") for value in values]
+
     def to_csv(self, data, options=None):
         options = options or {}
         data = self.to_simple(data, options)
@@ -57,13 +66,47 @@ class IterJSONAndCSVSerializer(Serializer):
         #   Use the first row for getting the headers
         first =  objects[0] if objects else None
         if first:
-            writer.writerow( [unicode(key).encode("utf-8", "replace") for key in first.keys()])
+            writer.writerow(self._csv_row(first.keys()))
 
         for item in objects:
-            writer.writerow([unicode(item[key]).encode(
-                "utf-8", "replace") for key in item.keys()])
+            writer.writerow(self._csv_row(item.values()))
         return response.getvalue()
 
+    def iter_json(self, meta, objects, collection_name='objects', options=None):
+        """Yields a json list response chunk by chunk, serializing the
+        objects as they are consumed"""
+        options = options or {}
+        yield '{"meta": %s, %s: [' % (ujson.dumps(self.to_simple(meta, options)), ujson.dumps(collection_name))
+        chunk = []
+        separator = ''
+        for obj in objects:
+            chunk.append(ujson.dumps(self.to_simple(obj, options)))
+            if len(chunk) == STREAMING_CHUNK_SIZE:
+                yield separator + ','.join(chunk)
+                chunk = []
+                separator = ','
+        if chunk:
+            yield separator + ','.join(chunk)
+        yield ']}'
+
+    def iter_csv(self, objects, options=None):
+        """Yields csv rows chunk by chunk, serializing the objects as they are
+        consumed. The header is taken from the first object"""
+        options = options or {}
+        response = StringIO.StringIO()
+        response.write(u'\ufeff'.encode('utf8'))  # BOM for excel
+        writer = csv.writer(response, dialect='excel')
+        for i, obj in enumerate(objects):
+            item = self.to_simple(obj, options)
+            if i == 0:
+                writer.writerow(self._csv_row(item.keys()))
+            writer.writerow(self._csv_row(item.values()))
+            if i % STREAMING_CHUNK_SIZE == STREAMING_CHUNK_SIZE - 1:
+                yield response.getvalue()
+                response.seek(0)
+                response.truncate()
+        yield response.getvalue()
+
     @staticmethod
     def modify_response(response, desired_format):
         if desired_format == "text/csv":
@@ -208,3 +251,56 @@ class BaseResource(ModelResource):
 
         bundle = self.dehydrate(bundle)
         return bundle
+
+
+class StreamingListMixin(object):
+    """Streams the json and csv list responses of a BaseResource.
+
+    The objects of the requested page are read with ``.iterator()`` and
+    serialized one chunk at a time into a ``StreamingHttpResponse``, so large
+    pages are never held in memory. ``limit=0`` returns all the objects,
+    unless ``streaming_max_limit`` is set in Meta; other pages are capped by
+    Meta.max_limit as usual.
+    """
+
+    streaming_formats = ('application/json', 'text/csv')
+
+    def get_list(self, request, **kwargs):
+        desired_format = self.determine_format(request)
+        if desired_format not in self.streaming_formats:
+            return super(StreamingListMixin, self).get_list(request, **kwargs)
+
+        base_bundle = self.build_bundle(request=request)
+        objects = self.obj_get_list(bundle=base_bundle, **self.remove_api_resource_names(kwargs))
+        sorted_objects = self.apply_sorting(objects, options=request.GET)
+
+        max_limit = self._meta.max_limit
+        if request.GET.get('limit') == '0':
+            # all the objects were asked for, which only streaming can afford
+            max_limit = getattr(self._meta, 'streaming_max_limit', None)
+        paginator = self._meta.paginator_class(request.GET, sorted_objects, resource_uri=self.get_resource_uri(),
+                                               limit=self._meta.limit, max_limit=max_limit,
+                                               collection_name=self._meta.collection_name)
+        page = paginator.page()
+        fields = self._get_list_fields(request)
+
+        def bundles(page_objects):
+            if hasattr(page_objects, 'iterator'):
+                page_objects = page_objects.iterator()
+            for obj in page_objects:
+                yield self.full_dehydrate(self.build_bundle(obj=obj, request=request), fields=fields)
+
+        serializer = self._meta.serializer
+        page_bundles = bundles(page[self._meta.collection_name])
+        if desired_format == 'text/csv':
+            content = serializer.iter_csv(page_bundles)
+        else:
+            content = serializer.iter_json(page['meta'], page_bundles, self._meta.collection_name)
+        response = IterJSONAndCSVSerializer.modify_response(
+            StreamingHttpResponse(content, content_type=build_content_type(desired_format)), desired_format)
+
+        # tastypie's dispatch only passes through HttpResponse instances, and
+        # a StreamingHttpResponse is not one - so hand it over the same way
+        # authentication and throttling errors are
+        self.log_throttled_access(request)
+        raise ImmediateHttpResponse(response=response)
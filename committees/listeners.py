@@ -1,4 +1,4 @@
-from django.db.models.signals import post_save,m2m_changed, pre_delete
+from django.db.models.signals import post_save,m2m_changed, pre_delete, post_delete
 from django.contrib.comments.signals import comment_was_posted
 from django.contrib.comments.models import Comment
 from django.contrib.contenttypes.models import ContentType
@@ -8,7 +8,7 @@ from actstream.models import Action, Follow
 from annotatetext.models import Annotation
 from knesset.utils import disable_for_loaddata
 from mks.models import Member
-from models import CommitteeMeeting, Topic
+from models import CommitteeMeeting, Topic, ProtocolPart
 
 cm_ct = None
 member_ct = None
@@ -27,15 +27,11 @@ def get_ct():
 
 @disable_for_loaddata
 def handle_cm_save(sender, created, instance, **kwargs):
-    if not cm_ct:
-        get_ct()
+    from knesset.activity import ActivityReconciler
+    attended = ActivityReconciler(target=instance, verbs=['attended'])
     for m in instance.mks_attended.all():
-        if Action.objects.filter(actor_object_id=m.id,
-                                 actor_content_type=member_ct,
-                                 verb='attended',
-                                 target_object_id=instance.id,
-                                 target_content_type=cm_ct).count()==0:
-            action.send(m, verb='attended', target=instance, description='committee meeting', timestamp=instance.date)
+        attended.add('attended', actor=m, description='committee meeting', timestamp=instance.date)
+    attended.reconcile()
 post_save.connect(handle_cm_save, sender=CommitteeMeeting)
 
 @disable_for_loaddata
@@ -84,6 +80,15 @@ def handle_annotation_save(sender, created, instance, **kwargs):
             follow(instance.user, instance.content_object.meeting)
 post_save.connect(handle_annotation_save, sender=Annotation)
 
+def invalidate_annotated_protocol(sender, instance, **kwargs):
+    # the annotations are rendered in the cached protocol pages
+    from committees.protocol import invalidate_protocol_pages
+    if instance.content_type_id == ContentType.objects.get_for_model(ProtocolPart).id:
+        for meeting_id in ProtocolPart.objects.filter(id=instance.object_id).values_list('meeting_id', flat=True):
+            invalidate_protocol_pages(meeting_id)
+post_save.connect(invalidate_annotated_protocol, sender=Annotation)
+post_delete.connect(invalidate_annotated_protocol, sender=Annotation)
+
 @disable_for_loaddata
 def handle_comment_save(sender, comment, request, **kwargs):
     action.send(comment.content_object, verb='comment-added', target=comment,
@@ -0,0 +1,39 @@
+# encoding: utf-8
+from datetime import date, timedelta
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from committees.models import CommitteeMeeting
+from ok_tag.tag_suggestions import tags_names_fingerprint
+import logging
+
+logger = logging.getLogger("open-knesset.committees.update_meeting_tag_suggestions")
+
+
+class Command(BaseCommand):
+    help = ("Store the tag suggestions of committee meetings. Only the meetings whose suggestions were found with "
+            "other tags than the current ones (or never found) are updated")
+
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--all', action='store_true', dest='all', default=False,
+            help='Update the suggestions of all the meetings'
+        ),
+        make_option(
+            '--days', action='store', type='int', dest='days', default=None,
+            help='Only update the meetings of the last given days'
+        ),
+    )
+
+    def handle(self, *args, **options):
+        meetings = CommitteeMeeting.objects.all()
+        if not options['all']:
+            meetings = meetings.exclude(tag_suggestions_fingerprint=tags_names_fingerprint())
+        if options['days'] is not None:
+            meetings = meetings.filter(date__gte=date.today() - timedelta(options['days']))
+        count = 0
+        for meeting in meetings.only('id', 'topics').iterator():
+            meeting.update_tag_suggestions()
+            count += 1
+        logger.info('updated the tag suggestions of %d meetings' % count)
@@ -2,7 +2,7 @@
 import re
 import logging
 from datetime import datetime, timedelta, date
-from django.db import models
+from django.db import models, transaction
 
 from django.utils.translation import ugettext_lazy as _, ugettext
 from django.utils.text import Truncator
@@ -16,6 +16,7 @@ from djangoratings.fields import RatingField
 
 from committees.enums import CommitteeTypes
 from events.models import Event
+from knesset.utils import QUERY_CHUNK_SIZE, chunks
 from links.models import Link
 
 from lobbyists.models import LobbyistCorporation
@@ -223,6 +224,9 @@ class CommitteeMeeting(models.Model):
         related_name='committee_meetings', blank=True)
     datetime = models.DateTimeField(db_index=True, null=True, blank=True)
     knesset_id = models.IntegerField(null=True, blank=True)
+    # the tags_names_fingerprint of the tags the stored tag suggestions were
+    # found with
+    tag_suggestions_fingerprint = models.CharField(max_length=32, blank=True)
 
     objects = CommitteeMeetingManager()
 
@@ -275,6 +279,7 @@ class CommitteeMeeting(models.Model):
     def create_protocol_parts(self, delete_existing=False, mks=None, mk_names=None):
         from knesset_data_django.committees.meetings import create_protocol_parts
         create_protocol_parts(self, delete_existing, mks, mk_names)
+        self.protocol_parsed()
 
     def redownload_protocol(self):
         from knesset_data_django.committees.meetings import redownload_protocol
@@ -283,6 +288,45 @@ class CommitteeMeeting(models.Model):
     def reparse_protocol(self, redownload=True, mks=None, mk_names=None):
         from knesset_data_django.committees.meetings import reparse_protocol
         reparse_protocol(self, redownload, mks, mk_names)
+        self.protocol_parsed()
+
+    def protocol_parsed(self):
+        """Stores what is derived from the protocol parts, after they are
+        (re)created"""
+        from committees.protocol import update_protocol_layout
+        from search.index import search_index
+        # the parts may be bulk created, without post_save signals
+        search_index.index_objects(ProtocolPart, self.parts.select_related('meeting__committee'))
+        update_protocol_layout(self)
+        self.update_tag_suggestions()
+
+    @transaction.atomic
+    def update_tag_suggestions(self):
+        """Finds the tags mentioned in the meeting's topics and protocol and
+        stores them, with their number of occurrences, as the meeting's tag
+        suggestions"""
+        from ok_tag.tag_suggestions import count_tags_in_texts, tags_names_fingerprint
+        fingerprint = tags_names_fingerprint()
+        counts = count_tags_in_texts([self.topics] + list(self.parts.values_list('body', flat=True)))
+        names = counts.keys()
+        tags = []
+        for chunk in chunks(names):
+            tags.extend(Tag.objects.filter(name__in=chunk))
+        self.tag_suggestions.all().delete()
+        MeetingTagSuggestion.objects.bulk_create(
+            [MeetingTagSuggestion(meeting=self, tag=tag, count=counts[tag.name]) for tag in tags],
+            batch_size=QUERY_CHUNK_SIZE)
+        self.tag_suggestions_fingerprint = fingerprint
+        CommitteeMeeting.objects.filter(pk=self.pk).update(tag_suggestions_fingerprint=fingerprint)
+        return len(tags)
+
+    def suggested_tags(self):
+        """(tag name, count) of the stored tag suggestions that are not tags
+        of the meeting yet, the most occurring first"""
+        current_tags = set(tag.id for tag in self.tags)
+        return [(suggestion.tag.name, suggestion.count)
+                for suggestion in self.tag_suggestions.select_related('tag').order_by('-count', 'tag__name')
+                if suggestion.tag_id not in current_tags]
 
     def update_from_dataservice(self, dataservice_object=None):
         # TODO: obviousely broken, not sure what was here originaly and where it moved
@@ -436,6 +480,35 @@ class ProtocolPart(models.Model):
                               self.body)
 
 
+class MeetingTagSuggestion(models.Model):
+    """A tag mentioned in a meeting's topics or protocol, suggested for
+    tagging the meeting. Stored by CommitteeMeeting.update_tag_suggestions"""
+    meeting = models.ForeignKey(CommitteeMeeting, related_name='tag_suggestions')
+    tag = models.ForeignKey(Tag, related_name='meeting_suggestions')
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('meeting', 'tag')
+
+    def __unicode__(self):
+        return u"%s: %s (%d)" % (self.meeting_id, self.tag.name, self.count)
+
+
+class ProtocolLayout(models.Model):
+    """What the meeting page needs to know about the whole protocol, stored
+    when the protocol is parsed (see committees.protocol): the speakers
+    colours and the length of every part. The version is part of the key of
+    the cached protocol pages, it changes when the parts or their annotations
+    change"""
+    meeting = models.OneToOneField(CommitteeMeeting, related_name='protocol_layout')
+    speaker_colors = models.TextField(default='{}')  # JSON {speaker header: css colour}
+    parts_lengths = models.TextField(default='{}')  # JSON {part id: body length}
+    version = models.PositiveIntegerField(default=0)
+
+    def __unicode__(self):
+        return u"%s (%d)" % (self.meeting_id, self.version)
+
+
 TOPIC_PUBLISHED, TOPIC_FLAGGED, TOPIC_REJECTED, \
 TOPIC_ACCEPTED, TOPIC_APPEAL, TOPIC_DELETED = range(6)
 PUBLIC_TOPIC_STATUS = (TOPIC_PUBLISHED, TOPIC_ACCEPTED)
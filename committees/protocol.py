@@ -0,0 +1,57 @@
+# encoding: utf-8
+"""
+Rendering support for the committee meeting protocol pages.
+
+The meeting page shows one page of protocol parts, but it colours the
+speakers over the whole protocol and gives the annotations script the length
+of every part. These are computed once, when the protocol is parsed, and
+stored in the meeting's ProtocolLayout. The rendered protocol pages are
+cached by the template, keyed by the meeting, the page and the layout
+version; the version changes when the parts are recreated or annotated.
+"""
+import colorsys
+import json
+
+from django.db.models import F
+
+from committees.models import ProtocolLayout
+import logging
+
+logger = logging.getLogger("open-knesset.committees.protocol")
+
+
+def speaker_colors(meeting):
+    """Returns {speaker header: css colour}, members in stronger colours"""
+    colors = {}
+    speakers = list(meeting.parts.order_by('speaker__mk').values_list('header', 'speaker__mk').distinct())
+    n = len(speakers)
+    for (i, (header, mk)) in enumerate(speakers):
+        (r, g, b) = colorsys.hsv_to_rgb(float(i) / n, 0.5 if mk else 0.3, 255)
+        colors[header] = 'rgb(%i, %i, %i)' % (r, g, b)
+    return colors
+
+
+def update_protocol_layout(meeting):
+    """Computes and stores the layout of the meeting's protocol, and changes
+    its version"""
+    parts_lengths = dict((part_id, len(body or '')) for part_id, body in meeting.parts.values_list('id', 'body'))
+    layout, created = ProtocolLayout.objects.get_or_create(meeting=meeting)
+    layout.speaker_colors = json.dumps(speaker_colors(meeting))
+    layout.parts_lengths = json.dumps(parts_lengths)
+    layout.version += 1
+    layout.save()
+    return layout
+
+
+def protocol_layout(meeting):
+    """The stored layout of the meeting's protocol, computed if missing"""
+    try:
+        return ProtocolLayout.objects.get(meeting=meeting)
+    except ProtocolLayout.DoesNotExist:
+        return update_protocol_layout(meeting)
+
+
+def invalidate_protocol_pages(meeting_id):
+    """Changes the layout version, so the cached pages of the protocol are
+    rendered again"""
+    ProtocolLayout.objects.filter(meeting=meeting_id).update(version=F('version') + 1)
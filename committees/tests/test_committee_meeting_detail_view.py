@@ -1,3 +1,4 @@
+import json
 import unittest
 from datetime import datetime, timedelta
 
@@ -6,12 +7,17 @@ from annotatetext.models import Annotation
 from django.conf import settings
 from django.contrib.auth.models import User, Group, Permission
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import get_cache
+from django.core.management import call_command
 from django.core.urlresolvers import reverse
+from django.templatetags import cache as cache_templatetags
+from django.test import Client
 
 from tagging.models import Tag
 from waffle import testutils as waffle_testutils
 
-from committees.models import Committee
+import ok_tag.tag_suggestions
+from committees.models import Committee, CommitteeMeeting, MeetingTagSuggestion, ProtocolLayout
 from committees.tests.base import BaseCommitteeTestCase
 from laws.models import Bill
 from mks.models import Member, Knesset
@@ -85,6 +91,40 @@ I have a deadline''')
         self.assertEqual(parts_list[1].header, u'adrian')
         self.assertEqual(parts_list[1].body, 'I have a deadline')
 
+    def test_protocol_layout_is_stored(self):
+        layout = ProtocolLayout.objects.get(meeting=self.meeting_1)
+        parts = self.meeting_1.parts.list()
+        self.assertEqual(json.loads(layout.parts_lengths), {str(parts[0].id): 20, str(parts[1].id): 17})
+        self.assertEqual(sorted(json.loads(layout.speaker_colors)), [u'adrian', u'jacob'])
+        res = self.client.get(self.meeting_1.get_absolute_url())
+        self.assertEqual(res.context['protocol_version'], layout.version)
+
+        # annotations change the version of the cached protocol pages
+        self.assertTrue(self.client.login(username='jacob', password='JKM'))
+        self._given_protocol_annotation(parts[0])
+        self.assertEqual(ProtocolLayout.objects.get(meeting=self.meeting_1).version, layout.version + 1)
+
+    def test_cached_protocol_does_not_share_csrf_tokens(self):
+        self.assertTrue(self.client.login(username='jacob', password='JKM'))
+        self._given_protocol_annotation(self.meeting_1.parts.list()[0])
+        other_client = Client()
+        self.assertTrue(other_client.login(username='adrian', password='ADRIAN'))
+        # the default cache backend is a dummy one, which caches nothing
+        template_cache = cache_templatetags.cache
+        cache_templatetags.cache = get_cache('django.core.cache.backends.locmem.LocMemCache')
+        try:
+            res_1 = self.client.get(self.meeting_1.get_absolute_url())
+            res_2 = other_client.get(self.meeting_1.get_absolute_url())
+        finally:
+            cache_templatetags.cache = template_cache
+        self.assertContains(res_2, 'reallydelete')
+        token_1 = res_1.cookies['csrftoken'].value
+        token_2 = res_2.cookies['csrftoken'].value
+        self.assertNotEqual(token_1, token_2)
+        self.assertContains(res_1, 'window.csrf_token = "%s"' % token_1)
+        self.assertContains(res_2, 'window.csrf_token = "%s"' % token_2)
+        self.assertNotContains(res_2, token_1)
+
     def test_annotating_protocol_part(self):
         '''this is more about testing the annotatext app '''
         self.assertTrue(self.client.login(username='jacob', password='JKM'))
@@ -296,6 +336,32 @@ I have a deadline''')
         self.assertEqual(res.status_code, 200)
         self.assertIn(self.tag_1, self.meeting_1.tags)
 
+    def test_meeting_tag_suggestions_are_stored(self):
+        Tag.objects.update_tags(self.meeting_2, 'perfectionist')
+        ok_tag.tag_suggestions.reset_tags_names()
+        self.assertEqual(self.meeting_1.update_tag_suggestions(), 1)
+        self.assertEqual(self.meeting_1.suggested_tags(), [(u'perfectionist', 1)])
+        res = self.client.get(self.meeting_1.get_absolute_url())
+        self.assertEqual(res.context['tag_suggestions'], [(u'perfectionist', 1)])
+
+        # tags of the meeting are not suggested
+        Tag.objects.add_tag(self.meeting_1, 'perfectionist')
+        self.assertEqual(self.meeting_1.suggested_tags(), [])
+
+    def test_update_meeting_tag_suggestions_command(self):
+        Tag.objects.update_tags(self.meeting_2, 'perfectionist')
+        ok_tag.tag_suggestions.reset_tags_names()
+        call_command('update_meeting_tag_suggestions')
+        fingerprint = ok_tag.tag_suggestions.tags_names_fingerprint()
+        self.assertEqual(set(CommitteeMeeting.objects.values_list('tag_suggestions_fingerprint', flat=True)),
+                         set([fingerprint]))
+        self.assertEqual(self.meeting_1.suggested_tags(), [(u'perfectionist', 1)])
+
+        # the tags did not change since, so the meetings are not updated
+        MeetingTagSuggestion.objects.all().delete()
+        call_command('update_meeting_tag_suggestions')
+        self.assertEqual(self.meeting_1.suggested_tags(), [])
+
     @unittest.skip("creating tags currently disabled")
     def test_create_tag_permission_required(self):
         self.assertTrue(self.client.login(username='jacob', password='JKM'))
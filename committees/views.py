@@ -1,8 +1,5 @@
 # -*- coding: utf-8 -*
-import colorsys
 import datetime
-import difflib
-import itertools
 import json
 import logging
 import re
@@ -31,7 +28,8 @@ from django.views.generic import DetailView, ListView
 from tagging.models import TaggedItem, Tag
 
 import models
-import ok_tag.tag_suggestions
+from committees.protocol import protocol_layout
+from links.index import attach_links
 from auxiliary.mixins import GetMoreView
 from forms import EditTopicForm, LinksFormset
 from hashnav import method_decorator as hashnav_method_decorator
@@ -115,12 +113,7 @@ class CommitteeDetailView(DetailView):
             cached_context['show_member_presence'] = False
             members = cm.members_by_name(current_only=True)
 
-        links = list(Link.objects.for_model(Member))
-        links_by_member = {}
-        for k, g in itertools.groupby(links, lambda x: x.object_pk):
-            links_by_member[str(k)] = list(g)
-        for member in members:
-            member.cached_links = links_by_member.get(str(member.pk), [])
+        members = attach_links(members)
         cached_context['members'] = members
         recent_meetings, more_meetings_available = cm.recent_meetings(
             limit=self.SEE_ALL_THRESHOLD)
@@ -173,9 +166,8 @@ class MeetingDetailView(DetailView):
         slug = self.kwargs.get(self.slug_url_kwarg, None)
         if pk is not None:
             # Double prefetch since prefetch does not work over filter
-            queryset = queryset.filter(pk=pk).prefetch_related('parts',
-                                                               'parts__speaker__mk',
-                                                               'lobbyists_mentioned',
+            # the protocol parts are loaded a page at a time, by the template
+            queryset = queryset.filter(pk=pk).prefetch_related('lobbyists_mentioned',
                                                                'mks_attended',
                                                                'mks_attended__current_party',
                                                                'committee__members',
@@ -208,14 +200,6 @@ class MeetingDetailView(DetailView):
     def get_context_data(self, *args, **kwargs):
         context = super(MeetingDetailView, self).get_context_data(**kwargs)
         cm = context['object']
-        colors = {}
-        speakers = cm.parts.order_by('speaker__mk').values_list('header',
-                                                                'speaker__mk').distinct()
-        n = speakers.count()
-        for (i, (p, mk)) in enumerate(speakers):
-            (r, g, b) = colorsys.hsv_to_rgb(float(i) / n, 0.5 if mk else 0.3,
-                                            255)
-            colors[p] = 'rgb(%i, %i, %i)' % (r, g, b)
         context['title'] = _('%(committee)s meeting on %(date)s') % {
             'committee': cm.committee.name,
             'date': cm.date_string}
@@ -224,11 +208,12 @@ class MeetingDetailView(DetailView):
         page = self.request.GET.get('page', None)
         if page:
             context['description'] += _(' page %(page)s') % {'page': page}
-        context['colors'] = colors
-        parts_lengths = {}
-        for part in cm.parts.all():
-            parts_lengths[part.id] = len(part.body)
-        context['parts_lengths'] = json.dumps(parts_lengths)
+        # stored when the protocol is parsed, see committees.protocol
+        layout = protocol_layout(cm)
+        context['colors'] = json.loads(layout.speaker_colors)
+        context['parts_lengths'] = layout.parts_lengths
+        context['protocol_version'] = layout.version
+        context['protocol_page'] = page or 1
         context['paginate_by'] = models.COMMITTEE_PROTOCOL_PAGINATE_BY
 
         if cm.committee.type != 'plenum' and \
@@ -242,19 +227,11 @@ class MeetingDetailView(DetailView):
             members = cm.mks_attended.order_by('name')
             context['show_member_presence'] = False
 
-        links = list(Link.objects.for_model(Member))
-        links_by_member = {}
-        for k, g in itertools.groupby(links, lambda x: x.object_pk):
-            links_by_member[str(k)] = list(g)
-        for member in members:
-            member.cached_links = links_by_member.get(str(member.pk), [])
+        members = attach_links(members)
         context['members'] = members
 
-        meeting_text = [cm.topics] + [part.body for part in cm.parts.all()]
-        context[
-            'tag_suggestions'] = ok_tag.tag_suggestions.extract_suggested_tags(
-            cm.tags,
-            meeting_text)
+        # stored when the protocol is parsed, see update_tag_suggestions
+        context['tag_suggestions'] = cm.suggested_tags()
 
         context['mentioned_lobbyists'] = cm.main_lobbyists_mentioned
         context[
@@ -322,12 +299,11 @@ class MeetingDetailView(DetailView):
         mk_id = request.POST.get('mk_id')
         mk_name = request.POST.get('mk_name_to_remove')
         if not mk_id and mk_name:
-            mk_names = Member.objects.values_list('name', flat=True)
-
-            possible_matches = difflib.get_close_matches(mk_name, mk_names)
+            possible_matches = Member.objects.find(mk_name)
             if possible_matches:
-                mk_name = possible_matches[0]
-                mk = Member.objects.get(name=mk_name)
+                mk = possible_matches[0]
+            else:
+                raise Http404()
         elif mk_id:
             mk = Member.objects.get(id=mk_id)
         else:
@@ -344,11 +320,9 @@ class MeetingDetailView(DetailView):
         mk_id = request.POST.get('mk_id')
         mk_name = request.POST.get('mk_name')
         if not mk_id and mk_name:
-            mk_names = Member.objects.values_list('name', flat=True)
-            possible_matches = difflib.get_close_matches(mk_name, mk_names)
+            possible_matches = Member.objects.find(mk_name)
             if possible_matches:
-                mk_name = possible_matches[0]
-                mk = Member.objects.get(name=mk_name)
+                mk = possible_matches[0]
             else:
                 raise Http404()
 
@@ -0,0 +1,118 @@
+# encoding: utf-8
+"""
+Reconciliation of activity streams.
+
+Instead of deleting a stream and sending all its actions again, the desired
+actions are diffed against the existing ones, and only the missing actions
+are created and the stale ones deleted - both in bulk. Unchanged actions keep
+their ids and timestamps, so consumers of the stream (like notify, which
+looks for actions newer than the last notification) only see real changes.
+"""
+import datetime
+from collections import defaultdict
+
+from actstream.models import Action
+from django.contrib.contenttypes.models import ContentType
+import logging
+
+logger = logging.getLogger("open-knesset.activity")
+
+
+def _timestamp(value):
+    if value is None:
+        return None
+    if not isinstance(value, datetime.datetime):
+        value = datetime.datetime.combine(value, datetime.time.min)
+    # not all databases keep microseconds
+    return value.replace(microsecond=0)
+
+
+def _description(value):
+    return None if value is None else unicode(value)
+
+
+class ActivityReconciler(object):
+    """Makes the actions of an actor (or the actions on a target) match the
+    actions added to the reconciler.
+
+    Only the existing actions in scope are touched: those of the given actor
+    and/or target, with one of the given verbs (any verb if verbs is None).
+    An action added without a timestamp matches an existing action of any
+    timestamp, and is created with the current time.
+    """
+
+    def __init__(self, actor=None, target=None, verbs=None):
+        if actor is None and target is None:
+            raise ValueError('an actor or a target is required')
+        self.actor = actor
+        self.target = target
+        self.verbs = verbs
+        self._desired = []
+
+    def add(self, verb, target=None, timestamp=None, description=None, actor=None):
+        actor = actor if actor is not None else self.actor
+        target = target if target is not None else self.target
+        self._desired.append((actor, verb, target, timestamp, description))
+
+    def _existing(self):
+        actions = Action.objects.all()
+        if self.actor is not None:
+            actions = actions.filter(actor_content_type=ContentType.objects.get_for_model(self.actor),
+                                     actor_object_id=self.actor.pk)
+        if self.target is not None:
+            actions = actions.filter(target_content_type=ContentType.objects.get_for_model(self.target),
+                                     target_object_id=self.target.pk)
+        if self.verbs is not None:
+            actions = actions.filter(verb__in=self.verbs)
+        return actions.values_list('id', 'actor_content_type_id', 'actor_object_id', 'verb',
+                                   'target_content_type_id', 'target_object_id', 'timestamp', 'description')
+
+    @staticmethod
+    def _object_key(obj):
+        if obj is None:
+            return None, None
+        return ContentType.objects.get_for_model(obj).id, unicode(obj.pk)
+
+    def reconcile(self):
+        """Creates the missing actions and deletes the stale ones. Returns
+        the numbers of (created, deleted) actions"""
+        # (actor, verb, target, description) => {timestamp: [action ids]}
+        existing = defaultdict(lambda: defaultdict(list))
+        for (action_id, actor_ct, actor_id, verb, target_ct, target_id, timestamp,
+             description) in self._existing():
+            key = (actor_ct, unicode(actor_id), verb, target_ct, target_id and unicode(target_id), description)
+            existing[key][_timestamp(timestamp)].append(action_id)
+
+        missing = []
+        for actor, verb, target, timestamp, description in self._desired:
+            key = self._object_key(actor) + (verb,) + self._object_key(target) + (_description(description),)
+            timestamps = existing.get(key, {})
+            if timestamp is None:
+                matched = next((ids for ids in timestamps.itervalues() if ids), None)
+            else:
+                matched = timestamps.get(_timestamp(timestamp))
+            if matched:
+                matched.pop()
+            else:
+                missing.append((actor, verb, target, timestamp, description))
+
+        stale = [action_id for key_timestamps in existing.itervalues() for ids in key_timestamps.itervalues()
+                 for action_id in ids]
+        if stale:
+            Action.objects.filter(id__in=stale).delete()
+
+        now = datetime.datetime.now()
+        actions = []
+        for actor, verb, target, timestamp, description in missing:
+            action = Action(actor_content_type=ContentType.objects.get_for_model(actor), actor_object_id=actor.pk,
+                            verb=unicode(verb), description=_description(description),
+                            timestamp=_timestamp(timestamp) if timestamp is not None else now)
+            if target is not None:
+                action.target_content_type = ContentType.objects.get_for_model(target)
+                action.target_object_id = target.pk
+            actions.append(action)
+        Action.objects.bulk_create(actions)
+        if actions or stale:
+            logger.debug('reconciled activity of %s: %d created, %d deleted' % (
+                self.actor if self.actor is not None else self.target, len(actions), len(stale)))
+        return len(actions), len(stale)
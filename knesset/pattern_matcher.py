@@ -0,0 +1,80 @@
+# encoding: utf-8
+"""
+Multi-pattern matching (Aho-Corasick).
+
+All the patterns are compiled into one automaton, and a text is scanned for
+all of them in a single pass, in time linear in the length of the text plus
+the number of matches - no matter how many patterns there are.
+
+Patterns and texts are sequences: strings are matched by characters, and
+tuples or lists (of words, for example) by items.
+"""
+from collections import deque
+
+
+class PatternMatcher(object):
+    def __init__(self, patterns=()):
+        """patterns is an iterable of (pattern, value) tuples"""
+        self._goto = [{}]  # state => {item: next state}
+        self._fail = [0]
+        self._patterns = [[]]  # state => [(pattern length, value)] of the patterns ending there
+        self._outputs = [[]]  # the same, including the patterns that are suffixes of them
+        self._compiled = True
+        for pattern, value in patterns:
+            self.add(pattern, value)
+
+    def add(self, pattern, value):
+        """Adds a pattern, reported as value when found. Empty patterns are
+        ignored"""
+        if not pattern:
+            return
+        state = 0
+        for item in pattern:
+            next_state = self._goto[state].get(item)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._patterns.append([])
+                self._goto[state][item] = next_state
+            state = next_state
+        self._patterns[state].append((len(pattern), value))
+        self._compiled = False
+
+    def compile(self):
+        """Computes the failure links. Called automatically on the first scan
+        after patterns are added"""
+        self._outputs = [list(patterns) for patterns in self._patterns]
+        queue = deque(self._goto[0].values())
+        for state in queue:
+            self._fail[state] = 0
+        # breadth first, so the outputs of the failure state are complete
+        # before they are added
+        while queue:
+            state = queue.popleft()
+            for item, next_state in self._goto[state].iteritems():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and item not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(item, 0)
+                self._outputs[next_state].extend(self._outputs[self._fail[next_state]])
+        self._compiled = True
+
+    def iter_matches(self, text):
+        """Yields (start, end, value) for every occurrence of every pattern
+        in text"""
+        if not self._compiled:
+            self.compile()
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        state = 0
+        for end, item in enumerate(text, 1):
+            while state and item not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(item, 0)
+            for length, value in outputs[state]:
+                yield end - length, end, value
+
+    def find_all(self, text):
+        """Returns the set of the values of all the patterns found in text"""
+        return set(value for start, end, value in self.iter_matches(text))
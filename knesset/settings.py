@@ -191,6 +191,7 @@ INSTALLED_APPS = (
     'kikar',
     'ok_tag',
     'dials',
+    'search',
 ) + KNESSET_DATA_DJANGO_APPS
 
 TEMPLATE_CONTEXT_PROCESSORS = (
@@ -60,6 +60,7 @@ urlpatterns = patterns('',
     (r'^comments/', include('django.contrib.comments.urls')),
     (r'^jsi18n/$', 'django.views.i18n.javascript_catalog', js_info_dict),
     #(r'^search/', include('haystack.urls')),
+    url(r'^search/local/$', 'search.views.local_search', name='local-search'),
     url(r'^search/', 'auxiliary.views.search', name='site-search'),
     url(r'^feeds/$', feeds.MainActionsFeed(), name='main-actions-feed'),
     url(r'^feeds/comments/$', feeds.Comments(),name='feeds-comments'),
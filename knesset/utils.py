@@ -22,6 +22,9 @@ from actstream.models import Action
 import traceback
 import hashlib
 
+# sqlite limits the number of query parameters, keep IN clauses under it
+QUERY_CHUNK_SIZE = 500
+
 
 def limit_by_request(qs, request):
     if 'num' in request.GET:
@@ -31,6 +34,14 @@ def limit_by_request(qs, request):
     return qs
 
 
+def chunks(items, size=QUERY_CHUNK_SIZE):
+    """Yields the items in lists of up to size items, for IN clauses and
+    bulk queries over many ids"""
+    items = list(items)
+    for i in xrange(0, len(items), size):
+        yield items[i:i + size]
+
+
 def yearstart(year):
     return datetime(year, 1, 1)
 
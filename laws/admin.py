@@ -51,9 +51,7 @@ class VoteAdmin(ImportExportModelAdmin):
     list_filter = (MissingDataVotesFilter, )
 
     def update_vote(self, request, queryset):
-        vote_count = queryset.count()
-        for vote in queryset:
-            vote.update_vote_properties()
+        vote_count = Vote.objects.update_vote_properties(queryset)
 
         self.message_user(request, "successfully updated {0} votes".format(vote_count))
 
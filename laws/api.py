@@ -9,7 +9,7 @@ import tastypie.fields as fields
 from dateutil import parser
 from agendas.templatetags.agendas_tags import agendas_for
 
-from apis.resources.base import BaseResource
+from apis.resources.base import BaseResource, StreamingListMixin
 
 from mks.api import MemberResource
 
@@ -28,7 +28,7 @@ class LawResource(BaseResource):
         allowed_methods = ['get']
 
 
-class VoteActionResource(BaseResource):
+class VoteActionResource(StreamingListMixin, BaseResource):
     class Meta(BaseResource.Meta):
         queryset = VoteAction.objects.all()
         allowed_methods = ['get']
@@ -53,7 +53,7 @@ class VoteActionResource(BaseResource):
     vote_time = fields.DateTimeField('vote__time')
 
 
-class VoteResource(BaseResource):
+class VoteResource(StreamingListMixin, BaseResource):
     class Meta(BaseResource.Meta):
         queryset = Vote.objects.all()
         allowed_methods = ['get']
@@ -155,7 +155,7 @@ def detailed_agendas(agenda_list):
     return result
 
 
-class BillResource(BaseResource):
+class BillResource(StreamingListMixin, BaseResource):
     ''' Bill API '''
 
     class Meta(BaseResource.Meta):
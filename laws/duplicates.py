@@ -0,0 +1,181 @@
+# encoding: utf-8
+"""
+Detection and merging of duplicate laws and bills.
+
+Laws (and the bills of each law) are grouped by their cannonized titles in a
+single hash pass. Optionally, near duplicates are grouped too: titles are
+split to word shingles, and titles whose MinHash signatures share a band are
+compared by the Jaccard similarity of their shingles.
+
+The groups make a MergePlan, which can be reported (for a dry run) or
+applied in a single transaction.
+"""
+import random
+import zlib
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count
+
+from knesset.utils import cannonize
+from laws.models import Bill, Law
+import logging
+
+logger = logging.getLogger("open-knesset.laws.duplicates")
+
+NEAR_DUPLICATE_THRESHOLD = 0.8
+MINHASH_BANDS = 16
+MINHASH_ROWS = 4
+_MERSENNE_PRIME = (1 << 61) - 1
+
+
+def title_shingles(title, size=2):
+    """Returns the set of word n-grams of a title, with each word cannonized"""
+    words = [word for word in (cannonize(word) for word in title.split()) if word]
+    if len(words) < size:
+        return set([tuple(words)]) if words else set()
+    return set(tuple(words[i:i + size]) for i in xrange(len(words) - size + 1))
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / float(len(a | b))
+
+
+class _MinHasher(object):
+    def __init__(self, num_perm, seed=1):
+        rnd = random.Random(seed)
+        self.permutations = [(rnd.randint(1, _MERSENNE_PRIME - 1), rnd.randint(0, _MERSENNE_PRIME - 1))
+                             for _ in xrange(num_perm)]
+
+    def signature(self, shingles):
+        hashes = [zlib.crc32(u' '.join(shingle).encode('utf8')) & 0xffffffff for shingle in shingles]
+        return [min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in self.permutations]
+
+
+class _DisjointSets(object):
+    def __init__(self):
+        self.parents = {}
+
+    def find(self, item):
+        root = self.parents.setdefault(item, item)
+        while self.parents[root] != root:
+            root = self.parents[root]
+        while item != root:
+            parent = self.parents[item]
+            self.parents[item] = root
+            item = parent
+        return root
+
+    def union(self, a, b):
+        self.parents[self.find(a)] = self.find(b)
+
+
+def duplicate_groups(items, near=False, threshold=NEAR_DUPLICATE_THRESHOLD):
+    """Groups items of (id, title), returning lists of the ids of items that
+    have the same cannonized title - or, if near is True, similar titles.
+    Each group keeps the order of the items"""
+    sets = _DisjointSets()
+    by_key = {}
+    ids = []
+    for item_id, title in items:
+        ids.append(item_id)
+        key = cannonize(title)
+        if key in by_key:
+            sets.union(item_id, by_key[key])
+        else:
+            by_key[key] = item_id
+
+    if near:
+        # only one item per cannonized title needs to be compared
+        shingles = dict((item_id, title_shingles(title)) for item_id, title in items
+                        if by_key[cannonize(title)] == item_id)
+        hasher = _MinHasher(MINHASH_BANDS * MINHASH_ROWS)
+        buckets = defaultdict(list)
+        for item_id, item_shingles in shingles.iteritems():
+            if not item_shingles:
+                continue
+            signature = hasher.signature(item_shingles)
+            for band in xrange(MINHASH_BANDS):
+                buckets[(band, tuple(signature[band * MINHASH_ROWS:(band + 1) * MINHASH_ROWS]))].append(item_id)
+        compared = set()
+        for bucket in buckets.itervalues():
+            for i, a in enumerate(bucket):
+                for b in bucket[i + 1:]:
+                    if (a, b) in compared:
+                        continue
+                    compared.add((a, b))
+                    if jaccard(shingles[a], shingles[b]) >= threshold:
+                        sets.union(a, b)
+
+    groups = defaultdict(list)
+    for item_id in ids:
+        groups[sets.find(item_id)].append(item_id)
+    return [group for group in groups.itervalues() if len(group) > 1]
+
+
+class MergePlan(object):
+    def __init__(self):
+        self.laws = []  # (target law id, [merged law ids])
+        self.bills = []  # (target bill id, [merged bill ids])
+        self.titles = {}  # (model, id) => title, for the report
+
+    def __len__(self):
+        return len(self.laws) + len(self.bills)
+
+    def report(self):
+        """Returns the lines describing the planned merges"""
+        lines = []
+        for model, merges in ((Law, self.laws), (Bill, self.bills)):
+            name = model._meta.verbose_name
+            for target_id, merged_ids in merges:
+                lines.append(u'%s %d "%s" <= %s' % (
+                    name, target_id, self.titles[(model, target_id)],
+                    u', '.join(u'%d "%s"' % (merged_id, self.titles[(model, merged_id)]) for merged_id in merged_ids)))
+        return lines
+
+    @transaction.atomic
+    def apply(self):
+        laws = Law.objects.in_bulk(set(law_id for target_id, merged_ids in self.laws
+                                       for law_id in [target_id] + merged_ids))
+        for target_id, merged_ids in self.laws:
+            for merged_id in merged_ids:
+                laws[target_id].merge(laws[merged_id])
+        for target_id, merged_ids in self.bills:
+            target = Bill.objects.get(pk=target_id)
+            for bill in Bill.objects.filter(pk__in=merged_ids):
+                target.merge(bill)
+        logger.info('merged %d law groups and %d bill groups' % (len(self.laws), len(self.bills)))
+
+
+def plan_duplicate_merges(near=False, threshold=NEAR_DUPLICATE_THRESHOLD):
+    """Plans merging duplicate laws into the duplicate with the most bills (the
+    latest one, on ties),
+    and identical bills of each law into the one with the latest stage date"""
+    plan = MergePlan()
+
+    laws = list(Law.objects.filter(merged_into=None).annotate(bills_count=Count('bills'))
+                .values_list('id', 'title', 'bills_count'))
+    bills_count = {}
+    for law_id, title, count in laws:
+        plan.titles[(Law, law_id)] = title
+        bills_count[law_id] = count
+    law_targets = {}
+    for group in duplicate_groups([(law_id, title) for law_id, title, count in laws], near, threshold):
+        target_id = max(group, key=lambda law_id: (bills_count[law_id], law_id))
+        plan.laws.append((target_id, [law_id for law_id in group if law_id != target_id]))
+        for law_id in group:
+            law_targets[law_id] = target_id
+
+    # bills are grouped by the law they will have after the laws are merged
+    bills_by_law = defaultdict(list)
+    for bill_id, title, law_id in Bill.objects.filter(law__isnull=False).values_list('id', 'title', 'law_id'):
+        plan.titles[(Bill, bill_id)] = title
+        bills_by_law[law_targets.get(law_id, law_id)].append((bill_id, title))
+    for bills in bills_by_law.itervalues():
+        if len(bills) < 2:
+            continue
+        for group in duplicate_groups(bills):
+            plan.bills.append((group[0], group[1:]))
+    return plan
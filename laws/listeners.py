@@ -1,5 +1,5 @@
 # encoding: utf-8
-from django.db.models.signals import m2m_changed, post_save
+from django.db.models.signals import m2m_changed, post_save, pre_delete, post_delete
 from django.contrib.contenttypes.models import ContentType
 from actstream import action
 from actstream.models import Action
@@ -12,6 +12,7 @@ from laws.models.member_voting_statistics import MemberVotingStatistics
 from laws.models.party_voting_statistics import PartyVotingStatistics
 from laws.models.proposal import PrivateProposal
 from laws.models.vote_action import VoteAction
+from laws.voting_statistics import vote_action_counters, update_voting_statistics
 from mks.models import Member, Party
 
 from polyorg.models import CandidateList
@@ -52,6 +53,42 @@ post_save.connect(record_vote_action, sender=VoteAction,
                   dispatch_uid='vote_action_record_member')
 
 
+@disable_for_loaddata
+def update_vote_action_statistics(sender, created, instance, **kwargs):
+    if created:
+        update_voting_statistics([(instance.member_id, instance.vote.time,
+                                   vote_action_counters(instance.type, instance.against_party,
+                                                        instance.against_coalition, instance.against_opposition))])
+
+
+post_save.connect(update_vote_action_statistics, sender=VoteAction,
+                  dispatch_uid='vote_action_update_statistics')
+
+
+@disable_for_loaddata
+def remember_vote_action_time(sender, instance, **kwargs):
+    # when a vote is deleted with its actions, the vote row may be gone by
+    # the time the actions' post_delete is sent
+    instance._vote_time = instance.vote.time
+
+
+@disable_for_loaddata
+def remove_vote_action_statistics(sender, instance, **kwargs):
+    vote_time = getattr(instance, '_vote_time', None)
+    if vote_time is None:
+        return
+    update_voting_statistics([(instance.member_id, vote_time,
+                               [-value for value in vote_action_counters(
+                                   instance.type, instance.against_party,
+                                   instance.against_coalition, instance.against_opposition)])])
+
+
+pre_delete.connect(remember_vote_action_time, sender=VoteAction,
+                   dispatch_uid='vote_action_remember_time')
+post_delete.connect(remove_vote_action_statistics, sender=VoteAction,
+                    dispatch_uid='vote_action_remove_statistics')
+
+
 @disable_for_loaddata
 def handle_candiate_list_save(sender, created, instance, **kwargs):
     if instance._state.db == 'default':
@@ -1,76 +1,34 @@
 # encoding: utf-8
-import os, csv
-from operator import attrgetter
-from django.core.management.base import NoArgsCommand
-from django.conf import settings
-
-from tagging.models import Tag
-
-from mks.models import Member
-from laws.models import Vote, Bill
-
-
-class Command(NoArgsCommand):
-    def handle_noargs(self, **options):
-        mks = Member.objects.order_by('current_party__is_coalition', 'current_party__name') \
-            .values('id', 'name', 'current_party__name')
-        f = open(os.path.join(settings.DATA_ROOT, 'mks.csv'), 'wt')
-        mk_writer = csv.writer(f, quoting=csv.QUOTE_NONNUMERIC)
-        for mk in mks:
-            row = [mk['id'],
-                   '%s' % mk['name'].encode('utf8'),
-                   '%s' % mk['current_party__name'].encode('utf8')]
-            mk_writer.writerow(row)
-        f.close()
-
-        vote_tags = Tag.objects.usage_for_model(Vote)
-        bill_tags = Tag.objects.usage_for_model(Bill)
-        all_tags = list(set(vote_tags).union(bill_tags))
-        all_tags.sort(key=attrgetter('name'))
+from optparse import make_option
 
-        f = open(os.path.join(settings.DATA_ROOT, 'votes_mks.csv'), 'wt')
-        mk_writer = csv.writer(f)
-        header = ['Vote id', 'Vote time', 'Vote name']
-        for mk in mks:
-            header.append(mk['id'])
-        mk_writer.writerow(header)
-
-        f2 = open(os.path.join(settings.DATA_ROOT, 'tags.csv'), 'wt')
-        tag_writer = csv.writer(f2)
-        header = ['Tag id', 'Tag Name']
-        tag_writer.writerow(header)
-        for tag in all_tags:
-            tag_writer.writerow([tag.id, tag.name.encode('utf8')])
-        f2.close()
-
-        f2 = open(os.path.join(settings.DATA_ROOT, 'votes_tags.csv'), 'wt')
-        tag_writer = csv.writer(f2)
-        header = ['Vote id', 'Vote time', 'Vote name']
-        for tag in all_tags:
-            header.append(tag.id)
-        tag_writer.writerow(header)
-
-        for vote in Vote.objects.iterator():
-            row = [vote.id, vote.time, vote.title.encode('utf8')]
-            mks_for = vote.get_voters_id('for')
-            mks_against = vote.get_voters_id('against')
-            for mk in mks:
-                if mk['id'] in mks_for:
-                    row.append(1)
-                elif mk['id'] in mks_against:
-                    row.append(-1)
-                else:
-                    row.append(0)
-            mk_writer.writerow(row)
-
-            row = [vote.id, vote.time, vote.title.encode('utf8')]
-            tags = vote.tags
-            for tag in all_tags:
-                if tag in tags:
-                    row.append(1)
-                else:
-                    row.append(0)
-            tag_writer.writerow(row)
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
 
-        f.close()
-        f2.close()
+from laws.vote_export import FORMATS, VOTE_CHUNK_SIZE, VoteExporter
+
+
+class Command(BaseCommand):
+    help = "Export the votes of all members, and the vote tags, to DATA_ROOT"
+
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--format', action='store', dest='format', default='csv',
+            help='Export format, one of: %s (default: csv)' % ', '.join(FORMATS)
+        ),
+        make_option(
+            '--chunk-size', action='store', type='int', dest='chunk_size', default=VOTE_CHUNK_SIZE,
+            help='Number of votes read per query (default: %d)' % VOTE_CHUNK_SIZE
+        ),
+        make_option(
+            '--output-dir', action='store', dest='output_dir', default=None,
+            help='Directory to write the export files to (default: DATA_ROOT)'
+        ),
+    )
+
+    def handle(self, *args, **options):
+        try:
+            exporter = VoteExporter(options['output_dir'] or settings.DATA_ROOT, format=options['format'],
+                                    chunk_size=options['chunk_size'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        exporter.export()
@@ -0,0 +1,41 @@
+# encoding: utf-8
+from __future__ import print_function
+
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from laws.duplicates import NEAR_DUPLICATE_THRESHOLD, plan_duplicate_merges
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Merge duplicate laws, and identical bills of each law"
+
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--dry-run', action='store_true', dest='dry_run', default=False,
+            help='Only print the planned merges'
+        ),
+        make_option(
+            '--near', action='store_true', dest='near', default=False,
+            help='Also merge laws with similar (not only identical) titles'
+        ),
+        make_option(
+            '--threshold', action='store', type='float', dest='threshold', default=NEAR_DUPLICATE_THRESHOLD,
+            help='Minimal title similarity (0-1) of near duplicate laws (default: %s)' % NEAR_DUPLICATE_THRESHOLD
+        ),
+    )
+
+    def handle(self, *args, **options):
+        if not 0 < options['threshold'] <= 1:
+            raise CommandError('threshold should be between 0 and 1')
+        plan = plan_duplicate_merges(near=options['near'], threshold=options['threshold'])
+        if options['dry_run']:
+            for line in plan.report():
+                print(line.encode('utf8'))
+            print('%d merges planned' % len(plan))
+            return
+        plan.apply()
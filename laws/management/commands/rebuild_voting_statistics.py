@@ -0,0 +1,17 @@
+# encoding: utf-8
+from __future__ import print_function
+
+from django.core.management.base import NoArgsCommand
+
+from laws.voting_statistics import rebuild_voting_statistics
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(NoArgsCommand):
+    help = "Rebuild the materialized member and party voting statistics from the vote actions"
+
+    def handle_noargs(self, **options):
+        rebuild_voting_statistics()
+        logger.info('Rebuilt member and party voting statistics')
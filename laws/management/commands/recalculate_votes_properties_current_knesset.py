@@ -31,7 +31,5 @@ class Command(BaseCommand):
             logger.info("Not updating the db, dry run was specified")
             return
 
-        for vote in votes_to_update:
-
-            vote.update_vote_properties()
-            logger.info(u'Recalculated vote properties for {0}'.format(vote))
+        updated = Vote.objects.update_vote_properties(votes_to_update.iterator())
+        logger.info(u'Recalculated vote properties for {0} votes'.format(updated))
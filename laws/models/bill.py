@@ -5,7 +5,7 @@ from datetime import date
 
 import voting
 import waffle
-from actstream import Follow, Action, action
+from actstream import Follow
 from django.conf import settings
 from django.contrib.comments.models import Comment
 from django.contrib.contenttypes.models import ContentType
@@ -390,9 +390,10 @@ class Bill(models.Model):
         self.generate_activity_stream()
 
     def generate_activity_stream(self):
-        ''' create an activity stream based on the data stored in self '''
+        ''' sync the activity stream with the data stored in self '''
+        from knesset.activity import ActivityReconciler
+        stream = ActivityReconciler(actor=self)
 
-        Action.objects.stream_for_actor(self).delete()
         ps = list(self.proposals.all())
         try:
             ps.append(self.gov_proposal)
@@ -400,13 +401,11 @@ class Bill(models.Model):
             pass
 
         for p in ps:
-            action.send(self, verb='was-proposed', target=p,
-                        timestamp=p.date, description=p.title)
+            stream.add('was-proposed', target=p, timestamp=p.date, description=p.title)
 
         try:
             p = self.knesset_proposal
-            action.send(self, verb='was-knesset-proposed', target=p,
-                        timestamp=p.date, description=p.title)
+            stream.add('was-knesset-proposed', target=p, timestamp=p.date, description=p.title)
         except KnessetProposal.DoesNotExist:
             pass
 
@@ -416,31 +415,28 @@ class Bill(models.Model):
                 if v.title.find(h) >= 0:  # converted to discussion
                     discussion = True
             if discussion:
-                action.send(self, verb='was-converted-to-discussion', target=v,
-                            timestamp=v.time)
+                stream.add('was-converted-to-discussion', target=v, timestamp=v.time)
             else:
-                action.send(self, verb='was-pre-voted', target=v,
-                            timestamp=v.time, description=v.passed)
+                stream.add('was-pre-voted', target=v, timestamp=v.time, description=v.passed)
 
         if self.first_vote:
-            action.send(self, verb='was-first-voted', target=self.first_vote,
-                        timestamp=self.first_vote.time, description=self.first_vote.passed)
+            stream.add('was-first-voted', target=self.first_vote,
+                       timestamp=self.first_vote.time, description=self.first_vote.passed)
 
         if self.approval_vote:
-            action.send(self, verb='was-approval-voted', target=self.approval_vote,
-                        timestamp=self.approval_vote.time, description=self.approval_vote.passed)
+            stream.add('was-approval-voted', target=self.approval_vote,
+                       timestamp=self.approval_vote.time, description=self.approval_vote.passed)
 
-        for cm in self.first_committee_meetings.all():
-            action.send(self, verb='was-discussed-1', target=cm,
-                        timestamp=cm.date, description=cm.committee.name)
+        for cm in self.first_committee_meetings.select_related('committee'):
+            stream.add('was-discussed-1', target=cm, timestamp=cm.date, description=cm.committee.name)
 
-        for cm in self.second_committee_meetings.all():
-            action.send(self, verb='was-discussed-2', target=cm,
-                        timestamp=cm.date, description=cm.committee.name)
+        for cm in self.second_committee_meetings.select_related('committee'):
+            stream.add('was-discussed-2', target=cm, timestamp=cm.date, description=cm.committee.name)
 
         for g in self.gov_decisions.all():
-            action.send(self, verb='was-voted-on-gov', target=g,
-                        timestamp=g.date, description=str(g.stand))
+            stream.add('was-voted-on-gov', target=g, timestamp=g.date, description=str(g.stand))
+
+        stream.reconcile()
 
     @property
     def frozen(self):
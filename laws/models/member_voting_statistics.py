@@ -1,35 +1,33 @@
 # encoding: utf-8
-from django.conf import settings
-from django.core.cache import cache
 from django.db import models
 
 from laws.models.vote_action import VoteAction
+from laws.models.voting_statistics_counters import VotingStatisticsCounters
 import logging
 
 logger = logging.getLogger("open-knesset.laws.models")
 
 
-class MemberVotingStatistics(models.Model):
-    # TODO: why is this a django model? could be method on member or a projection class
+class MemberVotingStatistics(VotingStatisticsCounters):
+    # the *_total counters cover all the member's votes, queries with a
+    # from_date still go to the vote actions table
     class Meta:
         app_label = 'laws'
 
+    owner_field = 'member'
+
     member = models.OneToOneField('mks.Member', related_name='voting_statistics')
 
     def votes_against_party_count(self, from_date=None):
         if from_date:
             return VoteAction.objects.filter(member=self.member, against_party=True, vote__time__gt=from_date).count()
-        return VoteAction.objects.filter(member=self.member, against_party=True).count()
+        return self.against_party_total
 
     def votes_count(self, from_date=None):
         if from_date:
             return VoteAction.objects.filter(member=self.member, vote__time__gt=from_date).exclude(
                 type='no-vote').count()
-        vc = cache.get('votes_count_%d' % self.member.id)
-        if not vc:
-            vc = VoteAction.objects.filter(member=self.member).exclude(type='no-vote').count()
-            cache.set('votes_count_%d' % self.member.id, vc, settings.LONG_CACHE_TIME)
-        return vc
+        return self.votes_total
 
     def average_votes_per_month(self):
         if hasattr(self, '_average_votes_per_month'):
@@ -50,13 +48,17 @@ class MemberVotingStatistics(models.Model):
         total_votes = self.votes_count(from_date)
         if total_votes <= 3:  # not enough data
             return None
-        if self.member.current_party.is_coalition:
-            v = VoteAction.objects.filter(member=self.member, against_coalition=True)
-        else:
-            v = VoteAction.objects.filter(member=self.member, against_opposition=True)
+        is_coalition = self.member.current_party.is_coalition
         if from_date:
-            v = v.filter(vote__time__gt=from_date)
-        votes_against_coalition = v.count()
+            if is_coalition:
+                v = VoteAction.objects.filter(member=self.member, against_coalition=True)
+            else:
+                v = VoteAction.objects.filter(member=self.member, against_opposition=True)
+            votes_against_coalition = v.filter(vote__time__gt=from_date).count()
+        elif is_coalition:
+            votes_against_coalition = self.against_coalition_total
+        else:
+            votes_against_coalition = self.against_opposition_total
         return round(100.0 * (total_votes - votes_against_coalition) / total_votes, 1)
 
     def __unicode__(self):
@@ -2,32 +2,27 @@
 from django.db import models
 from django.utils.translation import ugettext_lazy as _
 
-from laws.models.vote_action import VoteAction
-from mks.models import Knesset
+from laws.models.voting_statistics_counters import VotingStatisticsCounters
 import logging
 
 logger = logging.getLogger("open-knesset.laws.models")
 
 
-class PartyVotingStatistics(models.Model):
-    # TODO: why is this a django model? could be method on Party or a projection class
+class PartyVotingStatistics(VotingStatisticsCounters):
+    # the *_total counters cover the current knesset votes of the party's
+    # current members
     class Meta:
         app_label = 'laws'
 
+    owner_field = 'party'
+
     party = models.OneToOneField('mks.Party', related_name='voting_statistics')
 
     def votes_against_party_count(self):
-        d = Knesset.objects.current_knesset().start_date
-        return VoteAction.objects.filter(
-            vote__time__gt=d,
-            member__current_party=self.party,
-            against_party=True).count()
+        return self.against_party_total
 
     def votes_count(self):
-        d = Knesset.objects.current_knesset().start_date
-        return VoteAction.objects.filter(
-            member__current_party=self.party,
-            vote__time__gt=d).exclude(type='no-vote').count()
+        return self.votes_total
 
     def votes_per_seat(self):
         return round(float(self.votes_count()) / self.party.number_of_seats, 1)
@@ -42,19 +37,12 @@ class PartyVotingStatistics(models.Model):
 
     def coalition_discipline(self):  # if party is in opposition this actually
         # returns opposition_discipline
-        d = Knesset.objects.current_knesset().start_date
         total_votes = self.votes_count()
         if total_votes:
             if self.party.is_coalition:
-                votes_against_coalition = VoteAction.objects.filter(
-                    vote__time__gt=d,
-                    member__current_party=self.party,
-                    against_coalition=True).count()
+                votes_against_coalition = self.against_coalition_total
             else:
-                votes_against_coalition = VoteAction.objects.filter(
-                    vote__time__gt=d,
-                    member__current_party=self.party,
-                    against_opposition=True).count()
+                votes_against_coalition = self.against_opposition_total
             return round(100.0 * (total_votes - votes_against_coalition) /
                          total_votes, 1)
         return _('N/A')
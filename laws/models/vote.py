@@ -8,13 +8,12 @@ from django.db import models
 from django.utils.translation import ugettext_lazy as _
 from tagging.models import TaggedItem, Tag
 
-from laws import constants
 from laws.enums import VOTE_TYPES
-from laws.helpers import resolve_vote_type_by_title
 from laws.models.bill import Bill
 from laws.models.vote_action import VoteAction
 from laws.vote_choices import TYPE_CHOICES
-from mks.models import Party, Member
+from laws.vote_properties import VotePropertiesCalculator
+from mks.models import Member
 
 from tagvotes.models import TagVote
 import logging
@@ -71,6 +70,13 @@ class VoteManager(models.Manager):
                 bills_first__isnull=False).exclude(bill_approved__isnull=False)
         return qs
 
+    def update_vote_properties(self, votes=None):
+        """Recalculate the properties of many votes (all votes by default)
+        sharing a single VotePropertiesCalculator"""
+        if votes is None:
+            votes = self.all()
+        return VotePropertiesCalculator().update(votes)
+
 
 class Vote(models.Model):
     meeting_number = models.IntegerField(null=True, blank=True)
@@ -193,102 +199,7 @@ class Vote(models.Model):
         return tf
 
     def update_vote_properties(self):
-        # TODO: this can be heavily optimized. somewhere sometimes..
-        party_ids = Party.objects.values_list('id', flat=True)
-        d = self.time.date()
-        party_is_coalition = dict(zip(
-            party_ids,
-            [x.is_coalition_at(self.time.date())
-             for x in Party.objects.all()]
-        ))
-
-        def party_at_or_error(member, vote_date):
-            party = member.party_at(vote_date)
-            if party:
-                return party
-            else:
-                raise Exception(
-                    'could not find which party member %s belonged to during vote %s' % (member.pk, self.pk))
-
-        for_party_ids = [party_at_or_error(va.member, vote_date=d).id for va in self.for_votes()]
-        party_for_votes = [sum([x == party_id for x in for_party_ids]) for party_id in party_ids]
-
-        against_party_ids = [party_at_or_error(va.member, vote_date=d).id for va in self.against_votes()]
-        party_against_votes = [sum([x == party_id for x in against_party_ids]) for party_id in party_ids]
-
-        party_stands_for = [float(for_votes) > constants.STANDS_FOR_THRESHOLD * (for_votes + against_votes) for (for_votes, against_votes) in
-                            zip(party_for_votes, party_against_votes)]
-        party_stands_against = [float(against_votes) > constants.STANDS_FOR_THRESHOLD * (for_votes + against_votes) for (for_votes, against_votes) in
-                                zip(party_for_votes, party_against_votes)]
-
-        party_stands_for = dict(zip(party_ids, party_stands_for))
-        party_stands_against = dict(zip(party_ids, party_stands_against))
-
-        coalition_for_votes = sum([x for (x, y) in zip(party_for_votes, party_ids) if party_is_coalition[y]])
-        coalition_against_votes = sum([x for (x, y) in zip(party_against_votes, party_ids) if party_is_coalition[y]])
-        opposition_for_votes = sum([x for (x, y) in zip(party_for_votes, party_ids) if not party_is_coalition[y]])
-        opposition_against_votes = sum(
-            [x for (x, y) in zip(party_against_votes, party_ids) if not party_is_coalition[y]])
-
-        coalition_total_votes = coalition_for_votes + coalition_against_votes
-        coalition_stands_for = (
-            float(coalition_for_votes) > constants.STANDS_FOR_THRESHOLD * (coalition_total_votes))
-        coalition_stands_against = float(coalition_against_votes) > constants.STANDS_FOR_THRESHOLD * (
-            coalition_total_votes)
-        opposition_total_votes = opposition_for_votes + opposition_against_votes
-        opposition_stands_for = float(opposition_for_votes) > constants.STANDS_FOR_THRESHOLD * opposition_total_votes
-        opposition_stands_against = float(
-            opposition_against_votes) > constants.STANDS_FOR_THRESHOLD * opposition_total_votes
-
-        # a set of all MKs that proposed bills this vote is about.
-        proposers = [set(b.proposers.all()) for b in self.bills()]
-        if proposers:
-            proposers = reduce(lambda x, y: set.union(x, y), proposers)
-
-        against_party_count = 0
-        against_coalition_count = 0
-        against_opposition_count = 0
-        against_own_bill_count = 0
-        for va in VoteAction.objects.filter(vote=self):
-            va.against_party = False
-            va.against_coalition = False
-            va.against_opposition = False
-            va.against_own_bill = False
-            voting_member_party_at_vote = party_at_or_error(va.member, vote_date=d)
-            vote_action_member_party_id = voting_member_party_at_vote.id
-            if party_stands_for[vote_action_member_party_id] and va.type == 'against':
-                va.against_party = True
-                against_party_count += 1
-            if party_stands_against[vote_action_member_party_id] and va.type == 'for':
-                va.against_party = True
-                against_party_count += 1
-            if voting_member_party_at_vote.is_coalition_at(self.time.date()):
-                if (coalition_stands_for and va.type == 'against') or (coalition_stands_against and va.type == 'for'):
-                    va.against_coalition = True
-                    against_coalition_count += 1
-            else:
-                if (opposition_stands_for and va.type == 'against') or (opposition_stands_against and va.type == 'for'):
-                    va.against_opposition = True
-                    against_opposition_count += 1
-
-            if va.member in proposers and va.type == 'against':
-                va.against_own_bill = True
-                against_own_bill_count += 1
-
-            va.save()
-
-        self.against_party = against_party_count
-        self.against_coalition = against_coalition_count
-        self.against_opposition = against_opposition_count
-        self.against_own_bill = against_own_bill_count
-        self.votes_count = VoteAction.objects.filter(vote=self).count()
-        self.for_votes_count = VoteAction.objects.filter(vote=self, type='for').count()
-        self.against_votes_count = VoteAction.objects.filter(vote=self, type='against').count()
-        self.abstain_votes_count = VoteAction.objects.filter(vote=self, type='abstain').count()
-        self.controversy = min(self.for_votes_count or 0,
-                               self.against_votes_count or 0)
-        self.vote_type = resolve_vote_type_by_title(self.title)
-        self.save()
+        VotePropertiesCalculator().update([self])
 
     def redownload_votes_page(self):
         from simple.management.commands.syncdata import Command as SyncdataCommand
@@ -0,0 +1,81 @@
+# encoding: utf-8
+from django.db import models, transaction
+from django.db.models import F
+
+import logging
+
+logger = logging.getLogger("open-knesset.laws.models")
+
+COUNTER_FIELDS = ('votes_total', 'against_party_total', 'against_coalition_total', 'against_opposition_total')
+
+
+class VotingStatisticsCountersManager(models.Manager):
+    def apply_deltas(self, deltas):
+        """Increment the counters by the given deltas.
+
+        deltas is a dict of owner id => sequence of increments, one per
+        COUNTER_FIELDS item. Owners sharing the same increments are updated
+        with a single query. Missing rows are created with the increments;
+        decrements of missing rows have nothing to apply to and are dropped.
+        """
+        owners_by_delta = {}
+        for owner_id, delta in deltas.items():
+            delta = tuple(delta)
+            if any(delta):
+                owners_by_delta.setdefault(delta, []).append(owner_id)
+        if not owners_by_delta:
+            return
+        owner_id_field = '%s_id' % self.model.owner_field
+        owner_lookup = '%s__in' % self.model.owner_field
+        existing = set(self.filter(**{owner_lookup: [owner_id for owner_ids in owners_by_delta.values()
+                                                     for owner_id in owner_ids]})
+                       .values_list(owner_id_field, flat=True))
+        new_rows = []
+        for delta, owner_ids in owners_by_delta.items():
+            self.filter(**{owner_lookup: owner_ids}).update(
+                **dict((field, F(field) + value) for field, value in zip(COUNTER_FIELDS, delta) if value))
+            for owner_id in owner_ids:
+                if owner_id in existing:
+                    continue
+                if min(delta) < 0:
+                    logger.warning('dropped %s voting statistics delta %s of %s %s with no counters row' % (
+                        self.model.__name__, delta, self.model.owner_field, owner_id))
+                    continue
+                row = self.model(**{owner_id_field: owner_id})
+                for field, value in zip(COUNTER_FIELDS, delta):
+                    setattr(row, field, value)
+                new_rows.append(row)
+        self.bulk_create(new_rows)
+
+    @transaction.atomic
+    def set_counters(self, counters):
+        """Overwrite the counters of all rows.
+
+        counters is a dict of owner id => sequence of values, one per
+        COUNTER_FIELDS item. Owners which are not in counters are reset to 0,
+        missing rows are created.
+        """
+        owner_id_field = '%s_id' % self.model.owner_field
+        existing = set(self.values_list(owner_id_field, flat=True))
+        self.bulk_create([self.model(**{owner_id_field: owner_id})
+                          for owner_id in set(counters) - existing])
+        self.update(**dict((field, 0) for field in COUNTER_FIELDS))
+        for owner_id, values in counters.items():
+            self.filter(**{owner_id_field: owner_id}).update(**dict(zip(COUNTER_FIELDS, values)))
+
+
+class VotingStatisticsCounters(models.Model):
+    """Materialized vote action counters, kept up to date by
+    laws.voting_statistics"""
+    # name of the foreign key to the object these statistics belong to
+    owner_field = None
+
+    votes_total = models.IntegerField(default=0)
+    against_party_total = models.IntegerField(default=0)
+    against_coalition_total = models.IntegerField(default=0)
+    against_opposition_total = models.IntegerField(default=0)
+
+    objects = VotingStatisticsCountersManager()
+
+    class Meta:
+        abstract = True
@@ -1,6 +1,7 @@
 # encoding: utf-8
 #
 
+import csv
 import json
 from datetime import date, timedelta, datetime
 
@@ -10,6 +11,7 @@ from django.test import TestCase
 from tagging.models import Tag
 
 from agendas.models import Agenda, AgendaVote, AgendaBill
+from laws.api import VoteResource
 from laws.models import Vote, Bill, KnessetProposal, Law
 from mks.models import Knesset, Party, Member
 
@@ -145,7 +147,7 @@ class APIv2Test(TestCase):
                                                    'api_name': 'v2'})
         res = self.client.get(uri, format='json')
         self.assertEqual(res.status_code, 200)
-        data = json.loads(res.content)
+        data = json.loads(''.join(res.streaming_content))
         self.assertEqual(data['meta']['total_count'], 2)
         self.assertEqual(len(data['objects']), 2)
 
@@ -154,10 +156,39 @@ class APIv2Test(TestCase):
                                                    'api_name': 'v2'})
         res = self.client.get(uri, dict(proposer=self.mk_1.id, format='json'))
         self.assertEqual(res.status_code, 200)
-        data = json.loads(res.content)
+        data = json.loads(''.join(res.streaming_content))
         self.assertEqual(data['meta']['total_count'], 1)
         self.assertEqual(len(data['objects']), 1)
 
+    def test_vote_list_streams_all_objects(self):
+        uri = reverse('api_dispatch_list', kwargs={'resource_name': 'vote',
+                                                   'api_name': 'v2'})
+        res = self.client.get(uri, dict(limit=0, format='json'))
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res.streaming)
+        data = json.loads(''.join(res.streaming_content))
+        self.assertEqual(data['meta']['total_count'], 2)
+        self.assertNotIn('next', data['meta'])
+        self.assertEqual(set(vote['title'] for vote in data['objects']), set(['vote 1', 'vote 2']))
+
+        res = self.client.get(uri, dict(limit=1, format='csv'))
+        self.assertEqual(res['Content-Type'], 'text/csv; charset=utf-8')
+        rows = list(csv.reader(''.join(res.streaming_content).splitlines()))
+        self.assertEqual(len(rows), 2)
+        self.assertIn(u'title', [column.decode('utf-8-sig') for column in rows[0]])
+
+    def test_vote_list_pages_keep_max_limit(self):
+        uri = reverse('api_dispatch_list', kwargs={'resource_name': 'vote',
+                                                   'api_name': 'v2'})
+        max_limit = VoteResource._meta.max_limit
+        res = self.client.get(uri, dict(limit=max_limit + 1, format='json'))
+        data = json.loads(''.join(res.streaming_content))
+        self.assertEqual(data['meta']['limit'], max_limit)
+
+        res = self.client.get(uri, dict(limit=0, format='json'))
+        data = json.loads(''.join(res.streaming_content))
+        self.assertEqual(data['meta']['limit'], 0)
+
     def tearDown(self):
         self.vote_1.delete()
         self.vote_2.delete()
@@ -13,6 +13,7 @@ from django.test import TestCase
 from tagging.models import Tag
 
 from laws.models import Vote, Bill, KnessetProposal, BillBudgetEstimation
+from links.models import Link
 from laws.models.proposal import PrivateProposal
 
 from mks.models import Knesset, Member
@@ -160,6 +161,19 @@ class BillDetailViewsTest(TestCase):
         self.assertTrue(
             extra_proposers.filter(id=self.mk_non_active.id).exists())
 
+    def test_bill_detail_shows_proposers_links(self):
+        self._given_bill_with_proposals_from_current_and_non_current_knesset()
+        Link.objects.create(url='http://example.com/mk_active_1', title='mk_active_1 site',
+                            content_object=self.mk_active_1)
+        Link.objects.create(url='http://example.com/mk_non_active', title='mk_non_active site',
+                            content_object=self.mk_non_active)
+
+        res = self.client.get(
+            reverse('bill-detail', kwargs={'pk': self.bill_with_proposal.id}))
+        self.assertEqual(res.status_code, 200)
+        self.assertContains(res, 'http://example.com/mk_active_1')
+        self.assertContains(res, 'http://example.com/mk_non_active')
+
     def test_private_bill_proposed_before_current_knesset_displays_latest_proposers_only(
             self):
         self._given_bill_with_proposals_from_non_current_knesset_only()
@@ -0,0 +1,52 @@
+# encoding: utf-8
+import datetime
+
+from django.test import TestCase
+
+from laws.duplicates import duplicate_groups, plan_duplicate_merges
+from laws.models import Bill, Law
+
+
+class DuplicateGroupsTest(TestCase):
+    def test_groups_by_cannonized_title(self):
+        items = [(1, u'חוק החינוך'), (2, u'חוק "החינוך"'), (3, u'חוק הבריאות'), (4, u'חוק-החינוך')]
+        self.assertEqual(duplicate_groups(items), [[1, 2, 4]])
+
+    def test_near_duplicates(self):
+        items = [(1, u'חוק ביטוח בריאות ממלכתי לכל תושבי המדינה'),
+                 (2, u'חוק ביטוח בריאות ממלכתי לכל תושבי המדינה התשנד'),
+                 (3, u'חוק ביטוח לאומי')]
+        self.assertEqual(duplicate_groups(items), [])
+        self.assertEqual(duplicate_groups(items, near=True, threshold=0.8), [[1, 2]])
+
+
+class MergeDuplicateLawsTest(TestCase):
+    def setUp(self):
+        super(MergeDuplicateLawsTest, self).setUp()
+        self.law = Law.objects.create(title=u'חוק החינוך')
+        self.duplicate_law = Law.objects.create(title=u'חוק "החינוך"')
+        self.other_law = Law.objects.create(title=u'חוק הבריאות')
+        self.bill = Bill.objects.create(stage='1', title=u'חוק החינוך (תיקון)', law=self.law,
+                                        stage_date=datetime.date(2015, 1, 1))
+        self.duplicate_bill = Bill.objects.create(stage='1', title=u'חוק החינוך - תיקון', law=self.duplicate_law,
+                                                  stage_date=datetime.date(2014, 1, 1))
+        self.other_bill = Bill.objects.create(stage='1', title=u'חוק הבריאות', law=self.other_law)
+
+    def test_plan(self):
+        plan = plan_duplicate_merges()
+        self.assertEqual(plan.laws, [(self.law.id, [self.duplicate_law.id])])
+        self.assertEqual(plan.bills, [(self.bill.id, [self.duplicate_bill.id])])
+        self.assertEqual(len(plan.report()), 2)
+
+    def test_plan_keeps_the_later_law_on_equal_bills(self):
+        later_law = Law.objects.create(title=u'חוק-החינוך')
+        Bill.objects.create(stage='1', title=u'חוק החינוך (תיקון מס 2)', law=later_law)
+        plan = plan_duplicate_merges()
+        self.assertEqual(plan.laws, [(later_law.id, [self.law.id, self.duplicate_law.id])])
+
+    def test_apply(self):
+        plan_duplicate_merges().apply()
+        self.assertEqual(Law.objects.get(pk=self.duplicate_law.id).merged_into_id, self.law.id)
+        self.assertEqual(list(self.law.bills.all()), [self.bill])
+        self.assertFalse(Bill.objects.filter(pk=self.duplicate_bill.id).exists())
+        self.assertEqual(plan_duplicate_merges().laws, [])
@@ -0,0 +1,72 @@
+# encoding: utf-8
+import csv
+import datetime
+import gzip
+import os
+import shutil
+import tempfile
+
+import numpy as np
+from django.test import TestCase
+
+from laws.models import Vote, VoteAction
+from laws.vote_export import VoteExporter
+from mks.models import Member
+
+
+class VoteExportTest(TestCase):
+    def setUp(self):
+        super(VoteExportTest, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.mks = [Member.objects.create(name='mk %d' % i) for i in range(3)]
+        self.votes = [Vote.objects.create(title=u'הצבעה %d' % i, time=datetime.datetime(2011, 1, i + 1))
+                      for i in range(3)]
+        for vote, types in zip(self.votes, (('for', 'against', 'abstain'), ('against', 'for', 'for'), ())):
+            for mk, action_type in zip(self.mks, types):
+                VoteAction.objects.create(vote=vote, member=mk, type=action_type)
+        self.votes[1].tags = 'economy'
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        super(VoteExportTest, self).tearDown()
+
+    def mk_columns(self):
+        with open(os.path.join(self.directory, 'mks.csv')) as f:
+            return [int(float(row[0])) for row in csv.reader(f)]
+
+    def expected_mk_rows(self):
+        columns = self.mk_columns()
+        values = {
+            self.votes[0].id: {self.mks[0].id: 1, self.mks[1].id: -1},
+            self.votes[1].id: {self.mks[0].id: -1, self.mks[1].id: 1, self.mks[2].id: 1},
+        }
+        return [[values.get(vote.id, {}).get(mk_id, 0) for mk_id in columns] for vote in self.votes]
+
+    def test_export_csv_in_chunks(self):
+        self.assertEqual(VoteExporter(self.directory, chunk_size=2).export(), 3)
+        with open(os.path.join(self.directory, 'votes_mks.csv')) as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows[0][3:], [str(mk_id) for mk_id in self.mk_columns()])
+        self.assertEqual([int(row[0]) for row in rows[1:]], [vote.id for vote in self.votes])
+        self.assertEqual([map(int, row[3:]) for row in rows[1:]], self.expected_mk_rows())
+
+        with open(os.path.join(self.directory, 'votes_tags.csv')) as f:
+            rows = list(csv.reader(f))
+        self.assertEqual([row[3:] for row in rows[1:]], [['0'], ['1'], ['0']])
+
+    def test_export_gzipped_csv(self):
+        VoteExporter(self.directory, format='csv.gz').export()
+        with gzip.open(os.path.join(self.directory, 'votes_mks.csv.gz')) as f:
+            rows = list(csv.reader(f))
+        self.assertEqual([map(int, row[3:]) for row in rows[1:]], self.expected_mk_rows())
+
+    def test_export_npy(self):
+        VoteExporter(self.directory, format='npy', chunk_size=1).export()
+        matrix = np.load(os.path.join(self.directory, 'votes_mks.npy'))
+        self.assertEqual(matrix.dtype, np.int8)
+        self.assertEqual(matrix.tolist(), self.expected_mk_rows())
+        with open(os.path.join(self.directory, 'votes.csv')) as f:
+            self.assertEqual([int(row[0]) for row in list(csv.reader(f))[1:]], [vote.id for vote in self.votes])
+
+    def test_unknown_format(self):
+        self.assertRaises(ValueError, VoteExporter, self.directory, format='xls')
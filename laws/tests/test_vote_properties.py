@@ -0,0 +1,81 @@
+# encoding: utf-8
+import datetime
+
+from django.test import TestCase
+
+from laws.models import Vote, VoteAction, Bill
+from mks.models import Knesset, Party, Member, Membership, CoalitionMembership
+
+
+class VotePropertiesTest(TestCase):
+    def setUp(self):
+        super(VotePropertiesTest, self).setUp()
+        self.knesset = Knesset.objects.create(number=1, start_date=datetime.date(2010, 1, 1))
+        self.coalition_party = Party.objects.create(name='coalition party', knesset=self.knesset)
+        self.opposition_party = Party.objects.create(name='opposition party', knesset=self.knesset)
+        CoalitionMembership.objects.create(party=self.coalition_party, start_date=datetime.date(2010, 1, 1))
+
+        self.coalition_mks = [self.given_member('coalition mk %d' % i, self.coalition_party) for i in range(4)]
+        self.opposition_mks = [self.given_member('opposition mk %d' % i, self.opposition_party) for i in range(2)]
+
+        self.vote = Vote.objects.create(title='vote 1', time=datetime.datetime(2011, 1, 1))
+        self.bill = Bill.objects.create(stage='1', title='bill 1', first_vote=self.vote)
+        self.bill.proposers.add(self.coalition_mks[3])
+
+    def given_member(self, name, party):
+        member = Member.objects.create(name=name, current_party=party, start_date=datetime.date(2010, 1, 1))
+        Membership.objects.create(member=member, party=party, start_date=datetime.date(2010, 1, 1))
+        return member
+
+    def given_vote_actions(self, vote, members, action_type):
+        for member in members:
+            VoteAction.objects.create(vote=vote, member=member, party=member.current_party, type=action_type)
+
+    def test_update_vote_properties_flags_against_party_and_own_bill(self):
+        self.given_vote_actions(self.vote, self.coalition_mks[:3], 'for')
+        self.given_vote_actions(self.vote, self.coalition_mks[3:], 'against')
+        self.given_vote_actions(self.vote, self.opposition_mks, 'against')
+
+        self.vote.update_vote_properties()
+
+        vote = Vote.objects.get(pk=self.vote.pk)
+        self.assertEqual(vote.votes_count, 6)
+        self.assertEqual(vote.for_votes_count, 3)
+        self.assertEqual(vote.against_votes_count, 3)
+        self.assertEqual(vote.controversy, 3)
+        self.assertEqual(vote.against_party, 1)
+        self.assertEqual(vote.against_coalition, 1)
+        self.assertEqual(vote.against_opposition, 0)
+        self.assertEqual(vote.against_own_bill, 1)
+
+        rebel = VoteAction.objects.get(vote=self.vote, member=self.coalition_mks[3])
+        self.assertTrue(rebel.against_party)
+        self.assertTrue(rebel.against_coalition)
+        self.assertFalse(rebel.against_opposition)
+        self.assertTrue(rebel.against_own_bill)
+        self.assertEqual(VoteAction.objects.filter(vote=self.vote, against_party=True).count(), 1)
+
+    def test_update_vote_properties_clears_stale_flags(self):
+        self.given_vote_actions(self.vote, self.coalition_mks, 'for')
+        VoteAction.objects.filter(vote=self.vote).update(against_party=True, against_coalition=True)
+
+        Vote.objects.update_vote_properties(Vote.objects.filter(pk=self.vote.pk))
+
+        self.assertEqual(VoteAction.objects.filter(vote=self.vote, against_party=True).count(), 0)
+        self.assertEqual(VoteAction.objects.filter(vote=self.vote, against_coalition=True).count(), 0)
+        self.assertEqual(Vote.objects.get(pk=self.vote.pk).against_party, 0)
+
+    def test_update_vote_properties_for_many_votes(self):
+        other_vote = Vote.objects.create(title='vote 2', time=datetime.datetime(2011, 1, 2))
+        self.given_vote_actions(self.vote, self.opposition_mks, 'for')
+        self.given_vote_actions(other_vote, self.opposition_mks[:1], 'for')
+        self.given_vote_actions(other_vote, self.opposition_mks[1:], 'abstain')
+
+        updated = Vote.objects.update_vote_properties()
+
+        self.assertEqual(updated, 2)
+        other_vote = Vote.objects.get(pk=other_vote.pk)
+        self.assertEqual(other_vote.votes_count, 2)
+        self.assertEqual(other_vote.for_votes_count, 1)
+        self.assertEqual(other_vote.abstain_votes_count, 1)
+        self.assertEqual(Vote.objects.get(pk=self.vote.pk).for_votes_count, 2)
@@ -0,0 +1,92 @@
+# encoding: utf-8
+import datetime
+
+from django.test import TestCase
+
+from laws.models import Vote, VoteAction, MemberVotingStatistics
+from laws.models.party_voting_statistics import PartyVotingStatistics
+from laws.models.voting_statistics_counters import COUNTER_FIELDS
+from laws.voting_statistics import rebuild_voting_statistics
+from mks.models import Knesset, Party, Member, Membership
+
+
+class VotingStatisticsTest(TestCase):
+    def setUp(self):
+        super(VotingStatisticsTest, self).setUp()
+        self.knesset = Knesset.objects.create(number=1, start_date=datetime.date(2010, 1, 1))
+        self.party = Party.objects.create(name='party 1', knesset=self.knesset, number_of_seats=4)
+        self.mks = []
+        for i in range(4):
+            member = Member.objects.create(name='mk %d' % i, current_party=self.party,
+                                           start_date=datetime.date(2010, 1, 1))
+            Membership.objects.create(member=member, party=self.party, start_date=datetime.date(2010, 1, 1))
+            self.mks.append(member)
+        self.vote = Vote.objects.create(title='vote 1', time=datetime.datetime(2011, 1, 1))
+        for member in self.mks[:3]:
+            VoteAction.objects.create(vote=self.vote, member=member, party=self.party, type='for')
+        VoteAction.objects.create(vote=self.vote, member=self.mks[3], party=self.party, type='against')
+
+    def member_statistics(self, member):
+        return MemberVotingStatistics.objects.get(member=member)
+
+    def member_counters(self):
+        return list(MemberVotingStatistics.objects.filter(member__in=self.mks).order_by('member').values_list(
+            *COUNTER_FIELDS))
+
+    def party_statistics(self):
+        return PartyVotingStatistics.objects.get(party=self.party)
+
+    def test_vote_action_creation_increments_counters(self):
+        self.assertEqual(self.member_statistics(self.mks[0]).votes_total, 1)
+        self.assertEqual(self.party_statistics().votes_count(), 4)
+        self.assertEqual(self.party_statistics().votes_per_seat(), 1.0)
+
+    def test_reflagging_vote_actions_updates_counters(self):
+        self.vote.update_vote_properties()
+
+        self.assertEqual(self.member_statistics(self.mks[3]).votes_against_party_count(), 1)
+        self.assertEqual(self.member_statistics(self.mks[0]).votes_against_party_count(), 0)
+        self.assertEqual(self.party_statistics().votes_against_party_count(), 1)
+        self.assertEqual(self.party_statistics().discipline(), 75.0)
+
+    def test_rebuild_matches_incremental_counters(self):
+        self.vote.update_vote_properties()
+        expected = self.member_counters()
+        MemberVotingStatistics.objects.update(votes_total=0, against_party_total=0)
+        PartyVotingStatistics.objects.update(votes_total=0, against_party_total=0)
+
+        rebuild_voting_statistics()
+
+        self.assertEqual(self.member_counters(), expected)
+        self.assertEqual(self.party_statistics().votes_total, 4)
+        self.assertEqual(self.party_statistics().against_party_total, 1)
+
+    def test_recreating_vote_actions_keeps_counters(self):
+        self.vote.update_vote_properties()
+        expected = self.member_counters()
+        actions = list(VoteAction.objects.filter(vote=self.vote).values('member', 'party', 'type'))
+        VoteAction.objects.filter(vote=self.vote).delete()
+        self.assertEqual(self.party_statistics().votes_total, 0)
+        for action in actions:
+            VoteAction.objects.create(vote=self.vote, member_id=action['member'], party_id=action['party'],
+                                      type=action['type'])
+        self.vote.update_vote_properties()
+
+        self.assertEqual(self.member_counters(), expected)
+        self.assertEqual(self.party_statistics().votes_total, 4)
+        self.assertEqual(self.party_statistics().against_party_total, 1)
+
+    def test_missing_counters_row_is_created(self):
+        MemberVotingStatistics.objects.filter(member=self.mks[0]).delete()
+        VoteAction.objects.create(vote=Vote.objects.create(title='vote 2', time=datetime.datetime(2011, 2, 1)),
+                                  member=self.mks[0], party=self.party, type='for')
+        self.assertEqual(self.member_statistics(self.mks[0]).votes_total, 1)
+
+    def test_rebuild_follows_party_switch(self):
+        other_party = Party.objects.create(name='party 2', knesset=self.knesset, number_of_seats=1)
+        Member.objects.filter(pk=self.mks[0].pk).update(current_party=other_party)
+
+        rebuild_voting_statistics()
+
+        self.assertEqual(self.party_statistics().votes_total, 3)
+        self.assertEqual(PartyVotingStatistics.objects.get(party=other_party).votes_total, 1)
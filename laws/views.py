@@ -3,10 +3,8 @@ import datetime
 import json
 import os
 
-import difflib
 import logging
 
-import itertools
 import tagging
 import voting
 from actstream import action
@@ -25,7 +23,7 @@ from django.views.decorators.csrf import ensure_csrf_cookie
 from django.db.models import Q
 from tagging.models import Tag, TaggedItem
 
-from agendas.models import Agenda, UserSuggestedVote, Link
+from agendas.models import Agenda, UserSuggestedVote
 from laws.vote_choices import BILL_STAGE_CHOICES
 from ok_tag.views import BaseTagMemberListView
 from auxiliary.mixins import CsvView
@@ -33,6 +31,7 @@ from forms import VoteSelectForm, BillSelectForm, BudgetEstimateForm
 from forms import AttachBillFromVoteForm
 from hashnav import DetailView, ListView as HashnavListView
 from knesset.utils import notify_responsible_adult
+from links.index import attach_links
 from mks.models import Member, Knesset
 from models import Bill, BillBudgetEstimation, Vote, KnessetProposal, VoteAction
 from committees.models import CommitteeMeeting
@@ -383,14 +382,8 @@ class BillDetailView(DetailView):
         proposers = proposers.select_related('current_party')
         extra_proposers = extra_proposers.select_related('current_party')
 
-        links = list(Link.objects.for_model(Member))
-        links_by_member = {}
-        for k, g in itertools.groupby(links, lambda x: x.object_pk):
-            links_by_member[str(k)] = list(g)
-        for proposer in proposers:
-            proposer.cached_links = links_by_member.get(str(proposer.pk), [])
-        for proposer in extra_proposers:
-            proposer.cached_links = links_by_member.get(str(proposer.pk), [])
+        attach_links(proposers)
+        attach_links(extra_proposers)
         context['proposers'] = proposers
         context['extra_proposers'] = extra_proposers
         votes = voting.models.Vote.objects.get_object_votes(bill)
@@ -870,7 +863,6 @@ class VoteDetailView(DetailView):
             return HttpResponseBadRequest()
         user_input_type = request.POST.get('user_input_type', None)
         vote = get_object_or_404(Vote, pk=object_id)
-        mk_names = Member.objects.values_list('name', flat=True)
         if user_input_type == 'agenda':
             try:
                 agenda_id = int(request.POST.get('agenda'))
@@ -914,10 +906,7 @@ class VoteDetailView(DetailView):
                 return self.get(request, bill_form=form)
 
         else:  # adding an MK (either for or against)
-            mk_name = \
-                difflib.get_close_matches(request.POST.get('mk_name'),
-                                          mk_names)[0]
-            mk = Member.objects.get(name=mk_name)
+            mk = Member.objects.find(request.POST.get('mk_name'))[0]
             stand = None
             if user_input_type == 'mk-for':
                 stand = 'for'
@@ -0,0 +1,191 @@
+# encoding: utf-8
+"""
+Streaming export of the votes matrix.
+
+The votes are read in chunks ordered by id, and each chunk's vote actions and
+tags are fetched with a single range query per chunk, so the export runs a
+constant number of queries per chunk and holds only one chunk in memory.
+
+Each vote becomes a row with one column per member (for = 1, against = -1,
+anything else = 0) and one column per tag (tagged = 1). The rows are written
+as CSV, gzipped CSV, or as int8 .npy matrices written through a memory map,
+with the order of their rows and columns in votes.csv, mks.csv and tags.csv.
+"""
+import csv
+import gzip
+import os
+from operator import attrgetter
+
+import numpy as np
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Count, Max
+from tagging.models import Tag, TaggedItem
+
+from laws.models import Bill, Vote, VoteAction
+from mks.models import Member
+import logging
+
+logger = logging.getLogger("open-knesset.laws.vote_export")
+
+FORMATS = ('csv', 'csv.gz', 'npy')
+VOTE_CHUNK_SIZE = 1000
+
+VOTE_VALUES = {
+    'for': 1,
+    'against': -1,
+}
+
+
+def iter_vote_chunks(max_id, chunk_size=VOTE_CHUNK_SIZE):
+    """Yields lists of (id, time, title) of the votes with ids up to max_id,
+    ordered by id"""
+    last_id = 0
+    while True:
+        votes = list(Vote.objects.filter(id__gt=last_id, id__lte=max_id).order_by('id')
+                     .values_list('id', 'time', 'title')[:chunk_size])
+        if not votes:
+            return
+        yield votes
+        last_id = votes[-1][0]
+
+
+def iter_vote_rows(mk_columns, tag_columns, max_id, chunk_size=VOTE_CHUNK_SIZE):
+    """Yields (vote id, time, title, mk values, tag values) for all the votes
+    up to max_id. mk_columns and tag_columns map member and tag ids to their
+    column index"""
+    vote_ct = ContentType.objects.get_for_model(Vote)
+    for votes in iter_vote_chunks(max_id, chunk_size):
+        first_id, last_id = votes[0][0], votes[-1][0]
+        mk_values = {}
+        actions = VoteAction.objects.filter(vote_id__gte=first_id, vote_id__lte=last_id,
+                                            type__in=VOTE_VALUES.keys())
+        for vote_id, member_id, action_type in actions.values_list('vote_id', 'member_id', 'type').iterator():
+            column = mk_columns.get(member_id)
+            if column is not None:
+                mk_values.setdefault(vote_id, {})[column] = VOTE_VALUES[action_type]
+        tag_values = {}
+        tagged_items = TaggedItem.objects.filter(content_type=vote_ct, object_id__gte=first_id,
+                                                 object_id__lte=last_id)
+        for vote_id, tag_id in tagged_items.values_list('object_id', 'tag_id').iterator():
+            column = tag_columns.get(tag_id)
+            if column is not None:
+                tag_values.setdefault(vote_id, {})[column] = 1
+        for vote_id, time, title in votes:
+            yield vote_id, time, title, mk_values.get(vote_id, {}), tag_values.get(vote_id, {})
+
+
+def _dense(values, size):
+    row = [0] * size
+    for column, value in values.iteritems():
+        row[column] = value
+    return row
+
+
+class CsvMatrixWriter(object):
+    """Writes matrix rows prefixed by the vote id, time and title"""
+
+    def __init__(self, path, columns, compress=False):
+        if compress:
+            self.file = gzip.open(path + '.gz', 'wb')
+        else:
+            self.file = open(path, 'wb')
+        self.size = len(columns)
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(['Vote id', 'Vote time', 'Vote name'] + list(columns))
+
+    def write(self, vote_id, time, title, values):
+        self.writer.writerow([vote_id, time, title.encode('utf8')] + _dense(values, self.size))
+
+    def close(self):
+        self.file.close()
+
+
+class NpyMatrixWriter(object):
+    """Writes matrix rows into an int8 .npy file through a memory map, so
+    the matrix never has to fit in memory"""
+
+    def __init__(self, path, rows, columns):
+        self.matrix = np.lib.format.open_memmap(path, mode='w+', dtype=np.int8, shape=(rows, len(columns)))
+        self.row = 0
+
+    def write(self, vote_id, time, title, values):
+        if values:
+            self.matrix[self.row, values.keys()] = values.values()
+        self.row += 1
+
+    def close(self):
+        self.matrix.flush()
+        del self.matrix
+
+
+class VoteExporter(object):
+    def __init__(self, directory, format='csv', chunk_size=VOTE_CHUNK_SIZE):
+        if format not in FORMATS:
+            raise ValueError('unknown export format %s, expected one of %s' % (format, ', '.join(FORMATS)))
+        self.directory = directory
+        self.format = format
+        self.chunk_size = chunk_size
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def export_mks(self):
+        mks = list(Member.objects.order_by('current_party__is_coalition', 'current_party__name')
+                   .values_list('id', 'name', 'current_party__name'))
+        with open(self._path('mks.csv'), 'wb') as f:
+            writer = csv.writer(f, quoting=csv.QUOTE_NONNUMERIC)
+            for mk_id, name, party_name in mks:
+                writer.writerow([mk_id, name.encode('utf8'), (party_name or u'').encode('utf8')])
+        return [mk_id for mk_id, name, party_name in mks]
+
+    def export_tags(self):
+        tags = list(set(Tag.objects.usage_for_model(Vote)).union(Tag.objects.usage_for_model(Bill)))
+        tags.sort(key=attrgetter('name'))
+        with open(self._path('tags.csv'), 'wb') as f:
+            writer = csv.writer(f)
+            writer.writerow(['Tag id', 'Tag Name'])
+            for tag in tags:
+                writer.writerow([tag.id, tag.name.encode('utf8')])
+        return [tag.id for tag in tags]
+
+    def _matrix_writers(self, mk_ids, tag_ids, rows):
+        if self.format == 'npy':
+            return (NpyMatrixWriter(self._path('votes_mks.npy'), rows, mk_ids),
+                    NpyMatrixWriter(self._path('votes_tags.npy'), rows, tag_ids))
+        compress = self.format == 'csv.gz'
+        return (CsvMatrixWriter(self._path('votes_mks.csv'), mk_ids, compress),
+                CsvMatrixWriter(self._path('votes_tags.csv'), tag_ids, compress))
+
+    def export(self):
+        """Writes the export files, and returns the number of votes exported"""
+        mk_ids = self.export_mks()
+        tag_ids = self.export_tags()
+        mk_columns = dict((mk_id, column) for column, mk_id in enumerate(mk_ids))
+        tag_columns = dict((tag_id, column) for column, tag_id in enumerate(tag_ids))
+
+        # votes added during the export are left for the next one
+        stats = Vote.objects.aggregate(count=Count('id'), max_id=Max('id'))
+        max_id = stats['max_id'] or 0
+
+        mks_writer, tags_writer = self._matrix_writers(mk_ids, tag_ids, stats['count'])
+        votes_file = None
+        if self.format == 'npy':
+            votes_file = open(self._path('votes.csv'), 'wb')
+            votes_writer = csv.writer(votes_file)
+            votes_writer.writerow(['Vote id', 'Vote time', 'Vote name'])
+        exported = 0
+        try:
+            for vote_id, time, title, mk_values, tag_values in iter_vote_rows(mk_columns, tag_columns, max_id,
+                                                                              self.chunk_size):
+                mks_writer.write(vote_id, time, title, mk_values)
+                tags_writer.write(vote_id, time, title, tag_values)
+                if votes_file is not None:
+                    votes_writer.writerow([vote_id, time, title.encode('utf8')])
+                exported += 1
+        finally:
+            mks_writer.close()
+            tags_writer.close()
+            if votes_file is not None:
+                votes_file.close()
+        logger.info('exported %d votes' % exported)
+        return exported
@@ -0,0 +1,203 @@
+# encoding: utf-8
+"""
+Set based recalculation of vote properties.
+
+Vote.update_vote_properties used to resolve the party of every voting member
+and the coalition status of every party with separate queries, and then save
+every VoteAction on its own. VotePropertiesCalculator loads the membership and
+coalition intervals once, classifies the actions of many votes in memory and
+writes back only the rows that actually changed, grouped into bulk updates.
+The materialized voting statistics are adjusted by the same changes.
+"""
+from collections import defaultdict
+from datetime import date
+
+from django.db import transaction
+
+from knesset.utils import QUERY_CHUNK_SIZE, chunks
+from laws import constants
+from laws.helpers import resolve_vote_type_by_title, MissingVotePartyException
+from laws.models.bill import Bill
+from laws.models.vote_action import VoteAction
+from laws.voting_statistics import vote_action_counters, update_voting_statistics
+from mks.models import Membership, CoalitionMembership
+import logging
+
+logger = logging.getLogger("open-knesset.laws.vote_properties")
+
+VOTE_ACTION_FLAGS = ('against_party', 'against_coalition', 'against_opposition', 'against_own_bill')
+
+class VotePropertiesCalculator(object):
+    """Recalculates the against_* flags and the vote counters of many votes.
+
+    The calculator keeps the membership and coalition intervals in memory, so
+    a single instance should be reused for all the votes of a run.
+    """
+
+    def __init__(self):
+        self._memberships = defaultdict(list)
+        for member_id, party_id, start_date, end_date in Membership.objects.values_list(
+                'member_id', 'party_id', 'start_date', 'end_date'):
+            self._memberships[member_id].append((start_date or date.min, end_date or date.max, party_id))
+        # when memberships overlap the most recent one wins
+        for intervals in self._memberships.values():
+            intervals.sort(reverse=True)
+
+        self._coalition_memberships = defaultdict(list)
+        for party_id, start_date, end_date in CoalitionMembership.objects.values_list(
+                'party_id', 'start_date', 'end_date'):
+            self._coalition_memberships[party_id].append((start_date or date.min, end_date or date.max))
+
+    def party_at(self, member_id, a_date):
+        for start_date, end_date, party_id in self._memberships.get(member_id, ()):
+            if start_date <= a_date <= end_date:
+                return party_id
+        return None
+
+    def is_coalition_at(self, party_id, a_date):
+        return any(start_date <= a_date <= end_date
+                   for start_date, end_date in self._coalition_memberships.get(party_id, ()))
+
+    def update(self, votes, chunk_size=QUERY_CHUNK_SIZE):
+        """Recalculate and store the properties of the given votes.
+
+        votes can be any iterable of Vote objects, including a queryset. The
+        objects are updated in place as well. Returns the number of votes
+        processed.
+        """
+        updated = 0
+        chunk = []
+        for vote in votes:
+            chunk.append(vote)
+            if len(chunk) == chunk_size:
+                self._update_chunk(chunk)
+                updated += len(chunk)
+                chunk = []
+        if chunk:
+            self._update_chunk(chunk)
+            updated += len(chunk)
+        return updated
+
+    @transaction.atomic
+    def _update_chunk(self, votes):
+        vote_ids = [vote.id for vote in votes]
+        actions = defaultdict(list)
+        for action in VoteAction.objects.filter(vote__in=vote_ids).values_list(
+                'id', 'vote_id', 'member_id', 'type', *VOTE_ACTION_FLAGS):
+            actions[action[1]].append(action)
+        proposers = self._get_proposers(vote_ids)
+
+        changed_actions = defaultdict(list)
+        statistics_changes = []
+        for vote in votes:
+            flags, counters = self._classify(vote, actions[vote.id], proposers[vote.id])
+            for action in actions[vote.id]:
+                action_flags = flags[action[0]]
+                if action_flags != tuple(action[4:]):
+                    changed_actions[action_flags].append(action[0])
+                    old_counters = vote_action_counters(action[3], *action[4:7])
+                    new_counters = vote_action_counters(action[3], *action_flags[:3])
+                    statistics_changes.append(
+                        (action[2], vote.time, [new - old for new, old in zip(new_counters, old_counters)]))
+            self._save_vote(vote, counters)
+
+        for action_flags, action_ids in changed_actions.items():
+            for ids in chunks(action_ids):
+                VoteAction.objects.filter(id__in=ids).update(**dict(zip(VOTE_ACTION_FLAGS, action_flags)))
+        update_voting_statistics(statistics_changes)
+
+    def _get_proposers(self, vote_ids):
+        """Returns a dict of vote id => set of member ids that proposed bills this vote is about"""
+        vote_bills = defaultdict(set)
+        for vote_id, bill_id in Bill.pre_votes.through.objects.filter(vote__in=vote_ids).values_list(
+                'vote_id', 'bill_id'):
+            vote_bills[vote_id].add(bill_id)
+        for vote_field in ('first_vote', 'approval_vote'):
+            for vote_id, bill_id in Bill.objects.filter(**{vote_field + '__in': vote_ids}).values_list(
+                    vote_field + '_id', 'id'):
+                vote_bills[vote_id].add(bill_id)
+
+        bill_proposers = defaultdict(set)
+        bill_ids = list(set().union(*vote_bills.values()))
+        for ids in chunks(bill_ids):
+            for bill_id, member_id in Bill.proposers.through.objects.filter(bill__in=ids).values_list(
+                    'bill_id', 'member_id'):
+                bill_proposers[bill_id].add(member_id)
+
+        proposers = defaultdict(set)
+        for vote_id, bills in vote_bills.items():
+            for bill_id in bills:
+                proposers[vote_id] |= bill_proposers[bill_id]
+        return proposers
+
+    def _classify(self, vote, actions, proposers):
+        """Returns a dict of action id => against_* flags tuple and a dict of
+        the vote fields to update"""
+        vote_date = vote.time.date()
+        threshold = constants.STANDS_FOR_THRESHOLD
+
+        action_parties = {}
+        party_for_votes = defaultdict(int)
+        party_against_votes = defaultdict(int)
+        for action_id, vote_id, member_id, action_type in (action[:4] for action in actions):
+            party_id = self.party_at(member_id, vote_date)
+            if party_id is None:
+                raise MissingVotePartyException(
+                    'could not find which party member %s belonged to during vote %s' % (member_id, vote.pk))
+            action_parties[action_id] = party_id
+            if action_type == 'for':
+                party_for_votes[party_id] += 1
+            elif action_type == 'against':
+                party_against_votes[party_id] += 1
+
+        party_is_coalition = dict((party_id, self.is_coalition_at(party_id, vote_date))
+                                  for party_id in set(action_parties.values()))
+
+        def stands(for_votes, against_votes):
+            total = for_votes + against_votes
+            return float(for_votes) > threshold * total, float(against_votes) > threshold * total
+
+        party_stands = dict((party_id, stands(party_for_votes[party_id], party_against_votes[party_id]))
+                            for party_id in party_is_coalition)
+        coalition_stands = stands(
+            sum(v for p, v in party_for_votes.items() if party_is_coalition[p]),
+            sum(v for p, v in party_against_votes.items() if party_is_coalition[p]))
+        opposition_stands = stands(
+            sum(v for p, v in party_for_votes.items() if not party_is_coalition[p]),
+            sum(v for p, v in party_against_votes.items() if not party_is_coalition[p]))
+
+        def is_against(block_stands, action_type):
+            stands_for, stands_against = block_stands
+            return (stands_for and action_type == 'against') or (stands_against and action_type == 'for')
+
+        flags = {}
+        type_counts = defaultdict(int)
+        for action_id, vote_id, member_id, action_type in (action[:4] for action in actions):
+            party_id = action_parties[action_id]
+            in_coalition = party_is_coalition[party_id]
+            flags[action_id] = (
+                is_against(party_stands[party_id], action_type),
+                in_coalition and is_against(coalition_stands, action_type),
+                not in_coalition and is_against(opposition_stands, action_type),
+                member_id in proposers and action_type == 'against',
+            )
+            type_counts[action_type] += 1
+
+        counters = {
+            'votes_count': len(actions),
+            'for_votes_count': type_counts['for'],
+            'against_votes_count': type_counts['against'],
+            'abstain_votes_count': type_counts['abstain'],
+            'controversy': min(type_counts['for'], type_counts['against']),
+            'vote_type': resolve_vote_type_by_title(vote.title),
+        }
+        for i, flag in enumerate(VOTE_ACTION_FLAGS):
+            counters[flag] = sum(1 for action_flags in flags.values() if action_flags[i])
+        return flags, counters
+
+    def _save_vote(self, vote, counters):
+        changed = dict((field, value) for field, value in counters.items() if getattr(vote, field) != value)
+        if changed:
+            for field, value in changed.items():
+                setattr(vote, field, value)
+            vote.__class__.objects.filter(pk=vote.pk).update(**changed)
@@ -0,0 +1,95 @@
+# encoding: utf-8
+"""
+Maintenance of the materialized member and party voting statistics.
+
+The counters are updated when vote actions are created, re-flagged or
+deleted. The party counters follow the members' current party, so they are
+rebuilt in full (rebuild_voting_statistics, run by syncdata --update and by the
+rebuild_voting_statistics management command) to catch up with party
+switches and new knessets.
+"""
+from collections import defaultdict
+from datetime import datetime
+
+from django.db.models import Count, Q
+
+from laws.models.member_voting_statistics import MemberVotingStatistics
+from laws.models.party_voting_statistics import PartyVotingStatistics
+from laws.models.vote_action import VoteAction
+from laws.models.voting_statistics_counters import COUNTER_FIELDS
+from mks.models import Knesset, Member
+import logging
+
+logger = logging.getLogger("open-knesset.laws.voting_statistics")
+
+# the vote actions counted by each of the COUNTER_FIELDS
+COUNTER_FILTERS = (
+    ~Q(type='no-vote'),
+    Q(against_party=True),
+    Q(against_coalition=True),
+    Q(against_opposition=True),
+)
+
+
+def vote_action_counters(action_type, against_party, against_coalition, against_opposition):
+    """Returns the contribution of a single vote action to the COUNTER_FIELDS"""
+    return (int(action_type != 'no-vote'), int(bool(against_party)), int(bool(against_coalition)),
+            int(bool(against_opposition)))
+
+
+def _current_knesset_start():
+    current_knesset = Knesset.objects.current_knesset()
+    if current_knesset is None or current_knesset.start_date is None:
+        return None
+    return datetime.combine(current_knesset.start_date, datetime.min.time())
+
+
+def update_voting_statistics(changes):
+    """Apply vote action changes to the member and party counters.
+
+    changes is an iterable of (member_id, vote_time, delta) tuples, where
+    delta is the difference between the new and old vote_action_counters.
+    """
+    member_deltas = defaultdict(lambda: [0] * len(COUNTER_FIELDS))
+    current_knesset_member_deltas = defaultdict(lambda: [0] * len(COUNTER_FIELDS))
+    knesset_start = _current_knesset_start()
+    for member_id, vote_time, delta in changes:
+        deltas = [member_deltas[member_id]]
+        if knesset_start is not None and vote_time > knesset_start:
+            deltas.append(current_knesset_member_deltas[member_id])
+        for counters in deltas:
+            for i, value in enumerate(delta):
+                counters[i] += value
+
+    MemberVotingStatistics.objects.apply_deltas(member_deltas)
+
+    party_deltas = defaultdict(lambda: [0] * len(COUNTER_FIELDS))
+    if current_knesset_member_deltas:
+        for member_id, party_id in Member.objects.filter(
+                id__in=current_knesset_member_deltas.keys(),
+                current_party__isnull=False).values_list('id', 'current_party_id'):
+            counters = party_deltas[party_id]
+            for i, value in enumerate(current_knesset_member_deltas[member_id]):
+                counters[i] += value
+    PartyVotingStatistics.objects.apply_deltas(party_deltas)
+
+
+def count_vote_actions(queryset, owner):
+    """Returns a dict of owner => COUNTER_FIELDS values for the given vote
+    actions, using one GROUP BY query per counter"""
+    counters = defaultdict(lambda: [0] * len(COUNTER_FIELDS))
+    for i, counter_filter in enumerate(COUNTER_FILTERS):
+        for row in queryset.filter(counter_filter).order_by().values(owner).annotate(count=Count('id')):
+            counters[row[owner]][i] = row['count']
+    return counters
+
+
+def rebuild_voting_statistics():
+    """Recalculate all member and party counters from the vote actions table"""
+    MemberVotingStatistics.objects.set_counters(count_vote_actions(VoteAction.objects.all(), 'member'))
+
+    party_vote_actions = VoteAction.objects.filter(member__current_party__isnull=False)
+    knesset_start = _current_knesset_start()
+    if knesset_start is not None:
+        party_vote_actions = party_vote_actions.filter(vote__time__gt=knesset_start)
+    PartyVotingStatistics.objects.set_counters(count_vote_actions(party_vote_actions, 'member__current_party'))
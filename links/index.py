@@ -0,0 +1,69 @@
+"""
+Links of many objects at once.
+
+Pages that show the links of a few objects (the members of a committee, for
+example) get them with one query on the objects' ids, instead of loading all
+the links of the objects' model. The links of each object are cached under a
+key that includes a per content type version, which changes when a link is
+saved or deleted (see links.listeners) - so a request that read the links
+before the change can only cache them under the old version.
+"""
+import uuid
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.conf import settings
+from django.utils.encoding import force_unicode
+
+from knesset.utils import chunks
+from links.models import Link
+
+
+def _version_key(content_type_id):
+    return 'links_index_%d_version' % content_type_id
+
+
+def _version(content_type_id):
+    version = cache.get(_version_key(content_type_id))
+    if version is None:
+        version = uuid.uuid4().hex
+        cache.set(_version_key(content_type_id), version, None)
+    return version
+
+
+def links_by_object(model, object_ids):
+    """Returns {object pk (unicode): [active links]} of the given objects of
+    a model (a model class or instance). Objects with no links get empty
+    lists"""
+    content_type = ContentType.objects.get_for_model(model)
+    key_prefix = 'links_index_%d_%s_' % (content_type.id, _version(content_type.id))
+    keys = dict((key_prefix + object_pk, object_pk)
+                for object_pk in set(force_unicode(object_id) for object_id in object_ids))
+    links = dict((keys[key], object_links) for key, object_links in cache.get_many(keys.keys()).iteritems())
+    missing = [object_pk for object_pk in keys.itervalues() if object_pk not in links]
+    if missing:
+        found = dict((object_pk, []) for object_pk in missing)
+        for chunk in chunks(missing):
+            for link in Link.objects.select_related('link_type').filter(
+                    active=True, content_type=content_type, object_pk__in=chunk):
+                found[link.object_pk].append(link)
+        cache.set_many(dict((key_prefix + object_pk, object_links) for object_pk, object_links in found.iteritems()),
+                       settings.LONG_CACHE_TIME)
+        links.update(found)
+    return links
+
+
+def attach_links(objects):
+    """Sets the cached_links of the objects (of the same model), which the
+    links template tags show"""
+    objects = list(objects)
+    if not objects:
+        return objects
+    links = links_by_object(objects[0], [obj.pk for obj in objects])
+    for obj in objects:
+        obj.cached_links = links[force_unicode(obj.pk)]
+    return objects
+
+
+def invalidate_links_index(content_type_id):
+    cache.set(_version_key(content_type_id), uuid.uuid4().hex, None)
@@ -0,0 +1,10 @@
+from django.db.models.signals import post_save, post_delete
+
+from links.models import Link
+
+
+def handle_link_change(sender, instance, **kwargs):
+    from links.index import invalidate_links_index
+    invalidate_links_index(instance.content_type_id)
+post_save.connect(handle_link_change, sender=Link)
+post_delete.connect(handle_link_change, sender=Link)
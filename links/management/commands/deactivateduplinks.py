@@ -1,18 +1,64 @@
-from django.core.management.base import  CommandError, NoArgsCommand
+from optparse import make_option
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import NoArgsCommand
+from django.db import transaction
+from django.db.models import Count, Min
+
+from knesset.utils import chunks
+from links.index import invalidate_links_index
 from links.models import Link
 
+
+def duplicated_links():
+    """Returns {content type id: [ids of active duplicated links]} - the links
+    with the same url and content object as an older link"""
+    # (content type id, object pk, url) => id of the oldest link
+    kept = {}
+    groups = Link.objects.values('content_type', 'object_pk', 'url').annotate(
+        first_id=Min('id'), links=Count('id')).filter(links__gt=1)
+    for group in groups.iterator():
+        kept[(group['content_type'], group['object_pk'], group['url'])] = group['first_id']
+
+    object_pks = {}
+    for content_type_id, object_pk, url in kept:
+        object_pks.setdefault(content_type_id, set()).add(object_pk)
+
+    duplicates = {}
+    for content_type_id, pks in object_pks.iteritems():
+        for chunk in chunks(pks):
+            links = Link.objects.filter(active=True, content_type=content_type_id, object_pk__in=chunk)
+            for link_id, object_pk, url in links.values_list('id', 'object_pk', 'url').iterator():
+                first_id = kept.get((content_type_id, object_pk, url))
+                if first_id is not None and link_id != first_id:
+                    duplicates.setdefault(content_type_id, []).append(link_id)
+    return duplicates
+
+
 class Command(NoArgsCommand):
     help = 'Deactivate duplicated links compared by URL and content object'
 
+    option_list = NoArgsCommand.option_list + (
+        make_option('--report', action='store_true', dest='report', default=False,
+                    help='Only print the number of duplicated links of each content type'),
+    )
+
     def handle_noargs(self, **options):
-        uniqLinks = set()
-        numberOfDuplicatedLinks = 0
-        for l in Link.objects.all():
-            if ((l.url, l.content_object) in  uniqLinks):
-#                This link already exists, deactive it
-                l.active = False
-                l.save()
-                numberOfDuplicatedLinks += 1
-            else:
-                uniqLinks.add((l.url, l.content_object))
-        self.stdout.write('Deactivated %d duplicated links\n' % numberOfDuplicatedLinks)
+        duplicates = duplicated_links()
+        for content_type_id, link_ids in sorted(duplicates.iteritems()):
+            content_type = ContentType.objects.get_for_id(content_type_id)
+            self.stdout.write('%s.%s: %d duplicated links\n' % (content_type.app_label, content_type.model,
+                                                                len(link_ids)))
+        total = sum(len(link_ids) for link_ids in duplicates.itervalues())
+        if options['report']:
+            self.stdout.write('Found %d duplicated links\n' % total)
+            return
+
+        with transaction.atomic():
+            for link_ids in duplicates.itervalues():
+                for chunk in chunks(link_ids):
+                    Link.objects.filter(id__in=chunk).update(active=False)
+        # update() sends no signals, drop the cached links ourselves
+        for content_type_id in duplicates:
+            invalidate_links_index(content_type_id)
+        self.stdout.write('Deactivated %d duplicated links\n' % total)
@@ -70,3 +70,6 @@ class ModelWithLinks():
     def get_links(self):
         # TODO: this is not tested.
         return Link.objects.filter(active=True, content_object=self)
+
+
+from listeners import *
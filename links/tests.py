@@ -5,10 +5,16 @@ import datetime
 from django.conf import settings
 from django.test.client import Client
 from django.core.urlresolvers import reverse
+from django.core.cache import get_cache
 from django.core.files import File
+from django.core.management import call_command
 from django.contrib.sites.models import Site
+from django.db import connection
 from django.template import Template, Context
+from django.test.utils import CaptureQueriesContext
 from links.models import Link, LinkType, ModelWithLinks
+import links.index
+from links.index import links_by_object, attach_links
 from mks.models import Member, Knesset
 
 class TestViews(unittest.TestCase):
@@ -48,6 +54,52 @@ class TestViews(unittest.TestCase):
             settings.MEDIA_URL +
             'icons/testimage.png"alt="a"><ahref="http://www.example.com/l1"target="_blank">l1</a></li>')
 
+    def testLinksByObject(self):
+        other = Site.objects.create(domain="example.org", name="other")
+        links = links_by_object(Site, [self.obj.pk, other.pk])
+        self.assertEqual(links[unicode(self.obj.pk)], [self.l1])
+        self.assertEqual(links[unicode(other.pk)], [])
+        # saving a link drops the cached links of its model
+        l2 = Link.objects.create(url='http://www.example.org/l2', title='l2',
+                                 content_object=other, link_type=self.type_a)
+        (obj, other) = attach_links([self.obj, other])
+        self.assertEqual(other.cached_links, [l2])
+        l2.delete()
+        self.assertEqual(links_by_object(Site, [other.pk])[unicode(other.pk)], [])
+        other.delete()
+
+    def testLinksByObjectIsCached(self):
+        # the default cache backend is a dummy one, which caches nothing
+        default_cache = links.index.cache
+        links.index.cache = get_cache('django.core.cache.backends.locmem.LocMemCache')
+        try:
+            pk = unicode(self.obj.pk)
+            self.assertEqual(links_by_object(Site, [self.obj.pk])[pk], [self.l1])
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(links_by_object(Site, [self.obj.pk])[pk], [self.l1])
+            self.assertEqual(len(queries), 0)
+            l2 = Link.objects.create(url='http://www.example.com/l2', title='l2',
+                                     content_object=self.obj, link_type=self.type_a)
+            self.assertEqual(set(links_by_object(Site, [self.obj.pk])[pk]), set([self.l1, l2]))
+            l2.delete()
+            self.assertEqual(links_by_object(Site, [self.obj.pk])[pk], [self.l1])
+        finally:
+            links.index.cache = default_cache
+
+    def testDeactivateDuplicatedLinks(self):
+        dup = Link.objects.create(url='http://www.example.com/l1', title='dup',
+                                  content_object=self.obj, link_type=self.type_a)
+        other = Link.objects.create(url='http://www.example.com/l2', title='l2',
+                                    content_object=self.obj, link_type=self.type_a)
+        call_command('deactivateduplinks', report=True, stdout=open(os.devnull, 'w'))
+        self.assertTrue(Link.objects.get(pk=dup.pk).active)
+        call_command('deactivateduplinks', stdout=open(os.devnull, 'w'))
+        self.assertTrue(Link.objects.get(pk=self.l1.pk).active)
+        self.assertFalse(Link.objects.get(pk=dup.pk).active)
+        self.assertTrue(Link.objects.get(pk=other.pk).active)
+        dup.delete()
+        other.delete()
+
     def tearDown(self):
         self.l1.delete()
         self.type_a.delete()
@@ -0,0 +1,93 @@
+# encoding: utf-8
+"""
+Member to member vote correlations.
+
+The votes are arranged in a members x votes matrix (for = 1, against = -1,
+anything else = 0), so that the agreement of every pair of members is a
+single matrix product:
+
+    agreement = M * M.T    (votes agreed on - votes disagreed on)
+    correlation = agreement / (|M_i| * |M_j|)
+
+where |M_i| is the norm of a member's row, i.e. the square root of the
+number of votes the member took a side in.
+"""
+import numpy as np
+
+from django.db import transaction
+
+from laws.models import VoteAction
+from mks.models import Correlation, Member
+import logging
+
+logger = logging.getLogger("open-knesset.mks.correlations")
+
+VOTE_VALUES = {
+    'for': 1,
+    'against': -1,
+}
+
+BULK_CREATE_BATCH_SIZE = 500
+
+
+def build_vote_matrix(vote_actions):
+    """Returns the member ids, vote ids and members x votes matrix of the
+    given vote actions queryset"""
+    rows = list(vote_actions.filter(type__in=VOTE_VALUES.keys()).values_list('member_id', 'vote_id', 'type'))
+    member_ids = sorted(set(row[0] for row in rows))
+    vote_ids = sorted(set(row[1] for row in rows))
+    member_index = dict((member_id, i) for i, member_id in enumerate(member_ids))
+    vote_index = dict((vote_id, i) for i, vote_id in enumerate(vote_ids))
+
+    matrix = np.zeros((len(member_ids), len(vote_ids)), dtype=np.float32)
+    if rows:
+        matrix[np.fromiter((member_index[row[0]] for row in rows), dtype=np.intp, count=len(rows)),
+               np.fromiter((vote_index[row[1]] for row in rows), dtype=np.intp, count=len(rows))] = \
+            np.fromiter((VOTE_VALUES[row[2]] for row in rows), dtype=np.float32, count=len(rows))
+    return member_ids, vote_ids, matrix
+
+
+def correlate(matrix):
+    """Returns the agreement and correlation matrices of a members x votes
+    matrix"""
+    agreement = np.dot(matrix, matrix.T)
+    norms = np.sqrt(np.diag(agreement))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        correlation = agreement / np.outer(norms, norms)
+    return np.rint(agreement).astype(np.int64), np.nan_to_num(correlation)
+
+
+def vote_actions_between(from_date=None, to_date=None):
+    vote_actions = VoteAction.objects.all()
+    if from_date:
+        vote_actions = vote_actions.filter(vote__time__gte=from_date)
+    if to_date:
+        vote_actions = vote_actions.filter(vote__time__lt=to_date)
+    return vote_actions
+
+
+@transaction.atomic
+def compute_correlations(vote_actions=None):
+    """Recalculate the Correlation table from the given vote actions (all of
+    them by default). Returns the number of member pairs stored.
+
+    Both (m1, m2) and (m2, m1) are stored, since Member.HighestCorrelations
+    and Member.LowestCorrelations only look at m1.
+    """
+    if vote_actions is None:
+        vote_actions = VoteAction.objects.all()
+    member_ids, vote_ids, matrix = build_vote_matrix(vote_actions)
+    logger.info('correlating %d members over %d votes' % (len(member_ids), len(vote_ids)))
+    agreement, correlation = correlate(matrix)
+    parties = dict(Member.objects.filter(id__in=member_ids).values_list('id', 'current_party_id'))
+
+    correlations = []
+    for i, j in zip(*np.nonzero(~np.eye(len(member_ids), dtype=bool))):
+        m1, m2 = member_ids[i], member_ids[j]
+        correlations.append(Correlation(
+            m1_id=m1, m2_id=m2, score=int(agreement[i, j]), normalized_score=float(correlation[i, j]),
+            not_same_party=parties.get(m1) != parties.get(m2)))
+
+    Correlation.objects.all().delete()
+    Correlation.objects.bulk_create(correlations, batch_size=BULK_CREATE_BATCH_SIZE)
+    return len(correlations)
@@ -0,0 +1,77 @@
+# encoding: utf-8
+"""
+Precomputed distributions of the member page statistics.
+
+The member page shows, for each of its statistics, the percentile of the
+member among the current members. Instead of loading all the members and
+computing the distribution on every page view, the values of every statistic
+are loaded together with one query, sorted and cached (per knesset), so a
+percentile is a bisect of the sorted values.
+
+The cached distributions are dropped whenever a member's statistics are
+recalculated (see Member.recalc_bill_statistics) and recomputed by the bulk
+recalculations (recalc_mks_bill_stats, the presence update) or on the next
+page view.
+"""
+from bisect import bisect_right
+
+from django.conf import settings
+from django.core.cache import cache
+
+from mks.models import Knesset, Member
+import logging
+
+logger = logging.getLogger("open-knesset.mks.distributions")
+
+DISTRIBUTION_STATS = ('average_weekly_presence_hours', 'average_monthly_committee_presence',
+                      'bills_stats_proposed', 'bills_stats_pre', 'bills_stats_first', 'bills_stats_approved')
+
+
+class MetricDistribution(object):
+    """The sorted values of a statistic over a population, with their mean
+    and variance"""
+
+    def __init__(self, values):
+        self.values = sorted(value or 0 for value in values)
+        self.count = len(self.values)
+        self.mean = float(sum(self.values)) / self.count if self.count else 0
+        self.variance = sum((value - self.mean) ** 2 for value in self.values) / self.count if self.count else 0
+
+    def percentile(self, value):
+        """The percent of the population with a value lower than or equal to
+        value. 0 when all the values are the same"""
+        if not self.variance:
+            return 0
+        return int(round(100.0 * bisect_right(self.values, value or 0) / self.count))
+
+
+def _cache_key(knesset):
+    return 'member_distributions_%d' % knesset.number
+
+
+def compute_member_distributions():
+    """Returns {stat: MetricDistribution} over the current members"""
+    rows = list(Member.objects.filter(is_current=True).order_by().values_list(*DISTRIBUTION_STATS))
+    return dict((stat, MetricDistribution(row[i] for row in rows)) for i, stat in enumerate(DISTRIBUTION_STATS))
+
+
+def refresh_member_distributions():
+    """Recomputes the cached distributions of the current knesset"""
+    knesset = Knesset.objects.current_knesset()
+    distributions = compute_member_distributions()
+    cache.set(_cache_key(knesset), distributions, settings.LONG_CACHE_TIME)
+    logger.info('refreshed the member distributions of knesset %d' % knesset.number)
+    return distributions
+
+
+def invalidate_member_distributions():
+    """Drops the cached distributions, they are recomputed when next needed"""
+    knesset = Knesset.objects.current_knesset()
+    if knesset:
+        cache.delete(_cache_key(knesset))
+
+
+def get_member_distributions():
+    """The cached distributions of the current knesset, computed if missing"""
+    knesset = Knesset.objects.current_knesset()
+    return cache.get(_cache_key(knesset)) or refresh_member_distributions()
@@ -4,7 +4,8 @@ from planet.models import Feed, Post
 from actstream import action
 from knesset.utils import cannonize, disable_for_loaddata
 from links.models import Link, LinkType
-from models import Member, Knesset
+from models import Member, Knesset, Party, MemberAltname
+from mks import name_index
 
 import logging
 
@@ -51,3 +52,10 @@ def reset_current_knesset(sender, instance, **kwargs):
 
 post_save.connect(reset_current_knesset, sender=Knesset)
 post_delete.connect(reset_current_knesset, sender=Knesset)
+
+
+# keep the name indexes used by find() up to date with the names
+name_index.track_name_changes(Member, ('name',), lambda member: [('Member', member.name, member.id)])
+name_index.track_name_changes(Party, ('name',), lambda party: [('Party', party.name, party.id)])
+name_index.track_name_changes(MemberAltname, ('name', 'member_id'),
+                              lambda altname: [('Member', altname.name, altname.member_id)])
@@ -0,0 +1,57 @@
+# encoding: utf-8
+import datetime
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from mks.correlations import compute_correlations, vote_actions_between
+from mks.models import Knesset
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_date(value):
+    try:
+        return datetime.datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise CommandError('invalid date %s, expected YYYY-MM-DD' % value)
+
+
+class Command(BaseCommand):
+    help = "Recalculate the vote correlations between all members"
+
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--knesset', action='store', type='int', dest='knesset', default=None,
+            help='Only use the votes of the given knesset number'
+        ),
+        make_option(
+            '--from-date', action='store', dest='from_date', default=None,
+            help='Only use votes from this date (YYYY-MM-DD)'
+        ),
+        make_option(
+            '--to-date', action='store', dest='to_date', default=None,
+            help='Only use votes before this date (YYYY-MM-DD)'
+        ),
+    )
+
+    def handle(self, *args, **options):
+        from_date = _parse_date(options['from_date']) if options['from_date'] else None
+        to_date = _parse_date(options['to_date']) if options['to_date'] else None
+
+        if options['knesset']:
+            try:
+                knesset = Knesset.objects.get(number=options['knesset'])
+            except Knesset.DoesNotExist:
+                raise CommandError('knesset %d does not exist' % options['knesset'])
+            if knesset.start_date:
+                knesset_start = datetime.datetime.combine(knesset.start_date, datetime.time.min)
+                from_date = max(from_date, knesset_start) if from_date else knesset_start
+            if knesset.end_date:
+                knesset_end = datetime.datetime.combine(knesset.end_date + datetime.timedelta(days=1),
+                                                        datetime.time.min)
+                to_date = min(to_date, knesset_end) if to_date else knesset_end
+
+        stored = compute_correlations(vote_actions_between(from_date, to_date))
+        logger.info(u'Stored {0} member correlations'.format(stored))
@@ -0,0 +1,38 @@
+# encoding: utf-8
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from mks.models import Knesset
+from mks.rankings import refresh_member_rankings
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Recompute the members list rankings of the current knesset (or of other knessets)"
+
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--knesset', action='store', type='int', dest='knesset', default=None,
+            help='Refresh the rankings of the given knesset number'
+        ),
+        make_option(
+            '--all', action='store_true', dest='all', default=False,
+            help='Refresh the rankings of all the knessets'
+        ),
+    )
+
+    def handle(self, *args, **options):
+        if options['all']:
+            knessets = Knesset.objects.all()
+        elif options['knesset']:
+            try:
+                knessets = [Knesset.objects.get(number=options['knesset'])]
+            except Knesset.DoesNotExist:
+                raise CommandError('knesset %d does not exist' % options['knesset'])
+        else:
+            knessets = [Knesset.objects.current_knesset()]
+        for knesset in knessets:
+            refresh_member_rankings(knesset)
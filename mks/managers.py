@@ -1,8 +1,8 @@
-import difflib
-from django.core.cache import cache
 from django.db import models, connection
 from django.db.models import Q
 
+from knesset.utils import chunks
+
 
 # from agendas.models import Agenda
 
@@ -32,32 +32,56 @@ class KnessetManager(models.Manager):
 
 
 class NameAwareManager(models.Manager):
-    def __init__(self):
-        super(NameAwareManager, self).__init__()
-        self._names = []
+    def get_name_entries(self):
+        ''' returns the (name, pk) pairs the objects are found by '''
+        return self.values_list('name', 'pk')
+
+    @property
+    def name_index(self):
+        from mks.name_index import get_name_index
+        key = '%s.%s' % (self.model.__name__, self.__class__.__name__)
+        return get_name_index(key, self.get_name_entries)
+
+    def _in_bulk(self, ids):
+        objects = {}
+        for chunk in chunks(ids):
+            objects.update(self.in_bulk(chunk))
+        return objects
 
     def find(self, name):
-        ''' looks for a member with a name that resembles 'name'
-            the returned array is ordered by similiarity
+        ''' looks for objects with a name that resembles 'name'
+            the returned array is ordered by similiarity, and holds only the
+            exact matches if there are any
+        '''
+        return [obj for obj, score in self.find_many([name])[name]]
+
+    def find_many(self, names, k=5, cutoff=0.5):
+        ''' resolves many names at once.
+            returns a dict of name => [(object, score), ...] ordered by
+            similarity, holding only the exact matches (score 1.0) if there
+            are any
         '''
-        names = cache.get('%s_names' % self.model.__name__)
-        if not names:
-            names = self.values_list('name', flat=True)
-            cache.set('%s_names' % self.model.__name__, names)
-        possible_names = difflib.get_close_matches(
-            name, names, cutoff=0.5, n=5)
-        qs = self.filter(name__in=possible_names)
-        # used to establish size, overwritten later
-        ret = range(qs.count())
-        for m in qs:
-            if m.name == name:
-                return [m]
-            ret[possible_names.index(m.name)] = m
-        return ret
+        matches = self.name_index.lookup_many(names, k=k, cutoff=cutoff)
+        for name, scored in matches.items():
+            exact = [(object_id, score) for object_id, score in scored if score == 1.0]
+            matches[name] = exact or scored
+        objects = self._in_bulk(set(object_id for scored in matches.values() for object_id, score in scored))
+        return dict((name, [(objects[object_id], score) for object_id, score in scored if object_id in objects])
+                    for name, scored in matches.items())
 
 
 class MemberManager(NameAwareManager):
-    pass
+    def get_name_entries(self):
+        ''' members are also found by their alternative names and the
+            aliases of their persons
+        '''
+        from mks.models import MemberAltname
+        from persons.models import Person, PersonAlias
+        entries = list(super(MemberManager, self).get_name_entries())
+        entries.extend(MemberAltname.objects.values_list('name', 'member_id'))
+        entries.extend(Person.objects.filter(mk__isnull=False).values_list('name', 'mk_id'))
+        entries.extend(PersonAlias.objects.filter(person__mk__isnull=False).values_list('name', 'person__mk_id'))
+        return entries
 
 
 class PartyManager(NameAwareManager):
@@ -461,6 +461,11 @@ class Member(models.Model):
             self._calc_bill_statistics_by_bill_stage_date()
         else:
             self._calc_bill_statistics_by_proposal_dates()
+        self._invalidate_distributions()
+
+    def _invalidate_distributions(self):
+        from mks.distributions import invalidate_member_distributions
+        invalidate_member_distributions()
 
     def _calc_bill_statistics_by_proposal_dates(self):
         current_knesset = Knesset.objects.current_knesset()
@@ -501,6 +506,7 @@ class Member(models.Model):
     def recalc_average_weekly_presence_hours(self):
         self.average_weekly_presence_hours = self.average_weekly_presence()
         self.save()
+        self._invalidate_distributions()
 
     def recalc_average_monthly_committee_presence(self):
         self.average_monthly_committee_presence = self.committee_meetings_per_month()
@@ -566,6 +572,24 @@ class WeeklyPresence(models.Model):
         self.member.recalc_average_weekly_presence_hours()
 
 
+class MemberRanking(models.Model):
+    """The value and rank of a member in one of the member list statistics
+    of a knesset. Refreshed by mks.rankings after each sync"""
+    knesset = models.ForeignKey('Knesset', related_name='member_rankings')
+    stat_type = models.CharField(max_length=20)
+    member = models.ForeignKey('Member', related_name='rankings')
+    value = models.FloatField(default=0)
+    rank = models.PositiveIntegerField()
+    # False for members who left during the (current) knesset
+    is_current = models.BooleanField(default=True)
+
+    class Meta:
+        unique_together = ('knesset', 'stat_type', 'member')
+
+    def __unicode__(self):
+        return u"%s %s: %d" % (self.member.name, self.stat_type, self.rank)
+
+
 class AwardType(models.Model):
     name = models.CharField(max_length=100)
     valence = models.FloatField(default=0)
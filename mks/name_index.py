@@ -0,0 +1,163 @@
+# encoding: utf-8
+"""
+Fuzzy name lookup.
+
+NameIndex keeps names (and their cannonized forms) in a character trigram
+index. A lookup only runs difflib on the few names sharing the most trigrams
+with the query, instead of scanning every name.
+
+The indexes built by get_name_index are kept per process, and rebuilt when
+invalidate() is called - which the mks and persons listeners (connected by
+track_name_changes) do when a name or an alias changes. Names of new objects
+are added to the indexes of the process that created them, so creating many
+objects (persons found in parsed protocols, for example) does not rebuild
+the indexes each time.
+"""
+import difflib
+import heapq
+import uuid
+from collections import defaultdict
+from operator import itemgetter
+
+from django.core.cache import cache
+from django.db.models.signals import pre_save, post_save, post_delete
+
+from knesset.utils import cannonize
+
+NGRAM_SIZE = 3
+# number of names sharing the most trigrams with the query that are scored
+CANDIDATES = 20
+VERSION_CACHE_KEY = 'name_index_version'
+
+
+def _ngrams(form):
+    padded = u' %s ' % form
+    return set(padded[i:i + NGRAM_SIZE] for i in xrange(max(1, len(padded) - NGRAM_SIZE + 1)))
+
+
+def name_forms(name):
+    """Returns the forms a name is indexed and looked up by"""
+    name = name.strip()
+    forms = set([name]) if name else set()
+    cannonized = cannonize(name)
+    if cannonized:
+        forms.add(cannonized)
+    return forms
+
+
+class NameIndex(object):
+    def __init__(self, entries=()):
+        """entries is an iterable of (name, object id)"""
+        self._ids = defaultdict(set)  # name form => object ids
+        self._ngrams = defaultdict(set)  # trigram => name forms
+        for name, object_id in entries:
+            self.add(name, object_id)
+
+    def add(self, name, object_id):
+        if not name:
+            return
+        for form in name_forms(name):
+            if form not in self._ids:
+                for ngram in _ngrams(form):
+                    self._ngrams[ngram].add(form)
+            self._ids[form].add(object_id)
+
+    def exact(self, name):
+        """Returns the ids of the objects with exactly this name"""
+        return set(self._ids.get(name.strip(), ()))
+
+    def lookup(self, name, k=5, cutoff=0.5):
+        """Returns up to k (object id, score) tuples of the objects with the
+        names most similar to name, best first. Scores are difflib ratios,
+        1.0 being an exact match, and are at least cutoff"""
+        scores = {}
+        matcher = difflib.SequenceMatcher()
+        for form in name_forms(name):
+            shared = defaultdict(int)
+            for ngram in _ngrams(form):
+                for candidate in self._ngrams.get(ngram, ()):
+                    shared[candidate] += 1
+            matcher.set_seq2(form)
+            for candidate, count in heapq.nlargest(CANDIDATES, shared.iteritems(), key=itemgetter(1)):
+                matcher.set_seq1(candidate)
+                if matcher.real_quick_ratio() < cutoff or matcher.quick_ratio() < cutoff:
+                    continue
+                score = matcher.ratio()
+                if score < cutoff:
+                    continue
+                for object_id in self._ids[candidate]:
+                    if score > scores.get(object_id, 0):
+                        scores[object_id] = score
+        return heapq.nlargest(k, scores.iteritems(), key=lambda (object_id, score): (score, -object_id))
+
+    def lookup_many(self, names, k=5, cutoff=0.5):
+        """Returns a dict of name => lookup(name) for all the given names"""
+        return dict((name, self.lookup(name, k, cutoff)) for name in set(names))
+
+
+# key => (version, NameIndex)
+_indexes = {}
+# changes made by this process, for when the cache is not shared (or dummy)
+_local_version = [0]
+
+
+def _version():
+    return _local_version[0], cache.get(VERSION_CACHE_KEY)
+
+
+def invalidate(added=None):
+    """Mark all the name indexes, in all processes, as stale.
+
+    added is a list of (model name, name, object id) when the change only
+    added names. The up to date indexes of this process are then extended
+    with them instead of being rebuilt."""
+    previous = _version()
+    _local_version[0] += 1
+    cache.set(VERSION_CACHE_KEY, uuid.uuid4().hex)
+    if added is None:
+        return
+    version = _version()
+    for key, (index_version, index) in _indexes.items():
+        if index_version != previous:
+            continue
+        model_name = key.split('.')[0]
+        for entry_model_name, name, object_id in added:
+            if entry_model_name == model_name:
+                index.add(name, object_id)
+        _indexes[key] = (version, index)
+
+
+def track_name_changes(model, fields, added_names):
+    """Connects the signals invalidating the name indexes upon changes to the
+    given fields of model. added_names(instance) returns the (model name,
+    name, object id) entries a new instance adds to the indexes"""
+
+    def remember_names(sender, instance, raw=False, **kwargs):
+        instance._indexed_names = None
+        if instance.pk is not None and not raw:
+            instance._indexed_names = model._base_manager.filter(pk=instance.pk).values_list(*fields).first()
+
+    def names_saved(sender, instance, created, **kwargs):
+        if created:
+            invalidate(added_names(instance))
+        elif getattr(instance, '_indexed_names', None) != tuple(getattr(instance, field) for field in fields):
+            invalidate()
+
+    def names_deleted(sender, instance, **kwargs):
+        invalidate()
+
+    uid = 'name_index_%s' % model.__name__
+    pre_save.connect(remember_names, sender=model, weak=False, dispatch_uid=uid)
+    post_save.connect(names_saved, sender=model, weak=False, dispatch_uid=uid)
+    post_delete.connect(names_deleted, sender=model, weak=False, dispatch_uid=uid)
+
+
+def get_name_index(key, get_entries):
+    """Returns the name index stored under key, building it from
+    get_entries() if it is missing or stale"""
+    version = _version()
+    cached = _indexes.get(key)
+    if cached is None or cached[0] != version:
+        cached = (version, NameIndex(get_entries()))
+        _indexes[key] = cached
+    return cached[1]
@@ -0,0 +1,113 @@
+# encoding: utf-8
+"""
+The statistics of the party list pages.
+
+All the party page metrics of a knesset are computed together with a fixed
+number of queries: the parties (with their voting statistics counters), the
+members with their per member statistics (see mks.rankings.KnessetStats),
+and the bills proposed by the members. Members are grouped by their current
+party. The results are cached, and syncdata recomputes them after each sync.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from laws.enums import BillStages
+from mks.models import Knesset, Party
+from mks.rankings import KnessetStats
+import logging
+
+logger = logging.getLogger("open-knesset.mks.party_stats")
+
+PARTY_STATS = ('seats', 'votes-per-seat', 'discipline', 'coalition-discipline', 'residence-centrality',
+               'residence-economy', 'bills-proposed', 'bills-pre', 'bills-first', 'bills-approved', 'presence',
+               'committees')
+# the stages counted by each bills statistic, None for all the bills
+PARTY_BILL_STAGES = {
+    'bills-proposed': None,
+    'bills-pre': [BillStages.PRE_APPROVED, BillStages.IN_COMMITTEE, BillStages.FIRST_VOTE,
+                  BillStages.COMMITTEE_CORRECTIONS, BillStages.APPROVED],
+    'bills-first': [BillStages.FIRST_VOTE, BillStages.COMMITTEE_CORRECTIONS, BillStages.APPROVED],
+    'bills-approved': [BillStages.APPROVED],
+}
+
+
+def _cache_key(knesset):
+    return 'party_stats_%d' % knesset.number
+
+
+def _average(values):
+    values = [value for value in values if value]
+    return round(float(sum(values)) / len(values), 1) if values else 0
+
+
+def _percent_of(total, part):
+    if not total:
+        return None
+    return round(100.0 * (total - part) / total, 1)
+
+
+def compute_party_stats(knesset):
+    """Returns {stat type: {party id: value}} for all the parties of the
+    knesset. The disciplines are None for parties with no votes"""
+    parties = list(Party.objects.filter(knesset=knesset).select_related('voting_statistics'))
+    party_ids = set(party.id for party in parties)
+    stats = dict((stat_type, {}) for stat_type in PARTY_STATS)
+
+    for party in parties:
+        seats = party.number_of_seats
+        counters = getattr(party, 'voting_statistics', None)
+        votes = counters.votes_total if counters else 0
+        stats['seats'][party.id] = seats
+        stats['votes-per-seat'][party.id] = round(float(votes) / seats, 1) if seats else 0
+        stats['discipline'][party.id] = _percent_of(votes, counters and counters.against_party_total)
+        stats['coalition-discipline'][party.id] = _percent_of(
+            votes, counters and (counters.against_coalition_total if party.is_coalition
+                                 else counters.against_opposition_total))
+
+    member_stats = KnessetStats(knesset)
+    presence = member_stats.presence()
+    committees = member_stats.committees()
+    members = defaultdict(list)
+    for member in member_stats.members:
+        if member.current_party_id in party_ids:
+            members[member.current_party_id].append(member)
+    for party in parties:
+        party_members = members[party.id]
+        stats['residence-centrality'][party.id] = _average(member.residence_centrality for member in party_members)
+        stats['residence-economy'][party.id] = _average(member.residence_economy for member in party_members)
+        stats['presence'][party.id] = _average(presence.get(member.id) for member in party_members)
+        stats['committees'][party.id] = _average(committees.get(member.id) for member in party_members)
+
+    from laws.models import Bill
+    bills = defaultdict(set)  # (stat type, party id) => bill ids
+    for bill_id, party_id, stage in Bill.objects.filter(
+            proposers__current_party__in=party_ids, proposals__date__gt=knesset.start_date).values_list(
+            'id', 'proposers__current_party', 'stage').distinct():
+        if party_id not in party_ids:
+            continue
+        for stat_type, stages in PARTY_BILL_STAGES.iteritems():
+            if stages is None or stage in stages:
+                bills[(stat_type, party_id)].add(bill_id)
+    for party in parties:
+        for stat_type in PARTY_BILL_STAGES:
+            count = len(bills[(stat_type, party.id)])
+            stats[stat_type][party.id] = round(float(count) / party.number_of_seats, 1) if party.number_of_seats else 0
+    return stats
+
+
+def refresh_party_stats(knesset=None):
+    """Recomputes the cached party statistics of a knesset (the current one
+    by default)"""
+    knesset = knesset or Knesset.objects.current_knesset()
+    stats = compute_party_stats(knesset)
+    cache.set(_cache_key(knesset), stats, settings.LONG_CACHE_TIME)
+    logger.info('refreshed the party statistics of knesset %d' % knesset.number)
+    return stats
+
+
+def get_party_stats(knesset=None):
+    """The cached party statistics of a knesset, computed if missing"""
+    knesset = knesset or Knesset.objects.current_knesset()
+    return cache.get(_cache_key(knesset)) or refresh_party_stats(knesset)
@@ -0,0 +1,176 @@
+# encoding: utf-8
+"""
+Precomputed rankings of the members list statistics.
+
+The value of every statistic of MemberListView is computed for all the
+members of a knesset together, with a few aggregate queries, and stored as
+MemberRanking rows - so the view reads a ranking with a single query on the
+(knesset, stat_type) index. The rankings of the current knesset are refreshed
+by syncdata after each sync; past knessets are refreshed on demand.
+
+For the current knesset the values are the ones the members pages show
+(the cached bill statistics, presence hours and voting counters); for past
+knessets they are computed over the knesset's dates.
+"""
+from collections import defaultdict
+from datetime import date, timedelta
+
+from actstream.models import Follow
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Count, Avg
+
+from knesset.utils import QUERY_CHUNK_SIZE
+from laws.enums import BillStages
+from mks.models import Knesset, Member, MemberRanking, WeeklyPresence
+import logging
+
+logger = logging.getLogger("open-knesset.mks.rankings")
+
+RANKED_STATS = ('bills_proposed', 'bills_pre', 'bills_first', 'bills_approved', 'votes', 'presence',
+                'committees', 'followers')
+BILL_STATS_STAGES = {
+    'bills_proposed': None,
+    'bills_pre': [BillStages.PRE_APPROVED, BillStages.IN_COMMITTEE, BillStages.FIRST_VOTE,
+                  BillStages.COMMITTEE_CORRECTIONS, BillStages.APPROVED, BillStages.FAILED_FIRST_VOTE,
+                  BillStages.FAILED_APPROVAL],
+    'bills_first': [BillStages.FIRST_VOTE, BillStages.COMMITTEE_CORRECTIONS, BillStages.APPROVED,
+                    BillStages.FAILED_APPROVAL],
+    'bills_approved': [BillStages.APPROVED],
+}
+
+
+def knesset_members(knesset):
+    """The members of a knesset, ordered by name"""
+    if knesset == Knesset.objects.current_knesset():
+        return Member.current_knesset.all()
+    return Member.objects.filter(parties__knesset=knesset).distinct()
+
+
+class KnessetStats(object):
+    """Computes the ranked statistics of all the members of a knesset"""
+
+    def __init__(self, knesset):
+        self.knesset = knesset
+        self.is_current = knesset == Knesset.objects.current_knesset()
+        self.members = list(knesset_members(knesset).select_related('voting_statistics'))
+        self.member_ids = [member.id for member in self.members]
+        self.start_date = knesset.start_date
+        self.end_date = knesset.end_date if not self.is_current else None
+
+    def _date_filter(self, field):
+        date_filter = {'%s__gte' % field: self.start_date}
+        if self.end_date:
+            date_filter['%s__lt' % field] = self.end_date + timedelta(1)
+        return date_filter
+
+    def service_time(self, member):
+        """The number of days the member served in the knesset, like
+        Member.service_time does for the current knesset"""
+        if self.is_current:
+            return member.service_time()
+        if not member.start_date:
+            return 0
+        start_date = max(member.start_date, self.start_date)
+        end_date = min(member.end_date or self.end_date or date.today(), self.end_date or date.today())
+        return max((end_date - start_date).days, 0)
+
+    def _per_month(self, counts):
+        values = {}
+        for member in self.members:
+            service_time = self.service_time(member)
+            values[member.id] = round(counts.get(member.id, 0) * 30.0 / service_time, 2) if service_time else 0
+        return values
+
+    def bills(self, stat_type):
+        if self.is_current:
+            field = 'bills_stats_%s' % stat_type.split('_', 1)[1]
+            return dict((member.id, getattr(member, field)) for member in self.members)
+        from laws.models import PrivateProposal
+        proposals = PrivateProposal.objects.filter(proposers__in=self.member_ids,
+                                                   bill__isnull=False, **self._date_filter('date'))
+        stages = BILL_STATS_STAGES[stat_type]
+        if stages:
+            proposals = proposals.filter(bill__stage__in=stages)
+        bills = defaultdict(set)
+        for member_id, bill_id in proposals.values_list('proposers', 'bill_id'):
+            bills[member_id].add(bill_id)
+        return dict((member_id, len(bill_ids)) for member_id, bill_ids in bills.iteritems())
+
+    def votes(self):
+        if self.is_current:
+            counts = dict((member.id, member.voting_statistics.votes_count()) for member in self.members
+                          if hasattr(member, 'voting_statistics'))
+        else:
+            from laws.models import VoteAction
+            counts = dict(VoteAction.objects.filter(member__in=self.member_ids, **self._date_filter('vote__time'))
+                          .exclude(type='no-vote').values_list('member').annotate(Count('id')))
+        return self._per_month(counts)
+
+    def presence(self):
+        if self.is_current:
+            return dict((member.id, member.average_weekly_presence_hours) for member in self.members)
+        return dict((member_id, round(hours, 1)) for member_id, hours in
+                    WeeklyPresence.objects.filter(member__in=self.member_ids, **self._date_filter('date'))
+                    .values_list('member').annotate(Avg('hours')))
+
+    def committees(self):
+        counts = dict(Member.objects.filter(id__in=self.member_ids, **self._date_filter('committee_meetings__date'))
+                      .values_list('id').annotate(Count('committee_meetings')))
+        return self._per_month(counts)
+
+    def followers(self):
+        follows = Follow.objects.filter(content_type=ContentType.objects.get_for_model(Member))
+        counts = dict((int(object_id), count) for object_id, count in
+                      follows.values_list('object_id').annotate(Count('id')))
+        return dict((member_id, counts.get(member_id, 0)) for member_id in self.member_ids)
+
+    def values(self, stat_type):
+        """Returns {member id: value} of a statistic"""
+        if stat_type in BILL_STATS_STAGES:
+            return self.bills(stat_type)
+        return getattr(self, stat_type)()
+
+    def rankings(self, stat_type):
+        """Returns the MemberRanking rows of a statistic: the members ordered
+        by value, highest first (by name on ties). Members with the same value
+        share a rank"""
+        values = self.values(stat_type)
+        ranked = sorted(self.members, key=lambda member: values.get(member.id) or 0, reverse=True)
+        rankings = []
+        previous = None
+        for position, member in enumerate(ranked, 1):
+            value = values.get(member.id) or 0
+            rank = rankings[-1].rank if previous == value else position
+            previous = value
+            rankings.append(MemberRanking(knesset=self.knesset, stat_type=stat_type, member_id=member.id,
+                                          value=value, rank=rank,
+                                          is_current=member.is_current or not self.is_current))
+        return rankings
+
+
+@transaction.atomic
+def refresh_member_rankings(knesset=None):
+    """Recomputes and replaces the rankings of a knesset (the current one by
+    default)"""
+    knesset = knesset or Knesset.objects.current_knesset()
+    stats = KnessetStats(knesset)
+    rankings = []
+    for stat_type in RANKED_STATS:
+        rankings.extend(stats.rankings(stat_type))
+    MemberRanking.objects.filter(knesset=knesset).delete()
+    MemberRanking.objects.bulk_create(rankings, batch_size=QUERY_CHUNK_SIZE)
+    logger.info('refreshed %d member rankings of knesset %d' % (len(rankings), knesset.number))
+    return len(rankings)
+
+
+def member_rankings(knesset, stat_type):
+    """The rankings of a statistic, with their members, in rank order.
+    Computed first if the knesset was not ranked yet"""
+    rankings = MemberRanking.objects.filter(knesset=knesset, stat_type=stat_type).select_related(
+        'member', 'member__current_party').order_by('rank', 'member__name')
+    result = list(rankings)
+    if not result:
+        refresh_member_rankings(knesset)
+        result = list(rankings.all())
+    return result
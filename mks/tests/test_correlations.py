@@ -0,0 +1,54 @@
+# encoding: utf-8
+import datetime
+
+from django.test import TestCase
+
+from laws.models import Vote, VoteAction
+from mks.correlations import compute_correlations, vote_actions_between
+from mks.models import Knesset, Party, Member, Correlation
+
+
+class TestCorrelations(TestCase):
+    def setUp(self):
+        super(TestCorrelations, self).setUp()
+        knesset = Knesset.objects.create(number=1, start_date=datetime.date(2010, 1, 1))
+        self.party_1 = Party.objects.create(name='party 1', knesset=knesset)
+        self.party_2 = Party.objects.create(name='party 2', knesset=knesset)
+        self.mk_1 = Member.objects.create(name='mk 1', current_party=self.party_1)
+        self.mk_2 = Member.objects.create(name='mk 2', current_party=self.party_1)
+        self.mk_3 = Member.objects.create(name='mk 3', current_party=self.party_2)
+
+        self.given_vote(datetime.datetime(2011, 1, 1), for_mks=[self.mk_1, self.mk_2], against_mks=[self.mk_3])
+        self.given_vote(datetime.datetime(2011, 1, 2), for_mks=[self.mk_1, self.mk_2], against_mks=[self.mk_3])
+        self.given_vote(datetime.datetime(2012, 1, 1), for_mks=[self.mk_1, self.mk_3], against_mks=[self.mk_2])
+
+    def given_vote(self, time, for_mks, against_mks):
+        vote = Vote.objects.create(title='vote %s' % time, time=time)
+        for member in for_mks:
+            VoteAction.objects.create(vote=vote, member=member, party=member.current_party, type='for')
+        for member in against_mks:
+            VoteAction.objects.create(vote=vote, member=member, party=member.current_party, type='against')
+        VoteAction.objects.create(vote=vote, member=Member.objects.create(name='absent mk'), type='no-vote')
+
+    def correlation(self, m1, m2):
+        return Correlation.objects.get(m1=m1, m2=m2)
+
+    def test_compute_correlations(self):
+        stored = compute_correlations()
+
+        self.assertEqual(stored, 6)
+        correlation = self.correlation(self.mk_1, self.mk_2)
+        self.assertEqual(correlation.score, 1)
+        self.assertAlmostEqual(correlation.normalized_score, 1 / 3.0)
+        self.assertFalse(correlation.not_same_party)
+        self.assertAlmostEqual(self.correlation(self.mk_2, self.mk_1).normalized_score, 1 / 3.0)
+        self.assertAlmostEqual(self.correlation(self.mk_2, self.mk_3).normalized_score, -1.0)
+        self.assertTrue(self.correlation(self.mk_2, self.mk_3).not_same_party)
+        self.assertEqual(list(self.mk_2.HighestCorrelations()), [self.correlation(self.mk_2, self.mk_1),
+                                                                 self.correlation(self.mk_2, self.mk_3)])
+
+    def test_compute_correlations_in_date_range(self):
+        compute_correlations(vote_actions_between(to_date=datetime.datetime(2012, 1, 1)))
+
+        self.assertAlmostEqual(self.correlation(self.mk_1, self.mk_2).normalized_score, 1.0)
+        self.assertAlmostEqual(self.correlation(self.mk_1, self.mk_3).normalized_score, -1.0)
@@ -0,0 +1,53 @@
+# encoding: utf-8
+import datetime
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from mks.distributions import MetricDistribution, get_member_distributions, _cache_key
+from mks.models import Knesset, Party, Member
+
+
+class MetricDistributionTest(TestCase):
+    def test_percentile(self):
+        distribution = MetricDistribution([4, None, 2, 2])
+        self.assertEqual(distribution.values, [0, 2, 2, 4])
+        self.assertEqual(distribution.mean, 2.0)
+        self.assertEqual(distribution.variance, 2.0)
+        self.assertEqual(distribution.percentile(0), 25)
+        self.assertEqual(distribution.percentile(2), 75)
+        self.assertEqual(distribution.percentile(4), 100)
+        self.assertEqual(distribution.percentile(3), 75)
+
+    def test_no_variance(self):
+        self.assertEqual(MetricDistribution([1, 1]).percentile(1), 0)
+        self.assertEqual(MetricDistribution([]).percentile(1), 0)
+
+
+class MemberDistributionsTest(TestCase):
+    def setUp(self):
+        super(MemberDistributionsTest, self).setUp()
+        cache.clear()
+        Knesset.objects._current_knesset = None
+        self.knesset = Knesset.objects.create(number=1, start_date=datetime.date.today() - datetime.timedelta(60))
+        party = Party.objects.create(name='party', knesset=self.knesset)
+        self.mk_1 = Member.objects.create(name='mk 1', current_party=party, bills_stats_proposed=1)
+        self.mk_2 = Member.objects.create(name='mk 2', current_party=party, bills_stats_proposed=3)
+        Member.objects.create(name='past mk', current_party=party, bills_stats_proposed=10, is_current=False)
+
+    def tearDown(self):
+        Knesset.objects._current_knesset = None
+        super(MemberDistributionsTest, self).tearDown()
+
+    def test_current_members(self):
+        distributions = get_member_distributions()
+        self.assertEqual(distributions['bills_stats_proposed'].values, [1, 3])
+        self.assertEqual(distributions['bills_stats_proposed'].percentile(3), 100)
+        self.assertEqual(distributions['bills_stats_approved'].values, [0, 0])
+        self.assertTrue(cache.get(_cache_key(self.knesset)))
+
+    def test_recalc_invalidates(self):
+        get_member_distributions()
+        self.mk_1.recalc_bill_statistics()
+        self.assertIsNone(cache.get(_cache_key(self.knesset)))
+        self.assertEqual(get_member_distributions()['bills_stats_proposed'].values, [0, 3])
@@ -0,0 +1,87 @@
+# encoding: utf-8
+from django.test import TestCase
+
+from mks.models import Member, MemberAltname
+from mks.name_index import NameIndex
+from persons.models import Person, PersonAlias
+
+
+class NameIndexTest(TestCase):
+    def setUp(self):
+        self.index = NameIndex([(u'משה כהן', 1), (u'משה לוי', 2), (u'דוד כהן', 3), (u'שרה נתניהו', 4)])
+
+    def test_exact(self):
+        self.assertEqual(self.index.exact(u' משה כהן'), set([1]))
+        self.assertEqual(self.index.exact(u'משה'), set())
+
+    def test_lookup_orders_by_similarity(self):
+        matches = self.index.lookup(u'משה כהנ')
+        self.assertEqual(matches[0][0], 1)
+        scores = [score for object_id, score in matches]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        self.assertNotIn(4, dict(matches))
+
+    def test_lookup_exact_and_cutoff(self):
+        self.assertEqual(self.index.lookup(u'משה כהן', k=1), [(1, 1.0)])
+        self.assertEqual(self.index.lookup(u'אברהם', cutoff=0.9), [])
+
+    def test_lookup_many(self):
+        matches = self.index.lookup_many([u'משה לוי', u'שרה נתניהו'], k=1)
+        self.assertEqual(matches, {u'משה לוי': [(2, 1.0)], u'שרה נתניהו': [(4, 1.0)]})
+
+
+class MemberFindTest(TestCase):
+    def setUp(self):
+        self.moshe = Member.objects.create(name=u'משה כהן')
+        self.david = Member.objects.create(name=u'דוד כהן')
+
+    def test_find(self):
+        self.assertEqual(Member.objects.find(u'משה כהן'), [self.moshe])
+        self.assertEqual(Member.objects.find(u'משה כה')[0], self.moshe)
+        self.assertEqual(Member.objects.find(u'zzz'), [])
+
+    def test_find_follows_name_changes(self):
+        self.assertEqual(Member.objects.find(u'מוישה'), [])
+        MemberAltname.objects.create(member=self.moshe, name=u'מוישה')
+        self.assertEqual(Member.objects.find(u'מוישה'), [self.moshe])
+
+        self.david.name = u'דודו'
+        self.david.save()
+        self.assertEqual(Member.objects.find(u'דודו'), [self.david])
+
+    def test_find_many(self):
+        matches = Member.objects.find_many([u'משה כהן', u'דוד כהן'])
+        self.assertEqual(matches[u'משה כהן'], [(self.moshe, 1.0)])
+        self.assertEqual(matches[u'דוד כהן'], [(self.david, 1.0)])
+
+
+class PersonGetByNameTest(TestCase):
+    def setUp(self):
+        self.person = Person.objects.create(name=u'יוסי לוי')
+
+    def test_get_by_name_and_alias(self):
+        self.assertEqual(Person.objects.get_by_name(u'יוסי לוי'), self.person)
+        self.assertIsNone(Person.objects.get_by_name(u'יוסף לוי'))
+        PersonAlias.objects.create(person=self.person, name=u'יוסף לוי')
+        self.assertEqual(Person.objects.get_by_name(u'יוסף לוי'), self.person)
+
+    def test_get_by_names_creates_missing(self):
+        persons = Person.objects.get_by_names([u'יוסי לוי', u'רינה כהן'], create=True)
+        self.assertEqual(persons[u'יוסי לוי'], self.person)
+        self.assertEqual(persons[u'רינה כהן'].name, u'רינה כהן')
+
+    def test_new_persons_extend_the_index(self):
+        index = Person.objects.name_index
+        rina = Person.objects.create(name=u'רינה כהן')
+        self.assertIs(Person.objects.name_index, index)
+        self.assertEqual(Person.objects.get_by_name(u'רינה כהן'), rina)
+
+        # saves that do not change names keep the index
+        self.person.phone = '03-1234567'
+        self.person.save()
+        self.assertIs(Person.objects.name_index, index)
+
+        self.person.name = u'יוסף לוי'
+        self.person.save()
+        self.assertIsNot(Person.objects.name_index, index)
+        self.assertEqual(Person.objects.get_by_name(u'יוסף לוי'), self.person)
@@ -0,0 +1,74 @@
+# encoding: utf-8
+import datetime
+
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from laws.models import Bill, PrivateProposal
+from laws.models.party_voting_statistics import PartyVotingStatistics
+from mks.models import Knesset, Party, Member
+from mks.party_stats import compute_party_stats, refresh_party_stats
+
+
+class PartyStatsTest(TestCase):
+    def setUp(self):
+        super(PartyStatsTest, self).setUp()
+        cache.clear()
+        Knesset.objects._current_knesset = None
+        today = datetime.date.today()
+        self.knesset = Knesset.objects.create(number=1, start_date=today - datetime.timedelta(60))
+        self.coalition = Party.objects.create(name='coalition', knesset=self.knesset, number_of_seats=2,
+                                              is_coalition=True)
+        self.opposition = Party.objects.create(name='opposition', knesset=self.knesset, number_of_seats=4,
+                                               is_coalition=False)
+        PartyVotingStatistics.objects.filter(party=self.coalition).update(votes_total=10, against_party_total=1,
+                                                                          against_coalition_total=2)
+        self.mk_1 = Member.objects.create(name='mk 1', current_party=self.coalition, residence_centrality=4,
+                                          average_weekly_presence_hours=10.0)
+        self.mk_2 = Member.objects.create(name='mk 2', current_party=self.coalition, residence_centrality=7,
+                                          average_weekly_presence_hours=20.0)
+        self.mk_3 = Member.objects.create(name='mk 3', current_party=self.opposition)
+
+        bill = Bill.objects.create(stage='6', title='bill')
+        PrivateProposal.objects.create(title='proposal', date=today - datetime.timedelta(1), bill=bill)
+        bill.proposers.add(self.mk_1, self.mk_2, self.mk_3)
+
+    def tearDown(self):
+        Knesset.objects._current_knesset = None
+        super(PartyStatsTest, self).tearDown()
+
+    def test_compute_party_stats(self):
+        stats = compute_party_stats(self.knesset)
+        self.assertEqual(stats['seats'], {self.coalition.id: 2, self.opposition.id: 4})
+        self.assertEqual(stats['votes-per-seat'][self.coalition.id], 5.0)
+        self.assertEqual(stats['discipline'], {self.coalition.id: 90.0, self.opposition.id: None})
+        self.assertEqual(stats['coalition-discipline'][self.coalition.id], 80.0)
+        self.assertEqual(stats['residence-centrality'], {self.coalition.id: 5.5, self.opposition.id: 0})
+        self.assertEqual(stats['presence'][self.coalition.id], 15.0)
+        self.assertEqual(stats['bills-proposed'], {self.coalition.id: 0.5, self.opposition.id: 0.3})
+        self.assertEqual(stats['bills-approved'][self.coalition.id], 0.5)
+        self.assertEqual(stats['bills-first'][self.coalition.id], 0.5)
+
+    def party_list_queries(self, stat_type):
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(reverse('party-stats', kwargs={'stat_type': stat_type}))
+        self.assertEqual(res.status_code, 200)
+        return res, len(queries)
+
+    def test_party_list_uses_cached_stats(self):
+        refresh_party_stats()
+        res, queries = self.party_list_queries('discipline')
+        self.assertEqual([party.extra for party in res.context['coalition']], [90.0])
+        self.assertEqual(res.context['baseline'], 88.0)
+
+        res, _ = self.party_list_queries('seats')
+        self.assertEqual([party.id for party in res.context['opposition']], [self.opposition.id])
+
+        # the query count does not depend on the number of parties
+        for i in range(3):
+            Party.objects.create(name='party %d' % i, knesset=self.knesset, number_of_seats=1)
+        refresh_party_stats()
+        self.assertEqual(self.party_list_queries('discipline')[1], queries)
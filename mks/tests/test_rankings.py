@@ -0,0 +1,90 @@
+# encoding: utf-8
+import datetime
+
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+
+from committees.models import Committee
+from laws.models import Bill, PrivateProposal, Vote, VoteAction
+from mks.models import Knesset, Party, Member, MemberRanking
+from mks.rankings import refresh_member_rankings, member_rankings
+
+
+class MemberRankingsTest(TestCase):
+    def setUp(self):
+        super(MemberRankingsTest, self).setUp()
+        Knesset.objects._current_knesset = None
+        today = datetime.date.today()
+        self.past_knesset = Knesset.objects.create(number=1, start_date=datetime.date(2010, 1, 1),
+                                                   end_date=datetime.date(2010, 12, 31))
+        self.knesset = Knesset.objects.create(number=2, start_date=today - datetime.timedelta(60))
+        past_party = Party.objects.create(name='past party', knesset=self.past_knesset)
+        party = Party.objects.create(name='party', knesset=self.knesset)
+        self.mk_1 = Member.objects.create(name='mk 1', current_party=party, start_date=datetime.date(2010, 1, 1),
+                                          bills_stats_pre=1)
+        self.mk_2 = Member.objects.create(name='mk 2', current_party=party, start_date=datetime.date(2010, 1, 1),
+                                          bills_stats_pre=3)
+        self.mk_3 = Member.objects.create(name='mk 3', current_party=party, start_date=datetime.date(2010, 1, 1),
+                                          bills_stats_pre=1)
+        self.past_mk = Member.objects.create(name='past mk', current_party=party, start_date=datetime.date(2010, 1, 1),
+                                             end_date=today - datetime.timedelta(30), is_current=False)
+        for member in (self.mk_1, self.past_mk):
+            member.membership_set.create(party=past_party)
+
+        committee = Committee.objects.create(name='committee')
+        meeting = committee.meetings.create(date=today - datetime.timedelta(1))
+        meeting.mks_attended.add(self.mk_3)
+
+        # in the past knesset
+        bill = Bill.objects.create(stage='6', title='bill')
+        proposal = PrivateProposal.objects.create(title='proposal', date=datetime.date(2010, 6, 1), bill=bill)
+        proposal.proposers.add(self.past_mk)
+        vote = Vote.objects.create(title='vote', time=datetime.datetime(2010, 6, 1))
+        VoteAction.objects.create(vote=vote, member=self.mk_1, type='for')
+        VoteAction.objects.create(vote=vote, member=self.past_mk, type='no-vote')
+
+    def tearDown(self):
+        Knesset.objects._current_knesset = None
+        super(MemberRankingsTest, self).tearDown()
+
+    def ranking(self, knesset, stat_type):
+        return [(ranking.member_id, ranking.value, ranking.rank, ranking.is_current)
+                for ranking in member_rankings(knesset, stat_type)]
+
+    def test_current_knesset(self):
+        refresh_member_rankings()
+        self.assertEqual(self.ranking(self.knesset, 'bills_pre'), [
+            (self.mk_2.id, 3, 1, True), (self.mk_1.id, 1, 2, True), (self.mk_3.id, 1, 2, True),
+            (self.past_mk.id, 0, 4, False)])
+        self.assertEqual(self.ranking(self.knesset, 'committees')[0][:3], (self.mk_3.id, 0.5, 1))
+
+    def test_refresh_replaces_rankings(self):
+        refresh_member_rankings()
+        Member.objects.filter(id=self.mk_3.id).update(bills_stats_pre=5)
+        refresh_member_rankings()
+        self.assertEqual(MemberRanking.objects.filter(knesset=self.knesset, stat_type='bills_pre').count(), 4)
+        self.assertEqual(self.ranking(self.knesset, 'bills_pre')[0][:2], (self.mk_3.id, 5))
+
+    def test_past_knesset(self):
+        # past knessets are ranked on the first request
+        self.assertEqual(self.ranking(self.past_knesset, 'bills_proposed'), [
+            (self.past_mk.id, 1, 1, True), (self.mk_1.id, 0, 2, True)])
+        self.assertEqual(self.ranking(self.past_knesset, 'votes')[0][:2], (self.mk_1.id, round(30.0 / 364, 2)))
+
+    def test_views(self):
+        res = self.client.get(reverse('member-stats', kwargs={'stat_type': 'bills_pre'}))
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([member.id for member in res.context['object_list']], [self.mk_2.id, self.mk_1.id,
+                                                                               self.mk_3.id])
+        self.assertEqual([member.id for member in res.context['past_mks']], [self.past_mk.id])
+        self.assertEqual(res.context['max_current'], 3)
+
+        res = self.client.get(reverse('member-stats', kwargs={'stat_type': 'bills_proposed'}), {'knesset': 1})
+        self.assertEqual([member.id for member in res.context['object_list']], [self.past_mk.id, self.mk_1.id])
+        res = self.client.get(reverse('member-stats', kwargs={'stat_type': 'bills_pre'}), {'knesset': 5})
+        self.assertEqual(res.status_code, 404)
+
+        res = self.client.get(reverse('member-csv'), {'knesset': 2})
+        lines = res.content.splitlines()
+        self.assertEqual(len(lines), 5)
+        self.assertTrue(lines[2].startswith('mk 2,0.0,3.0,'))
@@ -7,7 +7,7 @@ mksurlpatterns = patterns('mks.views',
     url(r'^parties-members/$', mkv.PartiesMembersRedirctView.as_view(), name='parties-members-index'),
     url(r'^parties-members/(?P<pk>\d+)/$', mkv.PartiesMembersView.as_view(), name='parties-members-list'),
     url(r'^member/$', mkv.MemberRedirectView.as_view(), name='member-list'),
-    url(r'^member/csv$', mkv.MemberCsvView.as_view()),
+    url(r'^member/csv$', mkv.MemberCsvView.as_view(), name='member-csv'),
     url(r'^party/csv$', mkv.PartyCsvView.as_view()),
     url(r'^member/(?P<pk>\d+)/$', 'mk_detail', name='member-detail'),
     url(r'^member/(?P<pk>\d+)/embed/$', mkv.MemberEmbedView.as_view(), name='member-embed'),
@@ -1,5 +1,6 @@
 import urllib
 import json
+from collections import defaultdict
 from operator import attrgetter
 from itertools import chain
 
@@ -20,11 +21,11 @@ from actstream import actor_stream
 from actstream.models import Follow
 from hashnav.detail import DetailView
 
-from laws.enums import BillStages
-from laws.vote_choices import BILL_AGRR_STAGES
-from models import Member, Party, Knesset
-from utils import percentile
-from laws.models import MemberVotingStatistics, Bill, VoteAction
+from models import Member, Party, Knesset, MemberRanking
+from distributions import get_member_distributions
+from party_stats import get_party_stats
+from rankings import BILL_STATS_STAGES, knesset_members, member_rankings, refresh_member_rankings
+from laws.models import VoteAction
 from agendas.models import Agenda
 
 from persons.models import PersonAlias, Person
@@ -49,6 +50,18 @@ class MemberRedirectView(RedirectView):
         return reverse('member-stats', kwargs={'stat_type': MemberListView.pages[0][0]})
 
 
+def requested_knesset(request):
+    """The knesset of the 'knesset' query parameter (a knesset number), or
+    the current knesset"""
+    number = request.GET.get('knesset')
+    if not number:
+        return Knesset.objects.current_knesset()
+    try:
+        return Knesset.objects.get(number=int(number))
+    except (ValueError, Knesset.DoesNotExist):
+        raise Http404
+
+
 class MemberListView(ListView):
     pages = [
         ('abc', _('By ABC')),
@@ -73,195 +86,86 @@ class MemberListView(ListView):
                 self.pages.remove(graph_view)
 
         requested_info_type = self.kwargs['stat_type']
-
-        original_context = super(MemberListView,
-                                 self).get_context_data(**kwargs)
-
-        qs = original_context['object_list'].filter(
-            is_current=True).select_related('current_party')
-
-        # Do we have it in the cache ? If so, update and return
-        context = cache.get('object_list_by_%s' % requested_info_type) or {}
-
-        if context:
-            original_context.update(context)
-            return original_context
-
         pages_dict = dict(self.pages)
         if requested_info_type not in pages_dict.keys():
             raise Http404
+        knesset = requested_knesset(self.request)
+        current_knesset = Knesset.objects.current_knesset()
 
+        context = super(MemberListView, self).get_context_data(**kwargs)
         context['title'] = pages_dict[requested_info_type]
         context['friend_pages'] = self.pages
         context['stat_type'] = requested_info_type
+        context['knesset'] = knesset
+        context['knessets'] = Knesset.objects.order_by('-number')
+        context['knesset_query'] = '' if knesset == current_knesset else '?knesset=%d' % knesset.number
+        context['csv_path'] = self._resolve_csv_export_request(knesset)
+        context['default_knesset_id'] = current_knesset.number
+
+        if requested_info_type in ('abc', 'graph'):
+            if knesset == current_knesset:
+                qs = context['object_list'].select_related('current_party')
+                context['object_list'] = qs.filter(is_current=True)
+                context['past_mks'] = qs.filter(is_current=False)
+            else:
+                context['object_list'] = knesset_members(knesset).select_related('current_party')
+                context['past_mks'] = []
+            return context
+
+        if requested_info_type in BILL_STATS_STAGES:
+            context['bill_stage'] = requested_info_type.split('_', 1)[1]
+
+        # the rankings are precomputed (see mks.rankings), so this is one
+        # query on the (knesset, stat_type) index
+        current_mks, past_mks = [], []
+        for ranking in member_rankings(knesset, requested_info_type):
+            member = ranking.member
+            member.extra = ranking.value
+            (current_mks if ranking.is_current else past_mks).append(member)
+        context['object_list'] = current_mks
+        context['past_mks'] = past_mks
+        if current_mks:
+            context['max_current'] = current_mks[0].extra
+        if past_mks:
+            context['max_past'] = past_mks[0].extra
+        return context
 
-        context[
-            'csv_path'] = self._resolve_csv_export_request()
-        context['past_mks'] = Member.current_knesset.filter(is_current=False)
-
-        # We make sure qs are lists so that the template can get min/max
-        if requested_info_type == 'abc':
-            pass
-        elif requested_info_type == 'bills_proposed':
-            qs = self._get_by_bills_proposed(context, qs)
-        elif requested_info_type == 'bills_pre':
-            qs = self._get_by_bills_pre(context, qs)
-        elif requested_info_type == 'bills_first':
-            qs = self._get_by_bills_first(context, qs)
-        elif requested_info_type == 'bills_approved':
-            qs = self._get_by_bills_approved(context, qs)
-        elif requested_info_type == 'votes':
-            qs = self._get_by_votes(context, qs)
-        elif requested_info_type == 'presence':
-            qs = self._get_by_presence(context, qs)
-        elif requested_info_type == 'committees':
-            qs = self._get_by_committees(context, qs)
-        elif requested_info_type == 'followers':
-            qs = self._get_by_followers(context, qs)
-        elif requested_info_type == 'graph':
-            pass
-
-        context['object_list'] = qs
-
-        context['default_knesset_id'] = Knesset.objects.current_knesset().number
-
-        if requested_info_type not in ('graph', 'abc'):
-            context['max_current'] = qs[0].extra
-
-            if context['past_mks']:
-                context['max_past'] = context['past_mks'][0].extra
-
-        cache.set('object_list_by_%s' % requested_info_type, context, settings.LONG_CACHE_TIME)
-        original_context.update(context)
-        return original_context
-
-    def _get_by_followers(self, context, qs):
-        mct = ContentType.objects.get_for_model(Member)
-        mk_follows = Follow.objects.filter(content_type=mct).values_list(
-            'object_id', flat=True)
-        mk_follows_dict = {}
-        for mf in mk_follows:
-            mk_follows_dict[mf] = mk_follows_dict.get(mf, 0) + 1
-        qs = list(qs)
-        for x in qs:
-            x.extra = mk_follows_dict.get(x.id, 0)
-        qs.sort(key=lambda x: x.extra or 0, reverse=True)
-        context['past_mks'] = list(context['past_mks'])
-        for x in context['past_mks']:
-            x.extra = mk_follows_dict.get(x.id, 0)
-        context['past_mks'].sort(key=lambda x: x.extra or 0, reverse=True)
-        return qs
-
-    def _get_by_committees(self, context, qs):
-        qs = list(qs)
-        for x in qs:
-            x.extra = x.committee_meetings_per_month()
-        qs.sort(key=lambda x: x.extra or 0, reverse=True)
-        context['past_mks'] = list(context['past_mks'])
-        for x in context['past_mks']:
-            x.extra = x.committee_meetings_per_month()
-        context['past_mks'].sort(key=lambda x: x.extra or 0, reverse=True)
-        return qs
-
-    def _get_by_presence(self, context, qs):
-        qs = qs.extra(select={'extra': 'average_weekly_presence_hours'}
-                      ).order_by('-extra')
-        context['past_mks'] = context['past_mks'].extra(
-            select={'extra': 'average_weekly_presence_hours'}).order_by(
-            '-extra')
-        # sort again because db sort freaks when some values are None.
-        qs = list(qs)
-        qs.sort(key=lambda x: x.extra or 0, reverse=True)
-        context['past_mks'] = list(context['past_mks'])
-        context['past_mks'].sort(key=lambda x: x.extra or 0, reverse=True)
-        return qs
-
-    def _get_by_votes(self, context, qs):
-        qs = list(qs)
-        vs = list(MemberVotingStatistics.objects.all())
-        vs = dict(zip([x.member_id for x in vs], vs))
-        for x in qs:
-            x.extra = vs[x.id].average_votes_per_month()
-        qs.sort(key=lambda x: x.extra, reverse=True)
-        context['past_mks'] = list(context['past_mks'])
-        for x in context['past_mks']:
-            x.extra = x.voting_statistics.average_votes_per_month()
-        context['past_mks'].sort(key=lambda x: x.extra, reverse=True)
-        return qs
-
-    def _resolve_csv_export_request(self):
-        return 'api/v2/member' + '?' + self.request.GET.urlencode() + '&format=csv&limit=0'
-
-    def _get_by_bills_proposed(self, context, qs):
-        qs = list(
-            qs.order_by('-bills_stats_proposed')
-                .select_related('current_party')
-                .extra(select={'extra': 'bills_stats_proposed'})
-        )
-        context['past_mks'] = list(
-            context['past_mks'].order_by('-bills_stats_proposed')
-                .select_related('current_party')
-                .extra(select={'extra': 'bills_stats_proposed'})
-        )
-        context['bill_stage'] = 'proposed'
-        return qs
-
-    def _get_by_bills_approved(self, context, qs):
-        qs = list(
-            qs.order_by('-bills_stats_approved')
-                .select_related('current_party')
-                .extra(select={'extra': 'bills_stats_approved'})
-        )
-        context['past_mks'] = list(
-            context['past_mks'].order_by('-bills_stats_approved')
-                .select_related('current_party')
-                .extra(select={'extra': 'bills_stats_approved'})
-        )
-        context['bill_stage'] = 'approved'
-        return qs
-
-    def _get_by_bills_first(self, context, qs):
-        qs = list(
-            qs.order_by('-bills_stats_first')
-                .select_related('current_party')
-                .extra(select={'extra': 'bills_stats_first'})
-        )
-        context['past_mks'] = list(
-            context['past_mks'].order_by('-bills_stats_first')
-                .select_related('current_party')
-                .extra(select={'extra': 'bills_stats_first'})
-        )
-        context['bill_stage'] = 'first'
-        return qs
-
-    def _get_by_bills_pre(self, context, qs):
-        qs = list(
-            qs.order_by('-bills_stats_pre')
-                .select_related('current_party')
-                .extra(select={'extra': 'bills_stats_pre'})
-        )
-        context['past_mks'] = list(
-            context['past_mks'].order_by('-bills_stats_pre')
-                .select_related('current_party')
-                .extra(select={'extra': 'bills_stats_pre'})
-        )
-        context['bill_stage'] = 'pre'
-        return qs
+    def _resolve_csv_export_request(self, knesset):
+        return reverse('member-csv').lstrip('/') + '?knesset=%d' % knesset.number
 
 
 class MemberCsvView(CsvView):
     model = Member
     filename = 'members.csv'
     list_display = (('name', _('Name')),
-                    ('bills_stats_proposed', _('Bills Proposed')),
-                    ('bills_stats_pre', _('Bills Pre-Approved')),
-                    ('bills_stats_first', _('Bills First-Approved')),
-                    ('bills_stats_approved', _('Bills Approved')),
-                    ('average_votes_per_month', _('Average Votes per Month')),
-                    ('average_weekly_presence', _('Average Weekly Presence')),
-                    ('committee_meetings_per_month',
+                    ('bills_proposed', _('Bills Proposed')),
+                    ('bills_pre', _('Bills Pre-Approved')),
+                    ('bills_first', _('Bills First-Approved')),
+                    ('bills_approved', _('Bills Approved')),
+                    ('votes', _('Average Votes per Month')),
+                    ('presence', _('Average Weekly Presence')),
+                    ('committees',
                      _('Committee Meetings per Month')))
 
+    def get_queryset(self):
+        """The members of the requested knesset (the current one by default),
+        with the values of their precomputed rankings"""
+        knesset = requested_knesset(self.request)
+        rankings = MemberRanking.objects.filter(knesset=knesset).values_list('member', 'stat_type', 'value')
+        result = list(rankings)
+        if not result:
+            refresh_member_rankings(knesset)
+            result = list(rankings.all())
+        self.values = defaultdict(dict)
+        for member_id, stat_type, value in result:
+            self.values[member_id][stat_type] = value
+        return knesset_members(knesset)
+
+    def ranking_value(self, obj, attr):
+        return self.values[obj.id].get(attr)
+
+    bills_proposed = bills_pre = bills_first = bills_approved = votes = presence = committees = ranking_value
+
 
 class MemberDetailView(DetailView):
     queryset = Member.objects.exclude(current_party__isnull=True) \
@@ -282,30 +186,15 @@ class MemberDetailView(DetailView):
         return super(MemberDetailView, self).dispatch(*args, **kwargs)
 
     def calc_percentile(self, member, outdict, inprop, outvalprop, outpercentileprop):
-        # store in instance var if needed, no need to access cache for each
-        # call.
-        #
-        # If not found in the instance, than try to get from cache (and set if
-        # not found), plus setting it as an instance var. Also removes default
-        # ordering by name (we don't need it)
-        all_members = getattr(self, '_all_members', None)
-
-        if not all_members:
-            all_members = cache.get('all_members', None)
-            if not all_members:
-                self._all_members = all_members = list(
-                    Member.objects.filter(is_current=True).order_by().values())
-                cache.set('all_members', all_members, settings.LONG_CACHE_TIME)
-
-        member_count = float(len(all_members))
-        member_val = getattr(member, inprop) or 0
-
-        avg = sum(x[inprop] or 0 for x in all_members) / member_count
-
-        var = sum(((x[inprop] or 0) - avg) ** 2 for x in all_members) / member_count
+        # the distributions of all the statistics are precomputed and cached
+        # together (see mks.distributions), keep them for the other calls
+        distributions = getattr(self, '_distributions', None)
+        if distributions is None:
+            self._distributions = distributions = get_member_distributions()
 
+        member_val = getattr(member, inprop) or 0
         outdict[outvalprop] = member_val
-        outdict[outpercentileprop] = percentile(avg, var, member_val) if var != 0 else 0
+        outdict[outpercentileprop] = distributions[inprop].percentile(member_val)
 
     def calc_bill_stats(self, member, bills_statistics, stattype):
         # TODO: Jesus why is this a not savd as a property on mk? re calculating each time?
@@ -316,26 +205,23 @@ class MemberDetailView(DetailView):
                              '%s_percentile' % stattype)
 
     def get_agenda_data(self, member):
-        if self.request.user.is_authenticated():
-            agendas = Agenda.objects.get_selected_for_instance(
-                member, user=self.request.user, top=3, bottom=3)
-        else:
-            agendas = Agenda.objects.get_selected_for_instance(
-                member, user=None, top=3, bottom=3)
+        user = self.request.user if self.request.user.is_authenticated() else None
+        agendas = Agenda.objects.get_selected_for_instance(member, user=user, top=3, bottom=3)
         agendas = agendas['top'] + agendas['bottom']
         for agenda in agendas:
             agenda.watched = False
-            agenda.totals = agenda.get_mks_totals(member)
-        if self.request.user.is_authenticated():
-            watched_agendas = self.request.user.profiles.get().agendas
-            for watched_agenda in watched_agendas:
+        if user:
+            for watched_agenda in user.profiles.get().agendas:
                 if watched_agenda in agendas:
                     agendas[agendas.index(watched_agenda)].watched = True
                 else:
-                    watched_agenda.score = watched_agenda.member_score(
-                        member)
                     watched_agenda.watched = True
                     agendas.append(watched_agenda)
+        # the scores and vote totals of all the agendas in one query
+        summaries = Agenda.objects.scores_for_member(member, agendas)
+        for agenda in agendas:
+            agenda.score = summaries[agenda.id]['score']
+            agenda.totals = summaries[agenda.id]['totals']
         agendas.sort(key=attrgetter('score'), reverse=True)
         return agendas
 
@@ -520,8 +406,7 @@ class PartyListView(ListView):
     model = Party
 
     def get_queryset(self):
-        return self.model.objects.filter(
-            knesset=Knesset.objects.current_knesset())
+        return self.model.objects.filter(knesset=Knesset.objects.current_knesset())
 
     pages = (
         ('seats', _('By Number of seats')),
@@ -538,195 +423,48 @@ class PartyListView(ListView):
         ('committees', _('By average monthly committee meetings')),
     )
 
+    # (norm_factor, baseline) of each statistic's graph, given the minimal
+    # (or, for votes per seat, the maximal) value
+    graph_scales = {
+        'seats': lambda m: (1, 0),
+        'votes-per-seat': lambda m: (m / 20, 0),
+        'discipline': lambda m: ((100.0 - m) / 15, m - 2),
+        'coalition-discipline': lambda m: ((100.0 - m) / 15, m - 2),
+        'residence-centrality': lambda m: ((10.0 - m) / 15, m - 1),
+        'residence-economy': lambda m: ((10.0 - m) / 15, m - 1),
+    }
+
     def get_context_data(self, **kwargs):
         context = super(PartyListView, self).get_context_data(**kwargs)
-        qs = context['object_list']
-
         info = self.kwargs['stat_type']
+        # all the statistics are computed together and cached, see
+        # mks.party_stats
+        values = get_party_stats()[info]
 
-        context['coalition'] = qs.filter(is_coalition=True)
-        context['opposition'] = qs.filter(is_coalition=False)
+        parties = list(context['object_list'])
+        for party in parties:
+            party.extra = values.get(party.id)
+        if info == 'seats':
+            parties.sort(key=lambda party: party.extra, reverse=True)
+        context['coalition'] = [party for party in parties if party.is_coalition]
+        context['opposition'] = [party for party in parties if not party.is_coalition]
 
         context['friend_pages'] = self.pages
         context['stat_type'] = info
 
-        if info == 'seats':
-            context['coalition'] = context['coalition'].annotate(
-                extra=Sum('number_of_seats')).order_by('-extra')
-            context['opposition'] = context['opposition'].annotate(
-                extra=Sum('number_of_seats')).order_by('-extra')
-            context['norm_factor'] = 1
-            context['baseline'] = 0
-
+        known = [party.extra for party in parties if party.extra is not None]
         if info == 'votes-per-seat':
-            m = 0
-            for party in chain(context['coalition'], context['opposition']):
-                party.extra = party.voting_statistics.votes_per_seat()
-                if party.extra > m:
-                    m = party.extra
-            context['norm_factor'] = m / 20
-            context['baseline'] = 0
-
-        if info == 'discipline':
-            m = 100
-            for party in context['coalition']:
-                party.extra = party.voting_statistics.discipline()
-                if party.extra < m:
-                    m = party.extra
-            for party in context['opposition']:
-                party.extra = party.voting_statistics.discipline()
-                if party.extra < m:
-                    m = party.extra
-            context['norm_factor'] = (100.0 - m) / 15
-            context['baseline'] = m - 2
-
-        if info == 'coalition-discipline':
-            m = 100
-            for party in context['coalition']:
-                party.extra = party.voting_statistics.coalition_discipline()
-                if party.extra < m:
-                    m = party.extra
-            for party in context['opposition']:
-                party.extra = party.voting_statistics.coalition_discipline()
-                if party.extra < m:
-                    m = party.extra
-            context['norm_factor'] = (100.0 - m) / 15
-            context['baseline'] = m - 2
-
-        if info == 'residence-centrality':
-            m = 10
-            for party in context['coalition']:
-                rc = [member.residence_centrality for member in party.members.all() if
-                      member.residence_centrality]
-                if rc:
-                    party.extra = round(float(sum(rc)) / len(rc), 1)
-                else:
-                    party.extra = 0
-                if party.extra < m:
-                    m = party.extra
-            for party in context['opposition']:
-                rc = [member.residence_centrality for member in party.members.all() if
-                      member.residence_centrality]
-                if rc:
-                    party.extra = round(float(sum(rc)) / len(rc), 1)
-                else:
-                    party.extra = 0
-                if party.extra < m:
-                    m = party.extra
-            context['norm_factor'] = (10.0 - m) / 15
-            context['baseline'] = m - 1
-
-        if info == 'residence-economy':
-            m = 10
-            for party in context['coalition']:
-                rc = [member.residence_economy for member in party.members.all() if
-                      member.residence_economy]
-                if rc:
-                    party.extra = round(float(sum(rc)) / len(rc), 1)
-                else:
-                    party.extra = 0
-                if party.extra < m:
-                    m = party.extra
-            for party in context['opposition']:
-                rc = [member.residence_economy for member in party.members.all() if
-                      member.residence_economy]
-                if rc:
-                    party.extra = round(float(sum(rc)) / len(rc), 1)
-                else:
-                    party.extra = 0
-                if party.extra < m:
-                    m = party.extra
-            context['norm_factor'] = (10.0 - m) / 15
-            context['baseline'] = m - 1
-
-        if info == 'bills-proposed':
-            m = 9999
-            start_date = Knesset.objects.current_knesset().start_date
-            for party in chain(context['coalition'], context['opposition']):
-                party.extra = round(float(
-                    len(set(Bill.objects.filter(
-                        proposers__current_party=party,
-                        proposals__date__gt=start_date).values_list('id', flat=True))
-                        )) / party.number_of_seats, 1)
-                if party.extra < m:
-                    m = party.extra
-            context['norm_factor'] = m / 2
-            context['baseline'] = 0
-
-        if info == 'bills-pre':
-            m = 9999
-            start_date = Knesset.objects.current_knesset().start_date
-            for party in chain(context['coalition'], context['opposition']):
-                party.extra = round(float(
-                    len(set(Bill.objects.filter(
-                        BILL_AGRR_STAGES['pre'],
-                        proposers__current_party=party,
-                        proposals__date__gt=start_date).values_list('id', flat=True))
-                        )) / party.number_of_seats, 1)
-                if party.extra < m:
-                    m = party.extra
-            context['norm_factor'] = m / 2
-            context['baseline'] = 0
-
-        if info == 'bills-first':
-            m = 9999
-            start_date = Knesset.objects.current_knesset().start_date
-            for party in chain(context['coalition'], context['opposition']):
-                party.extra = round(float(
-                    len(set(Bill.objects.filter(
-                        BILL_AGRR_STAGES['first'],
-                        proposers__current_party=party,
-                        proposals__date__gt=start_date).values_list('id', flat=True))
-                        )) / party.number_of_seats, 1)
-                if party.extra < m:
-                    m = party.extra
-            context['norm_factor'] = m / 2
-            context['baseline'] = 0
-
-        if info == 'bills-approved':
-            m = 9999
-            start_date = Knesset.objects.current_knesset().start_date
-            for party in chain(context['coalition'], context['opposition']):
-                party.extra = round(float(
-                    len(set(Bill.objects.filter(
-                        proposers__current_party=party,
-                        proposals__date__gt=start_date,
-                        stage=BillStages.APPROVED).values_list('id', flat=True))
-                        )) / party.number_of_seats, 1)
-                if party.extra < m:
-                    m = party.extra
-            context['norm_factor'] = m / 2
-            context['baseline'] = 0
-
-        if info == 'presence':
-            m = 9999
-            for party in chain(context['coalition'], context['opposition']):
-                awp = [member.average_weekly_presence() for member in
-                       party.members.all()]
-                awp = [a for a in awp if a]
-                if awp:
-                    party.extra = round(float(sum(awp)) / len(awp), 1)
-                else:
-                    party.extra = 0
-                if party.extra < m:
-                    m = party.extra
-            context['norm_factor'] = m / 2
-            context['baseline'] = 0
-
-        if info == 'committees':
-            m = 9999
-            for party in chain(context['coalition'], context['opposition']):
-                cmpm = [member.committee_meetings_per_month() for member in
-                        party.members.all()]
-                cmpm = [c for c in cmpm if c]
-                if cmpm:
-                    party.extra = round(float(sum(cmpm)) / len(cmpm), 1)
-                else:
-                    party.extra = 0
-                if party.extra < m:
-                    m = party.extra
-            context['norm_factor'] = m / 2
-            context['baseline'] = 0
+            m = max(known + [0])
+        elif info in ('discipline', 'coalition-discipline'):
+            m = min(known + [100])
+        elif info.startswith('residence-'):
+            m = min(known + [10])
+        else:
+            m = min(known + [9999])
+        context['norm_factor'], context['baseline'] = self.graph_scales.get(info, lambda m: (m / 2, 0))(m)
+        for party in parties:
+            if party.extra is None:
+                party.extra = _('N/A')
 
         context['title'] = _('Parties by %s') % dict(self.pages)[info]
         # prepare data for graphs. We'll be doing loops instead of list
@@ -0,0 +1,269 @@
+# encoding: utf-8
+"""
+Batched building of the notification emails.
+
+DigestBuilder loads the follows, LastSent rows and new actions of a whole
+batch of users with a few queries per content type, and renders every action
+and actor header once, sharing the snippets between all of the actor's
+followers. The LastSent changes of the batch are written in bulk.
+"""
+import datetime
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import transaction
+from django.template import TemplateDoesNotExist
+from django.template.loader import render_to_string
+from django.utils.translation import ugettext as _
+
+from actstream.models import Follow, Action
+from agendas.models import Agenda
+from knesset.utils import QUERY_CHUNK_SIZE, chunks
+from laws.models import get_debated_bills
+from mks.models import Member
+from notify.models import LastSent
+from user.models import UserProfile
+import logging
+
+logger = logging.getLogger("open-knesset.notify.digest")
+
+def _render_with_fallback(template_name, fallback_template_name, context):
+    try:
+        return render_to_string(template_name, context)
+    except TemplateDoesNotExist:
+        return render_to_string(fallback_template_name, context)
+
+
+class DigestBuilder(object):
+    """Builds the notification emails of many users.
+
+    The rendered snippets are cached on the builder, so a single instance
+    should be reused for all the batches of a run::
+
+        builder = DigestBuilder(update_models, domain, days_back)
+        for users in batches:
+            for user, (email_body, email_body_html) in builder.build(users):
+                ...
+    """
+
+    def __init__(self, update_models, domain, days_back, dry_run=False):
+        self.update_models = update_models
+        self.domain = domain
+        self.days_back = days_back
+        # in a dry run the actions are not marked as sent
+        self.dry_run = dry_run
+        self._model_headers = None
+        self._actor_headers = {}
+        self._actions = {}
+        self._agenda_updates = {}
+        self._debated_bills = None
+
+    def build(self, users):
+        """Returns a list of (user, (email_body, email_body_html)) of the given
+        users, and marks the actions included in them as sent"""
+        now = datetime.datetime.now()
+        default_since = now - datetime.timedelta(self.days_back)
+        users = list(users)
+        user_ids = [user.id for user in users]
+
+        follows, last_sent = self._load_follows(user_ids)
+        since = {}
+        for user_id, actor_keys in follows.items():
+            for actor_key in actor_keys:
+                sent = last_sent.get((user_id,) + actor_key)
+                sent_time = sent[1] if sent else default_since
+                since[actor_key] = min(since.get(actor_key, sent_time), sent_time)
+        actors, actions = self._load_actors(since)
+        profiles = self._load_profiles(user_ids)
+
+        emails = []
+        updated_last_sent = []
+        new_last_sent = []
+        for user in users:
+            updates = dict((model, []) for model in self.update_models)
+            updates_html = dict((model, []) for model in self.update_models)
+            # sorted for a stable email order
+            for actor_key in sorted(follows[user.id]):
+                actor = actors.get(actor_key)
+                if actor is None:
+                    logger.warning('Follow object with None actor. ignoring')
+                    continue
+                sent = last_sent.get((user.id,) + actor_key)
+                sent_time = sent[1] if sent else default_since
+                stream = [action for action in actions[actor_key] if action.timestamp > sent_time]
+                if sent is None:  # never updated about this actor
+                    new_last_sent.append(LastSent(user_id=user.id, content_type_id=actor_key[0],
+                                                  object_pk=actor_key[1], time=now))
+                elif stream:
+                    updated_last_sent.append(sent[0])
+                if not stream:
+                    continue
+
+                model_class = actor.__class__
+                key = model_class if model_class in updates else None  # 'other' classes go to the None group
+                header, header_html = self._actor_header(actor_key, actor)
+                updates[key].append(header)
+                updates_html[key].append(header_html)
+                for action in stream:
+                    action_output, action_output_html = self._render_action(action)
+                    updates[key].append(action_output)
+                    updates_html[key].append(action_output_html)
+                if model_class == Agenda:
+                    txt, html = self._agenda_update(actor)
+                    updates[key].append(txt)
+                    updates_html[key].append(html)
+
+            emails.append((user, self._email_body(user, profiles.get(user.id), updates, updates_html)))
+
+        if not self.dry_run:
+            self._save_last_sent(updated_last_sent, new_last_sent, now)
+        return emails
+
+    def _load_follows(self, user_ids):
+        """Returns a dict of user id => set of (content type id, object id)
+        followed, and a dict of (user id, content type id, object id) =>
+        (LastSent id, time)"""
+        follows = defaultdict(set)
+        last_sent = {}
+        for ids in chunks(user_ids):
+            # sometime a user follows something several times, the set takes
+            # care of that
+            for user_id, content_type_id, object_id in Follow.objects.filter(user__in=ids).values_list(
+                    'user_id', 'content_type_id', 'object_id'):
+                follows[user_id].add((content_type_id, unicode(object_id)))
+            for last_sent_id, user_id, content_type_id, object_pk, time in LastSent.objects.filter(
+                    user__in=ids).values_list('id', 'user_id', 'content_type_id', 'object_pk', 'time'):
+                last_sent[(user_id, content_type_id, object_pk)] = (last_sent_id, time)
+        return follows, last_sent
+
+    def _load_actors(self, since):
+        """since is a dict of (content type id, object id) => the earliest
+        time any of the actor's followers needs updates from. Returns a dict
+        of the actor objects and a dict of their actions, newest first"""
+        actor_ids = defaultdict(list)
+        for content_type_id, object_id in since:
+            actor_ids[content_type_id].append(object_id)
+
+        actors = {}
+        actions = defaultdict(list)
+        for content_type_id, object_ids in actor_ids.items():
+            model = ContentType.objects.get_for_id(content_type_id).model_class()
+            if model is None:
+                continue
+            earliest = min(since[(content_type_id, object_id)] for object_id in object_ids)
+            for ids in chunks(object_ids):
+                for pk, actor in model._base_manager.in_bulk(ids).items():
+                    actors[(content_type_id, unicode(pk))] = actor
+                for action in Action.objects.filter(actor_content_type=content_type_id, actor_object_id__in=ids,
+                                                    timestamp__gt=earliest).order_by('-timestamp'):
+                    actions[(content_type_id, unicode(action.actor_object_id))].append(action)
+        return actors, actions
+
+    def _load_profiles(self, user_ids):
+        profiles = {}
+        for ids in chunks(user_ids):
+            for profile in UserProfile.objects.filter(user__in=ids).select_related('party'):
+                profiles.setdefault(profile.user_id, profile)
+        return profiles
+
+    @transaction.atomic
+    def _save_last_sent(self, updated_last_sent, new_last_sent, now):
+        for ids in chunks(updated_last_sent):
+            LastSent.objects.filter(id__in=ids).update(time=now)
+        LastSent.objects.bulk_create(new_last_sent, batch_size=QUERY_CHUNK_SIZE)
+
+    def _actor_header(self, actor_key, actor):
+        if actor_key not in self._actor_headers:
+            model_template = actor.__class__.__name__.lower()
+            try:
+                model_name = actor.__class__._meta.verbose_name
+            except AttributeError:
+                logger.warning('follows %s has no __class__?' % actor_key[1])
+                model_name = ""
+            self._actor_headers[actor_key] = (
+                _render_with_fallback('notify/%s_header.txt' % model_template, 'notify/model_header.txt',
+                                      {'model': model_name, 'object': actor}),
+                _render_with_fallback('notify/%s_header.html' % model_template, 'notify/model_header.html',
+                                      {'model': model_name, 'object': actor, 'domain': self.domain}))
+        return self._actor_headers[actor_key]
+
+    def _render_action(self, action):
+        if action.id not in self._actions:
+            verb = action.verb.replace(' ', '_')
+            self._actions[action.id] = (
+                _render_with_fallback('activity/%s/action_email.txt' % verb, 'activity/action_email.txt',
+                                      {'action': action}),
+                _render_with_fallback('activity/%s/action_email.html' % verb, 'activity/action_email.html',
+                                      {'action': action, 'domain': self.domain}))
+        return self._actions[action.id]
+
+    def _agenda_update(self, agenda):
+        ''' generate the general update email for this agenda.
+            this will be called, and its output added to the email,
+            if and only if there has been some update in it's data.
+        '''
+        if agenda.id not in self._agenda_updates:
+            mks = agenda.selected_instances(Member)
+            template_name = 'notify/agenda_update'
+            self._agenda_updates[agenda.id] = (
+                render_to_string(template_name + '.txt', {'mks': mks, 'domain': self.domain}),
+                render_to_string(template_name + '.html', {'mks': mks, 'domain': self.domain}))
+        return self._agenda_updates[agenda.id]
+
+    @classmethod
+    def get_model_headers(cls, model):
+        ''' for a given model this function returns a tuple with
+            (model, text_header, html_header)
+        '''
+        try:
+            template_name = 'notify/%s_section' % model.__name__.lower()
+            return (model, render_to_string(template_name + '.txt'), render_to_string(template_name + '.html'))
+        except TemplateDoesNotExist:
+            return (model, model._meta.verbose_name_plural, '<h2>%s</h2>' % model._meta.verbose_name_plural.format())
+        except AttributeError:
+            return (model, _('Other Updates'), '<h2>%s</h2>' % _('Other Updates'))
+
+    def _email_body(self, user, profile, updates, updates_html):
+        if self._model_headers is None:
+            self._model_headers = map(self.get_model_headers, self.update_models)
+
+        email_body = []
+        email_body_html = []
+        # Add the updates for followed models
+        for (model_class, title, title_html) in self._model_headers:
+            if updates[model_class]:  # this model has some updates, add it to the email
+                email_body.append(title.format())
+                email_body.append('\n'.join(updates[model_class]))
+                email_body_html.append(title_html.format())
+                email_body_html.append(''.join(updates_html[model_class]))
+
+        if email_body:
+            if profile:
+                txt, html = self._party_membership(user, profile)
+                email_body.insert(0, txt)
+                email_body_html.insert(0, html)
+            else:
+                logger.warning('Can\'t find user profile')
+        return email_body, email_body_html
+
+    def _party_membership(self, user, profile):
+        party = profile.party
+        if party:
+            num_members = cache.get('party_num_members_%d' % party.id, None)
+            if not num_members:
+                num_members = party.userprofile_set.count()
+                cache.set('party_num_members_%d' % party.id, num_members, settings.LONG_CACHE_TIME)
+        else:
+            num_members = None
+        if self._debated_bills is None:
+            self._debated_bills = get_debated_bills() or []
+
+        template_name = 'notify/party_membership'
+        context = {'user': user,
+                   'userprofile': profile,
+                   'num_members': num_members,
+                   'bills': self._debated_bills,
+                   'domain': self.domain}
+        return render_to_string(template_name + '.txt', context), render_to_string(template_name + '.html', context)
@@ -44,6 +44,29 @@ class SimpleTest(TestCase):
         email, email_html = cmd.get_email_for_user(self.jacob)
         self.assertEqual(email, [])
 
+    def test_digest_for_many_users(self):
+        john = User.objects.create_user('john', 'john@example.com', 'LSD')
+        follow(self.jacob, self.mk_1)
+        follow(john, self.mk_1)
+        follow(john, self.agenda_1)
+        action.send(self.mk_1, verb='farted on', target=self.agenda_1)
+        cmd = notify.Command()
+        emails = dict(cmd.get_digest_builder().build([self.jacob, john]))
+        self.assertIn(u'mk 1 farted on agenda 1', "\n".join(emails[self.jacob][0]))
+        self.assertIn(u'mk 1 farted on agenda 1', "\n".join(emails[john][0]))
+        self.assertEqual(LastSent.objects.filter(user=john).count(), 2)
+        self.assertEqual(cmd.get_email_for_user(john), ([], []))
+
+    def test_build_shard_dry_run(self):
+        follow(self.jacob, self.mk_1)
+        action.send(self.mk_1, verb='farted on', target=self.agenda_1)
+        cmd = notify.Command()
+        (shard, users_count, emails_count, seconds), messages = cmd.build_shard(3, [self.jacob.id], dry_run=True)
+        self.assertEqual((shard, users_count, emails_count), (3, 1, 1))
+        self.assertEqual(messages[0][0], 'jacob@example.com')
+        self.assertIn(u'mk 1 farted on agenda 1', messages[0][1])
+        self.assertEqual(LastSent.objects.filter(user=self.jacob).count(), 0)
+
     def test_LastsSent_unicode(self):
         dt = datetime(2013, 2, 3)
         lastsent = LastSent.objects.create(user = self.jacob, content_object = self.mk_1)
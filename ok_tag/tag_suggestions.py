@@ -1,9 +1,16 @@
 # -*- coding: utf-8 -*-
 
+from collections import defaultdict
+import hashlib
+import uuid
+
 from tagging.models import Tag, TaggedItem
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete
 from laws.models import Vote, Bill
 from committees.models import CommitteeMeeting
+from knesset.pattern_matcher import PatternMatcher
 
 import operator
 
@@ -35,12 +42,24 @@ def sum_add_two_dictionaries(dict, dict_to_add):
 # A list of prefix charcters to use in tag extraction
 prefixes = [u'ב', u'ו', u'ה', u'מ', u'מה', u'ל', u'']
 _all_tags_names = []
+# the shared tags version _all_tags_names was loaded at
+_tags_names_version = None
+# (the tags names it was compiled from, the matcher)
+_tags_matcher = None
+# (the tags names it was computed from, the fingerprint)
+_tags_fingerprint = None
+# changed by reset_tags_names in any process, so all processes reload the
+# tags list
+TAGS_VERSION_CACHE_KEY = 'tag_suggestions_tags_version'
 
 
 def all_tags_names():
-    '''Lazy intialization of tags list'''
-    global _all_tags_names
-    if _all_tags_names == []:
+    '''Lazy intialization of tags list, reloaded when the tags changed in
+    any process'''
+    global _all_tags_names, _tags_names_version
+    version = cache.get(TAGS_VERSION_CACHE_KEY)
+    if _all_tags_names == [] or version != _tags_names_version:
+        _tags_names_version = version
         # Extract only used tags, to avoid irrelevant tags
         vote_tags = Tag.objects.usage_for_model(Vote)
         bill_tags = Tag.objects.usage_for_model(Bill)
@@ -54,28 +73,66 @@ def all_tags_names():
     return _all_tags_names
 
 
-def get_tags_in_text(text):
-    """Returns a dictionary, the keys are tags found in text, and the values are the number of occurrences in text"""
+def tags_names_fingerprint():
+    """A digest of the tags list, that changes when the tags that are
+    matched change"""
+    global _tags_fingerprint
+    names = all_tags_names()
+    if _tags_fingerprint is None or _tags_fingerprint[0] is not names:
+        _tags_fingerprint = (names, hashlib.md5(u'\n'.join(sorted(names)).encode('utf-8')).hexdigest())
+    return _tags_fingerprint[1]
 
-    result_dict = {}
-    words = text.split() if text is not None else []
 
-    # look for tag in word
-    for tag in all_tags_names():
-        # create tag variations according to prefixes
-        tag_variations = [(p + tag) for p in prefixes]
-
-        # find number of occurences of tags for each word
-        occurence_count = 0
-        for word in words:
-            if word in tag_variations:
-                occurence_count += 1
+def reset_tags_names(**kwargs):
+    """Drops the tags list (and the matcher compiled from it) in all
+    processes, so they are rebuilt on the next use. Connected to the tags and
+    tagged items signals"""
+    global _all_tags_names
+    _all_tags_names = []
+    cache.set(TAGS_VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+
+
+post_save.connect(reset_tags_names, sender=Tag, dispatch_uid='tag_suggestions_tag_saved')
+post_delete.connect(reset_tags_names, sender=Tag, dispatch_uid='tag_suggestions_tag_deleted')
+post_save.connect(reset_tags_names, sender=TaggedItem, dispatch_uid='tag_suggestions_tagged_item_saved')
+post_delete.connect(reset_tags_names, sender=TaggedItem, dispatch_uid='tag_suggestions_tagged_item_deleted')
+
+
+def tags_matcher():
+    """A PatternMatcher of all the tags over the words of a text. Every tag
+    is compiled with each of the prefixes on its first word, so a text is
+    scanned once for all the tags and their prefixed forms, including tags
+    of several words"""
+    global _tags_matcher
+    names = all_tags_names()
+    if _tags_matcher is None or _tags_matcher[0] is not names:
+        matcher = PatternMatcher()
+        for name in names:
+            words = tuple(name.split())
+            if not words:
+                continue
+            for prefix in prefixes:
+                matcher.add((prefix + words[0],) + words[1:], name)
+        _tags_matcher = (names, matcher)
+    return _tags_matcher[1]
+
+
+def get_tags_in_text(text, matcher=None):
+    """Returns a dictionary, the keys are tags found in text, and the values are the number of occurrences in text"""
+    words = text.split() if text is not None else []
+    result_dict = defaultdict(int)
+    for start, end, tag in (matcher or tags_matcher()).iter_matches(words):
+        result_dict[tag] += 1
+    return dict(result_dict)
 
-        # if tag found more than once, add them
-        if occurence_count > 0:
-            result_dict[tag] = result_dict.get(tag, 0) + occurence_count
 
-    return result_dict
+def count_tags_in_texts(text_list):
+    '''Returns a dictionary of the tags found in the texts and their total number of occurrences'''
+    tags_occurrences = {}
+    matcher = tags_matcher()
+    for text_to_extract in text_list:
+        sum_add_two_dictionaries(tags_occurrences, get_tags_in_text(text_to_extract, matcher))
+    return tags_occurrences
 
 
 def extract_suggested_tags(current_tags, text_list):
@@ -84,11 +141,8 @@ def extract_suggested_tags(current_tags, text_list):
         current_tags are removed from final list.
         The list is sorted from most occuring tags to least occuring tags'''
 
-    tags_occurrences = {}
-
     # find occurences of tags in text
-    for text_to_extract in text_list:
-        sum_add_two_dictionaries(tags_occurrences, get_tags_in_text(text_to_extract))
+    tags_occurrences = count_tags_in_texts(text_list)
 
     # remove tags that are already tagged
     for tag in current_tags:
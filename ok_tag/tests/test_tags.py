@@ -1,7 +1,9 @@
+# -*- coding: utf-8 -*-
 from datetime import datetime
 
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import get_cache
 from django.http.request import HttpRequest
 from django.test import TestCase
 from tagging.models import Tag
@@ -77,3 +79,26 @@ class SuggestionsTestCase(TestCase):
         text = "tag1 ate the cat"
         tags_count = ok_tag.tag_suggestions.get_tags_in_text(text)
         self.assertEqual(tags_count['tag1'], 1)
+
+    def test_prefixes_and_multi_word_tags(self):
+        ok_tag.tag_suggestions._all_tags_names = [u'בית', u'בית ספר']
+        tags_count = ok_tag.tag_suggestions.get_tags_in_text(u'מהבית הלכתי לבית ספר')
+        self.assertEqual(tags_count, {u'בית': 2, u'בית ספר': 1})
+
+    def test_tags_change(self):
+        ok_tag.tag_suggestions.get_tags_in_text("tag1")
+        Tag.objects.create(name='tag2')
+        self.assertEqual(ok_tag.tag_suggestions._all_tags_names, [])
+
+    def test_tags_change_in_another_process(self):
+        # the default cache backend is a dummy one, which shares nothing
+        shared_cache = get_cache('django.core.cache.backends.locmem.LocMemCache')
+        default_cache = ok_tag.tag_suggestions.cache
+        ok_tag.tag_suggestions.cache = shared_cache
+        try:
+            self.assertEqual(ok_tag.tag_suggestions.get_tags_in_text("tag1"), {'tag1': 1})
+            shared_cache.set(ok_tag.tag_suggestions.TAGS_VERSION_CACHE_KEY, 'changed elsewhere')
+            self.assertEqual(ok_tag.tag_suggestions.get_tags_in_text("tag1"), {})
+        finally:
+            ok_tag.tag_suggestions.cache = default_cache
+            ok_tag.tag_suggestions._tags_names_version = None
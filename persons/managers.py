@@ -1,15 +1,33 @@
 from django.utils.encoding import smart_text
-from django.db.models import Q, Manager, Model
+from django.db.models import Model
 from django.core.exceptions import MultipleObjectsReturned, ObjectDoesNotExist
 
-class PersonManager(Manager):
+from mks.managers import NameAwareManager
+
+
+class PersonManager(NameAwareManager):
+
+    def get_name_entries(self):
+        from persons.models import PersonAlias
+        entries = list(super(PersonManager, self).get_name_entries())
+        entries.extend(PersonAlias.objects.values_list('name', 'person_id'))
+        return entries
 
     def get_by_name(self, name, create=False):
-        name = smart_text(name)
-        persons = self.filter((Q(aliases__name__in=name) | Q(name=name)))
-        if persons:
-            return persons[0]
-        else:
-            if create:
-                return self.create(name=name)
-            return None
+        return self.get_by_names([name], create=create)[smart_text(name)]
+
+    def get_by_names(self, names, create=False):
+        ''' returns a dict of name => the person with that name or alias (or
+            None), creating the missing persons if create is True
+        '''
+        names = set(smart_text(name) for name in names)
+        index = self.name_index
+        ids = dict((name, min(index.exact(name))) for name in names if index.exact(name))
+        persons = self._in_bulk(ids.values())
+        ret = {}
+        for name in names:
+            person = persons.get(ids.get(name))
+            if person is None and create:
+                person = self.create(name=name)
+            ret[name] = person
+        return ret
@@ -7,6 +7,7 @@ from django.dispatch import receiver
 from django.db.models.signals import post_save
 
 from mks.models import Member, GENDER_CHOICES
+from mks import name_index
 from links.models import Link
 from .managers import PersonManager
 
@@ -186,6 +187,19 @@ def member_post_save(sender, **kwargs):
     person.save()
 
 
+def _person_names(name, person_id, mk_id):
+    names = [('Person', name, person_id)]
+    if mk_id is not None:
+        names.append(('Member', name, mk_id))
+    return names
+
+
+name_index.track_name_changes(Person, ('name', 'mk_id'),
+                              lambda person: _person_names(person.name, person.id, person.mk_id))
+name_index.track_name_changes(PersonAlias, ('name', 'person_id'),
+                              lambda alias: _person_names(alias.name, alias.person_id, alias.person.mk_id))
+
+
 class Role(models.Model):
     start_date = models.DateField(null=True)
     end_date = models.DateField(blank=True, null=True)
@@ -3,6 +3,6 @@ if [ `pgrep -f PresenceManager.py` ]; then
     kill `ps -ef | grep -v grep | grep "PresenceManager" | head -1 | awk '{print $2}'`
     sleep 1s
 fi
-cat /oknesset_data/presence/presence.txt | grep $(date +"%Y") | gzip  > /oknesset_data/oknesset/Open-Knesset/data/presence.txt.gz
 cd /oknesset_data/presence
+python PresenceManager.py --year $(date +"%Y") export /oknesset_data/oknesset/Open-Knesset/data/presence.txt.gz
 python PresenceManager.py &
@@ -1,11 +1,20 @@
 #!/usr/bin/env python
-from present_list import KnessetPresenceParser
+from present_list import KnessetPresenceParser, PresencePageFetcher, PRESENT_KNESET_URL
+from series import PresenceSeries, export_reports
 from datetime import datetime
+from optparse import OptionParser
+import gzip
+import logging
+import signal
+import sys
 import time
 
-SLEEP_TIME_BETWEEN_CHECKS = 7 * 60  # 7 minutes
+SLEEP_TIME_BETWEEN_CHECKS = 60  # 1 minute, unmodified pages cost a conditional request only
+FLUSH_SAMPLES = 10  # flush the results after this many new samples
 LOG_FILE = 'presence_log.txt'
-RESULTS_FILE = 'presence.txt'
+RESULTS_FILE = 'presence.dat'
+
+logger = logging.getLogger("open-knesset.presence")
 
 
 class PresenceManager(object):
@@ -13,46 +22,79 @@ class PresenceManager(object):
     This class responsible for running and updating the MKs precence according to the knesset presence website
     '''
 
-    __last_presence_check = None
-    __log_file = None
-
-    def run(self):
-        self._write_log('--- %s --- Starting running kneset presence check ' % str(datetime.now()))
-        while True:
-            # self._write_log('--- %s --- Parsing kneset HTML' % str(datetime.now()) )
-            try:
-                presence_parser = KnessetPresenceParser()
-            except Exception as e:
-                self._write_log(
-                    '--- %s --- Can\'t create KnessetPresenceParser: %s  - Going to sleep' % (str(datetime.now()), e))
-                time.sleep(SLEEP_TIME_BETWEEN_CHECKS)
-                continue
-
-            if presence_parser.lastupdate_date == self.__last_presence_check:
-                self._write_log('--- %s --- No new updates. Going to sleep' % str(datetime.now()))
-                time.sleep(SLEEP_TIME_BETWEEN_CHECKS)
-                continue
-
-            self.__last_presence_check = presence_parser.lastupdate_date
-            self._write_log(
-                '--- %s --- The HTML have been updated in %s' % (str(datetime.now()), str(presence_parser.lastupdate_date)))
-            mk_presence = presence_parser.get_present_mks_ids()
-            self._write_results(str(presence_parser.lastupdate_date) + ", " + ", ".join([str(mk) for mk in mk_presence]))
-            # for mk in l:
-            #    self._write_log("MK id=%d present in %s" % (mk, str(k.lastupdate_date)) )
-            time.sleep(SLEEP_TIME_BETWEEN_CHECKS)
-
-    def _write_log(self, msg):
-        self.__log_file = file(LOG_FILE, 'a')
-        self.__log_file.write(msg + "\n")
-        self.__log_file.close()
-
-    def _write_results(self, msg):
-        self.__log_file = file(RESULTS_FILE, 'a')
-        self.__log_file.write(msg + "\n")
-        self.__log_file.close()
+    def __init__(self, url=PRESENT_KNESET_URL, results_file=RESULTS_FILE, flush_samples=FLUSH_SAMPLES):
+        self.fetcher = PresencePageFetcher(url)
+        self.series = PresenceSeries()
+        self.results_file = results_file
+        self.flush_samples = flush_samples
+        self.__last_presence_check = None
+
+    def check(self):
+        '''Checks the presence page once. Returns True if a new sample was added'''
+        html_page = self.fetcher.fetch()
+        if html_page is None:
+            logger.debug('No new updates')
+            return False
+        presence_parser = KnessetPresenceParser(html_page)
+        if presence_parser.lastupdate_date == self.__last_presence_check:
+            logger.debug('No new updates')
+            return False
+
+        self.__last_presence_check = presence_parser.lastupdate_date
+        logger.info('The HTML have been updated in %s' % presence_parser.lastupdate_date)
+        self.series.add(presence_parser.lastupdate_date, presence_parser.get_present_mks_ids())
+        if len(self.series) - self.series.flushed >= self.flush_samples:
+            self.flush()
+        return True
+
+    def flush(self):
+        if len(self.series) == self.series.flushed:
+            return
+        with open(self.results_file, 'ab') as f:
+            self.series.flush(f)
+
+    def run(self, sleep_time=SLEEP_TIME_BETWEEN_CHECKS):
+        logger.info('Starting running kneset presence check')
+        # flush the pending samples when killed
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        try:
+            while True:
+                try:
+                    self.check()
+                except Exception as e:
+                    logger.error('Can\'t check the presence page: %s - Going to sleep' % e)
+                time.sleep(sleep_time)
+        finally:
+            self.flush()
+
+
+def export(results_file, reports_file, year=None):
+    '''Exports the results as the gzipped text reports file syncdata reads'''
+    since = datetime(year, 1, 1) if year else None
+    with open(results_file, 'rb') as f:
+        out = gzip.open(reports_file, 'wb')
+        try:
+            export_reports(f, out, since)
+        finally:
+            out.close()
 
 
 if __name__ == '__main__':
-    pm = PresenceManager()
-    pm.run()
+    parser = OptionParser(usage='%prog [options]\n       %prog [options] export REPORTS_FILE')
+    parser.add_option('--results', dest='results_file', default=RESULTS_FILE,
+                      help='The binary results file (default: %default)')
+    parser.add_option('--interval', dest='interval', type='int', default=SLEEP_TIME_BETWEEN_CHECKS,
+                      help='Seconds between checks of the presence page (default: %default)')
+    parser.add_option('--flush', dest='flush_samples', type='int', default=FLUSH_SAMPLES,
+                      help='Flush the results after this many new samples (default: %default)')
+    parser.add_option('--year', dest='year', type='int',
+                      help='Only export the samples of this year and on')
+    options, args = parser.parse_args()
+    if args and args[0] == 'export' and len(args) == 2:
+        export(options.results_file, args[1], options.year)
+    elif args:
+        parser.error('unknown arguments')
+    else:
+        logging.basicConfig(filename=LOG_FILE, format='--- %(asctime)s --- %(message)s', level=logging.INFO)
+        PresenceManager(results_file=options.results_file, flush_samples=options.flush_samples).run(
+            options.interval)
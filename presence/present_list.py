@@ -1,8 +1,8 @@
-import urllib
-import codecs
+import hashlib
 import re
+import urllib2
 from datetime import datetime
-from BeautifulSoup import BeautifulSoup  # for HTML parsing
+from HTMLParser import HTMLParser
 
 #############
 #   CONSTS  #
@@ -18,98 +18,130 @@ LAST_UPDATE_TIME_REGEX = re.compile('(\d+\/\d+\/\d+\s+\d+:\d+)')
 LAST_UPDATE_DATETIME_FORMAT = "%d/%m/%Y %H:%M"
 ID_LINK_REGEX = re.compile(r'id_.*=(\d+)')
 MK_IMG_ID = re.compile('^dl.*_img')
+MK_PRESENT_IMG_CLASS = 'PhotoAsist'
+MK_NOT_PRESENT_IMG_CLASS = 'PhotoAsistno'
+FETCH_TIMEOUT = 30
 
 
-class KnessetPresenceParser(object):
-    '''This class is responsible for pasrsing the Kneset presence HTML page and extract from it all, the Kneset memebrs that are
-        in the kneset according to the last presence update.
+class PresencePageParser(HTMLParser):
+    '''A single pass parser of the presence page. Only the MKs' table cells and the last update time are looked at,
+        without building a tree of the whole page.
     '''
-    # The time when the parser start to parse
-    __check_time = None
-    # The last update time when the kneset present page was updated
-    __last_update_time = None
-
-    # beutiful soup parsing of the page
-    __soup = None
-
-    # Consts
-    __MK_NOT_PRESENT_IMG_CLASS_STR = 'PhotoAsistno'
-    __MK_PRESENT_IMG_CLASS_STR = 'PhotoAsist'
 
     def __init__(self):
-        '''Class constructor build a presence date by parsing the knesset presence html page'''
-        self.__soup = self._get_presence_html_page()
-        self.__last_update_time = self._get_lastupdate_time()
-
-    def _is_mk_present(self, tag):
-        '''This function gets a image html and states if the MK is present or not according to img class value:
-        if the MK is present the class value equals 'PhotoAsist'' otherwise it equals 'PhotoAsistno' '''
-
-        if tag is None or tag.attrMap is None:
-            return False
-
-        if 'class' in tag.attrMap and tag['class'] == self.__MK_PRESENT_IMG_CLASS_STR:
-            return True
-        return False
-
-    def _is_mk_not_present(self, tag):
-        '''This function gets a image html and states if the MK is present or not according to img class value:
-        if the MK is present the class value equals 'PhotoAsist'' otherwise it equals 'PhotoAsistno' '''
-
-        if tag is None or tag.attrMap is None:
-            return False
-
-        if 'class' in tag.attrMap and tag['class'] == self.__MK_NOT_PRESENT_IMG_CLASS_STR:
-            return True
-        return False
-
-    def _get_mk_href_tag(self, img_tags_list):
-        ''' The function gets img tag list with mk picture in it and return the MK link TAG list
-        '''
-
-        a_tag_list = []
-        # we got all the images that are not in gray so now we need to find the id of the member we do that
-        # by finding the img 'td' parent and extracting the id value from it
-        for img_tag in img_tags_list:
-            td_tag = img_tag.findParent()
-
-            # sanity check
-            if (td_tag.name.lower() != 'td'):
-                raise Exception("Img MK parent expected to by 'td' tag got %s tag instead" % td_tag.name)
-
-            a_tag_list.append(td_tag.find('a'))
+        HTMLParser.__init__(self)
+        self.present_ids = []
+        self.not_present_ids = []
+        self.last_update_text = None
+        self._cell_class = None  # the class of the MK image in the current td
+        self._cell_id = None  # the MK id of the first link in the current td
+        self._last_update_tag = None
+        self._last_update_data = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'td':
+            self._end_cell()
+        attrs = dict(attrs)
+        if tag == 'img' and MK_IMG_ID.match(attrs.get('id') or ''):
+            self._cell_class = attrs.get('class')
+        elif tag == 'a' and self._cell_id is None and attrs.get('href'):
+            ids = ID_LINK_REGEX.findall(attrs['href'])
+            if ids:
+                self._cell_id = int(ids[0])
+        if attrs.get('id') == LAST_UPDATE_TIME_ID:
+            self._last_update_tag = tag
+
+    def handle_endtag(self, tag):
+        if tag == 'td':
+            self._end_cell()
+        if tag == self._last_update_tag:
+            self._last_update_tag = None
+            self.last_update_text = ''.join(self._last_update_data)
+
+    def handle_data(self, data):
+        if self._last_update_tag is not None:
+            self._last_update_data.append(data)
+
+    def close(self):
+        HTMLParser.close(self)
+        self._end_cell()
+
+    def _end_cell(self):
+        if self._cell_class is not None and self._cell_id is not None:
+            if self._cell_class == MK_PRESENT_IMG_CLASS:
+                self.present_ids.append(self._cell_id)
+            elif self._cell_class == MK_NOT_PRESENT_IMG_CLASS:
+                self.not_present_ids.append(self._cell_id)
+        self._cell_class = None
+        self._cell_id = None
+
+
+class PresencePageFetcher(object):
+    '''Fetches the presence page with conditional requests: returns None when the page was not modified since the
+        last fetch, according to its ETag / Last-Modified headers, or to its content when the server ignores them.
+    '''
 
-        return a_tag_list
+    def __init__(self, url=PRESENT_KNESET_URL, timeout=FETCH_TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+        self.etag = None
+        self.last_modified = None
+        self.digest = None
+
+    def fetch(self):
+        request = urllib2.Request(self.url)
+        if self.etag:
+            request.add_header('If-None-Match', self.etag)
+        if self.last_modified:
+            request.add_header('If-Modified-Since', self.last_modified)
+        try:
+            response = urllib2.urlopen(request, timeout=self.timeout)
+        except urllib2.HTTPError as e:
+            if e.code == 304:
+                return None
+            raise
+        try:
+            html_page = response.read()
+            self.etag = response.info().getheader('ETag')
+            self.last_modified = response.info().getheader('Last-Modified')
+        finally:
+            response.close()
+        digest = hashlib.md5(html_page).digest()
+        if digest == self.digest:
+            return None
+        self.digest = digest
+        return html_page
 
-    def _get_id_from_link(self, link):
-        '''Gets the MK id from the url link '''
-        return ID_LINK_REGEX.findall(link)[0]
 
-    def _get_mks_ids_by_func(self, select_func=lambda x: True):
-        '''Get all the imgs soup tag the returns True when the selection function checks them'''
-        imgs_list = self.__soup.findAll(id=MK_IMG_ID)
-        present_mk_limg_tag_list = [img for img in imgs_list if select_func(img)]
+class KnessetPresenceParser(object):
+    '''This class is responsible for pasrsing the Kneset presence HTML page and extract from it all, the Kneset memebrs that are
+        in the kneset according to the last presence update.
+    '''
 
-        a_tag_list = self._get_mk_href_tag(present_mk_limg_tag_list)
-        return [int(self._get_id_from_link(a['href'])) for a in a_tag_list]
+    def __init__(self, html_page=None):
+        '''Class constructor build a presence date by parsing the knesset presence html page (fetched, unless given)'''
+        if html_page is None:
+            html_page = self._get_presence_html_page()
+        self.__parser = PresencePageParser()
+        self.__parser.feed(html_page)
+        self.__parser.close()
+        self.__last_update_time = self._get_lastupdate_time()
 
     def get_present_mks_ids(self):
         '''Return all the ids of the MKs that present in the knesset according to the Knesset website'''
-        return self._get_mks_ids_by_func(self._is_mk_present)
+        return list(self.__parser.present_ids)
 
     def get_not_present_mks_ids(self):
         '''Return all the ids of teh MKs that are not present in the kneset according to the Kneset website'''
-        return self._get_mks_ids_by_func(self._is_mk_not_present)
+        return list(self.__parser.not_present_ids)
 
     def _get_presence_html_page(self):
         '''Return the presence HTML page'''
-        html_page = urllib.urlopen(PRESENT_KNESET_URL).read()
-        return BeautifulSoup(html_page)
+        return urllib2.urlopen(PRESENT_KNESET_URL, timeout=FETCH_TIMEOUT).read()
 
     def _get_lastupdate_time(self):
         '''Returns the last update date of the presence page'''
-        d = str(self.__soup.find(id=LAST_UPDATE_TIME_ID))
-        update_date_result = LAST_UPDATE_TIME_REGEX.findall(d)
+        update_date_result = LAST_UPDATE_TIME_REGEX.findall(self.__parser.last_update_text or '')
         if len(update_date_result) != 1:
             raise Exception("Error: Parsing  kneset present page could not find last update time")
 
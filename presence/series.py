@@ -0,0 +1,115 @@
+'''A rolling in memory time series of the MKs presence, and the compact binary file it is flushed to.
+
+In memory, every MK has a bitset (a python long) of the samples it was present in, so a new sample costs a bit per
+present MK. The samples are appended to the file in batches, each as a record of the sample time (unix seconds), the
+length of its bitset in bytes, and the bitset over the MK ids.
+'''
+import calendar
+import struct
+from array import array
+from datetime import datetime
+
+RECORD_HEADER = struct.Struct('<IH')  # sample time, bitset bytes
+REPORT_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+# how many samples are kept in memory (~ a week of samples every minute)
+WINDOW_SAMPLES = 7 * 24 * 60
+
+
+def _pack_bitset(member_ids):
+    bitset = array('B', [0] * ((max(member_ids) >> 3) + 1 if member_ids else 0))
+    for member_id in member_ids:
+        bitset[member_id >> 3] |= 1 << (member_id & 7)
+    return bitset.tostring()
+
+
+def _unpack_bitset(data):
+    bitset = array('B', data)
+    return [(i << 3) + bit for i, byte in enumerate(bitset) if byte for bit in xrange(8) if byte & (1 << bit)]
+
+
+def write_samples(f, samples):
+    '''Appends the (time, member ids) samples to the open binary file f'''
+    for time, member_ids in samples:
+        bitset = _pack_bitset(member_ids)
+        f.write(RECORD_HEADER.pack(calendar.timegm(time.timetuple()), len(bitset)))
+        f.write(bitset)
+
+
+def read_samples(f):
+    '''Yields the (time, sorted member ids) samples of the open binary file f'''
+    while True:
+        header = f.read(RECORD_HEADER.size)
+        if len(header) < RECORD_HEADER.size:
+            return
+        timestamp, size = RECORD_HEADER.unpack(header)
+        data = f.read(size)
+        if len(data) < size:  # a partially written record
+            return
+        yield datetime.utcfromtimestamp(timestamp), _unpack_bitset(data)
+
+
+def export_reports(f, out, since=None):
+    '''Writes the samples of the binary file f as the text reports simple.parsers.parse_presence reads: a line per
+    sample, of its time and the ids of the present MKs. only samples from since (a datetime) on are written'''
+    for time, member_ids in read_samples(f):
+        if since is None or time >= since:
+            out.write(', '.join([time.strftime(REPORT_TIME_FORMAT)] + [str(member_id) for member_id in member_ids]))
+            out.write('\n')
+
+
+class PresenceSeries(object):
+    '''The samples of the last window, and the ones not flushed yet'''
+
+    def __init__(self, window=WINDOW_SAMPLES):
+        self.window = window
+        self.start = 0  # the number of samples dropped from memory
+        self.flushed = 0  # the number of samples flushed
+        self.times = []
+        self.bits = {}  # member id => bitset of the samples in memory, bit i for self.times[i]
+
+    def __len__(self):
+        return self.start + len(self.times)
+
+    def add(self, time, member_ids):
+        bit = 1 << len(self.times)
+        for member_id in member_ids:
+            self.bits[member_id] = self.bits.get(member_id, 0) | bit
+        self.times.append(time)
+        self._trim()
+
+    def members_at(self, index):
+        '''The sorted ids of the members present in the sample at index (counted from the first sample ever)'''
+        bit = 1 << (index - self.start)
+        return sorted(member_id for member_id, bits in self.bits.iteritems() if bits & bit)
+
+    def member_samples(self, member_id):
+        '''The (time, present) samples in memory of a member'''
+        bits = self.bits.get(member_id, 0)
+        return [(time, bool(bits >> i & 1)) for i, time in enumerate(self.times)]
+
+    def pending(self):
+        '''The (time, member ids) samples that were not flushed yet'''
+        return [(self.times[index - self.start], self.members_at(index)) for index in xrange(self.flushed, len(self))]
+
+    def flush(self, f):
+        '''Appends the pending samples to the open binary file f. Returns the number of samples flushed'''
+        samples = self.pending()
+        write_samples(f, samples)
+        f.flush()
+        self.flushed = len(self)
+        self._trim()
+        return len(samples)
+
+    def _trim(self):
+        # samples are only dropped after they are flushed
+        drop = min(len(self.times) - self.window, self.flushed - self.start)
+        if drop <= 0:
+            return
+        del self.times[:drop]
+        for member_id, bits in self.bits.items():
+            bits >>= drop
+            if bits:
+                self.bits[member_id] = bits
+            else:
+                del self.bits[member_id]
+        self.start += drop
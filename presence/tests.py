@@ -1,3 +1,125 @@
-from django.test import TestCase
+import threading
+import unittest
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from cStringIO import StringIO
+from datetime import datetime
 
-# Create your tests here.
+from present_list import KnessetPresenceParser, PresencePageFetcher
+from series import PresenceSeries, read_samples, export_reports
+from PresenceManager import PresenceManager
+
+PAGE = '''<html><body>
+<span id="TimeStamp_eng2_lbLastUpdated">Last updated: %s</span>
+<table><tr>
+<td><a href="/mk/eng/mk_eng.asp?mk_individual_id_t=12"><img id="dlMKs_ctl00_img" class="PhotoAsist" src="12.jpg"></a></td>
+<td><img id="dlMKs_ctl01_img" class="PhotoAsistno" src="34.jpg"><br><a href="/mk/eng/mk_eng.asp?mk_individual_id_t=34">MK</a></td>
+<td><a href="/mk/eng/mk_eng.asp?mk_individual_id_t=800"><img id="dlMKs_ctl02_img" class="PhotoAsist"></a>
+</tr></table>
+</body></html>'''
+
+
+class StubPresenceHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        server.requests += 1
+        if self.headers.getheader('If-None-Match') == server.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = PAGE % server.last_update
+        self.send_response(200)
+        self.send_header('ETag', server.etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class PresencePageTest(unittest.TestCase):
+    def test_parse(self):
+        parser = KnessetPresenceParser(PAGE % '04/01/2016 10:30')
+        self.assertEqual(parser.lastupdate_date, datetime(2016, 1, 4, 10, 30))
+        self.assertEqual(parser.get_present_mks_ids(), [12, 800])
+        self.assertEqual(parser.get_not_present_mks_ids(), [34])
+
+    def test_missing_update_time(self):
+        self.assertRaises(Exception, KnessetPresenceParser, '<html></html>')
+
+
+class PresenceSeriesTest(unittest.TestCase):
+    def test_rolling_window(self):
+        series = PresenceSeries(window=2)
+        times = [datetime(2016, 1, 4, 10, minute) for minute in range(4)]
+        series.add(times[0], [12, 800])
+        series.add(times[1], [12])
+        series.add(times[2], [34])
+        # nothing is dropped before it is flushed
+        self.assertEqual(len(series.times), 3)
+        f = StringIO()
+        self.assertEqual(series.flush(f), 3)
+        self.assertEqual(series.times, times[1:3])
+        self.assertEqual(sorted(series.bits), [12, 34])
+        series.add(times[3], [800])
+        self.assertEqual(series.members_at(3), [800])
+        self.assertEqual(series.member_samples(12), [(times[2], False), (times[3], False)])
+        series.flush(f)
+
+        f.seek(0)
+        self.assertEqual(list(read_samples(f)), [(times[0], [12, 800]), (times[1], [12]), (times[2], [34]),
+                                                 (times[3], [800])])
+        f.seek(0)
+        out = StringIO()
+        export_reports(f, out, since=times[2])
+        self.assertEqual(out.getvalue(), '2016-01-04 10:02:00, 34\n2016-01-04 10:03:00, 800\n')
+
+
+class PresenceManagerTest(unittest.TestCase):
+    def setUp(self):
+        self.server = HTTPServer(('127.0.0.1', 0), StubPresenceHandler)
+        self.server.requests = 0
+        self.server.etag = '"1"'
+        self.server.last_update = '04/01/2016 10:30'
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.url = 'http://127.0.0.1:%d/' % self.server.server_port
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_conditional_requests(self):
+        fetcher = PresencePageFetcher(self.url)
+        self.assertTrue(fetcher.fetch())
+        self.assertEqual(fetcher.etag, '"1"')
+        self.assertEqual(fetcher.fetch(), None)
+        # an unchanged page is not returned even if its ETag changed
+        self.server.etag = '"2"'
+        self.assertEqual(fetcher.fetch(), None)
+        self.server.etag = '"3"'
+        self.server.last_update = '04/01/2016 10:45'
+        self.assertTrue(fetcher.fetch())
+        self.assertEqual(self.server.requests, 4)
+
+    def test_check(self):
+        results = StringIO()
+        manager = PresenceManager(self.url, flush_samples=2)
+        manager.flush = lambda: manager.series.flush(results)
+        self.assertTrue(manager.check())
+        self.assertFalse(manager.check())
+        # a new page with the same update time is not a new sample
+        self.server.etag = '"2"'
+        self.assertFalse(manager.check())
+        self.assertEqual(results.getvalue(), '')
+        self.server.etag = '"3"'
+        self.server.last_update = '04/01/2016 10:45'
+        self.assertTrue(manager.check())
+        results.seek(0)
+        self.assertEqual(list(read_samples(results)), [(datetime(2016, 1, 4, 10, 30), [12, 800]),
+                                                       (datetime(2016, 1, 4, 10, 45), [12, 800])])
+
+
+if __name__ == '__main__':
+    unittest.main()
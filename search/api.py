@@ -0,0 +1,64 @@
+'''
+Api for the local search index
+'''
+import tastypie.fields as fields
+from tastypie.exceptions import BadRequest
+
+from apis.resources.base import BaseNonModelResource
+from search.index import search_index
+
+# the maximal number of results the api pages through
+MAX_RESULTS = 200
+
+
+class SearchResultStruct(object):
+    def __init__(self, result):
+        document = result.document
+        self.type = document.content_type.model
+        self.id = document.object_id
+        self.title = document.title
+        self.url = document.url
+        self.snippet = document.snippet
+        self.score = result.score
+
+
+def get_search_models(types):
+    '''returns the indexed models for a comma separated list of model names'''
+    if not types:
+        return None
+    models_by_name = dict((model._meta.model_name, model) for model in search_index.model_indexes)
+    names = [name.strip() for name in types.split(',') if name.strip()]
+    unknown = [name for name in names if name not in models_by_name]
+    if unknown:
+        raise ValueError('unknown search types: %s' % ', '.join(unknown))
+    return [models_by_name[name] for name in names]
+
+
+class SearchResource(BaseNonModelResource):
+    ''' Ranked full-text search over bills, votes, protocols, members and persons.
+
+        GET /api/v2/search/?q=<query>[&type=bill,vote]
+    '''
+    type = fields.CharField(attribute='type')
+    id = fields.IntegerField(attribute='id')
+    title = fields.CharField(attribute='title')
+    url = fields.CharField(attribute='url')
+    snippet = fields.CharField(attribute='snippet')
+    score = fields.FloatField(attribute='score')
+
+    class Meta(BaseNonModelResource.Meta):
+        allowed_methods = ['get']
+        detail_allowed_methods = []
+        resource_name = 'search'
+        object_class = SearchResultStruct
+        include_resource_uri = False
+        limit = 20
+
+    def obj_get_list(self, bundle, **kwargs):
+        query = bundle.request.GET.get('q', '')
+        try:
+            models = get_search_models(bundle.request.GET.get('type'))
+        except ValueError as e:
+            raise BadRequest(str(e))
+        return [SearchResultStruct(result)
+                for result in search_index.search(query, models=models, limit=MAX_RESULTS)]
@@ -0,0 +1,321 @@
+# encoding: utf-8
+"""
+A local full-text search index over the site's bills, votes, committee
+protocols, members and persons.
+
+Every indexed object is stored as a SearchDocument with SearchTerm postings
+(term, weight) produced by search.tokenizer. Searching ranks the documents
+with the postings of the query terms using BM25, computed by the database.
+"""
+import math
+from collections import defaultdict, namedtuple
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.utils.html import strip_tags
+from django.utils.text import Truncator
+
+from committees.models import ProtocolPart
+from knesset.utils import QUERY_CHUNK_SIZE, chunks
+from laws.models import Bill, Vote
+from mks.models import Member
+from persons.models import Person
+from search.models import SearchDocument, SearchTerm
+from search.tokenizer import tokenize, stems
+import logging
+
+logger = logging.getLogger("open-knesset.search.index")
+
+# weight of a prefix stripped stem relative to the word it came from
+STEM_WEIGHT = 0.5
+MAX_TERM_LENGTH = 64
+SNIPPET_WORDS = 40
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# the per content type document counts and lengths, dropped when the index
+# changes
+STATS_CACHE_KEY = 'search_index_stats'
+STATS_CACHE_TIME = 3600
+
+SearchResult = namedtuple('SearchResult', ['document', 'score'])
+
+
+def term_weights(fields):
+    """fields is an iterable of (text, weight, is_html) tuples. Returns a dict
+    of term => weighted number of occurrences and the number of words"""
+    weights = defaultdict(float)
+    length = 0
+    for text, weight, is_html in fields:
+        for word in tokenize(text, html=is_html):
+            length += 1
+            weights[word[:MAX_TERM_LENGTH]] += weight
+            for stem in stems(word):
+                weights[stem[:MAX_TERM_LENGTH]] += weight * STEM_WEIGHT
+    return weights, length
+
+
+class ModelIndex(object):
+    """Describes how the objects of a model are turned into search documents"""
+    model = None
+
+    def get_queryset(self):
+        return self.model._default_manager.all()
+
+    def should_index(self, obj):
+        return True
+
+    def get_title(self, obj):
+        return unicode(obj)
+
+    def get_url(self, obj):
+        return obj.get_absolute_url()
+
+    def get_fields(self, obj):
+        """Returns a list of (text, weight, is_html) tuples"""
+        raise NotImplementedError
+
+
+class BillIndex(ModelIndex):
+    model = Bill
+
+    def get_queryset(self):
+        return Bill.objects.prefetch_related('proposals')
+
+    def get_title(self, bill):
+        return bill.popular_name or bill.full_title or bill.title
+
+    def get_fields(self, bill):
+        fields = [(bill.title, 3, False), (bill.popular_name, 3, False), (bill.full_title, 2, False)]
+        proposals = list(bill.proposals.all())
+        for related_name in ('knesset_proposal', 'gov_proposal'):
+            try:
+                proposals.append(getattr(bill, related_name))
+            except ObjectDoesNotExist:
+                pass
+        for proposal in proposals:
+            fields.append((proposal.title, 2, False))
+            fields.append((proposal.content_html, 1, True))
+        return fields
+
+
+class VoteIndex(ModelIndex):
+    model = Vote
+
+    def get_title(self, vote):
+        return vote.title
+
+    def get_fields(self, vote):
+        return [(vote.title, 3, False), (vote.summary, 1, True)]
+
+
+class ProtocolPartIndex(ModelIndex):
+    model = ProtocolPart
+
+    def get_queryset(self):
+        return ProtocolPart.objects.select_related('meeting__committee')
+
+    def should_index(self, part):
+        return bool(part.body)
+
+    def get_title(self, part):
+        return unicode(part.meeting)
+
+    def get_fields(self, part):
+        return [(part.header, 2, False), (part.body, 1, False)]
+
+
+class MemberIndex(ModelIndex):
+    model = Member
+
+    def get_queryset(self):
+        return Member.objects.prefetch_related('memberaltname_set', 'person__aliases')
+
+    def get_title(self, member):
+        return member.name
+
+    def get_fields(self, member):
+        fields = [(member.name, 3, False)]
+        fields.extend((altname.name, 3, False) for altname in member.memberaltname_set.all())
+        for person in member.person.all():
+            fields.extend((alias.name, 3, False) for alias in person.aliases.all())
+        return fields
+
+
+class PersonIndex(ModelIndex):
+    model = Person
+
+    def get_queryset(self):
+        return Person.objects.prefetch_related('aliases')
+
+    def should_index(self, person):
+        # members are indexed by MemberIndex
+        return person.mk_id is None
+
+    def get_title(self, person):
+        return person.name
+
+    def get_fields(self, person):
+        return [(person.name, 3, False)] + [(alias.name, 3, False) for alias in person.aliases.all()]
+
+
+class SearchIndex(object):
+    def __init__(self, model_indexes):
+        self.model_indexes = dict((model_index.model, model_index) for model_index in model_indexes)
+
+    def is_indexed(self, model):
+        return model in self.model_indexes
+
+    def _build_document(self, model_index, obj):
+        fields = model_index.get_fields(obj)
+        weights, length = term_weights(fields)
+        snippet_text = u' '.join(strip_tags(text) if is_html else text
+                                 for text, weight, is_html in fields[1:] if text)
+        document = SearchDocument(
+            object_id=obj.pk, title=Truncator(model_index.get_title(obj) or u'').chars(1000),
+            url=model_index.get_url(obj) or u'', length=length,
+            snippet=Truncator(snippet_text).words(SNIPPET_WORDS))
+        return document, weights
+
+    @transaction.atomic
+    def index_objects(self, model, objects):
+        """(Re)index the given objects of an indexed model. Returns the number
+        of documents written"""
+        model_index = self.model_indexes[model]
+        content_type = ContentType.objects.get_for_model(model)
+        objects = list(objects)
+        self.remove_objects(model, [obj.pk for obj in objects])
+
+        documents = {}
+        for obj in objects:
+            if model_index.should_index(obj):
+                document, weights = self._build_document(model_index, obj)
+                document.content_type = content_type
+                documents[obj.pk] = (document, weights)
+        SearchDocument.objects.bulk_create([built[0] for built in documents.values()],
+                                           batch_size=QUERY_CHUNK_SIZE)
+
+        # bulk_create does not set the ids of the new documents
+        terms = []
+        for ids in chunks(documents.keys()):
+            for object_id, document_id in SearchDocument.objects.filter(
+                    content_type=content_type, object_id__in=ids).values_list('object_id', 'id'):
+                terms.extend(SearchTerm(term=term, document_id=document_id, weight=weight)
+                             for term, weight in documents[object_id][1].items())
+        SearchTerm.objects.bulk_create(terms, batch_size=QUERY_CHUNK_SIZE)
+        cache.delete(STATS_CACHE_KEY)
+        return len(documents)
+
+    def index_object(self, obj):
+        return self.index_objects(obj.__class__, [obj])
+
+    @transaction.atomic
+    def remove_objects(self, model, object_ids):
+        content_type = ContentType.objects.get_for_model(model)
+        for ids in chunks(object_ids):
+            documents = SearchDocument.objects.filter(content_type=content_type, object_id__in=ids)
+            SearchTerm.objects.filter(document__in=documents).delete()
+            documents.delete()
+        cache.delete(STATS_CACHE_KEY)
+
+    def rebuild(self, models=None, chunk_size=QUERY_CHUNK_SIZE):
+        """Reindex all the objects of the given models (all indexed models by
+        default). Returns the number of documents written"""
+        indexed = 0
+        for model in models or self.model_indexes.keys():
+            model_index = self.model_indexes[model]
+            content_type = ContentType.objects.get_for_model(model)
+            SearchTerm.objects.filter(document__content_type=content_type).delete()
+            SearchDocument.objects.filter(content_type=content_type).delete()
+            cache.delete(STATS_CACHE_KEY)
+            ids = list(model_index.get_queryset().order_by('pk').values_list('pk', flat=True))
+            for chunk in chunks(ids, chunk_size):
+                indexed += self.index_objects(model, model_index.get_queryset().filter(pk__in=chunk))
+            logger.info('indexed %d %s objects' % (len(ids), model.__name__))
+        return indexed
+
+    def corpus_stats(self, content_type_ids=None):
+        """Returns the (number of documents, average length) of the documents
+        of the given content types (all documents by default)"""
+        stats = cache.get(STATS_CACHE_KEY)
+        if stats is None:
+            stats = dict((content_type_id, (count, total_length)) for content_type_id, count, total_length in
+                         SearchDocument.objects.values_list('content_type').annotate(Count('id'), Sum('length')))
+            cache.set(STATS_CACHE_KEY, stats, STATS_CACHE_TIME)
+        if content_type_ids is not None:
+            stats = dict((content_type_id, stats[content_type_id])
+                         for content_type_id in content_type_ids if content_type_id in stats)
+        count = sum(count for count, total_length in stats.itervalues())
+        total_length = sum(total_length or 0 for count, total_length in stats.itervalues())
+        return count, (float(total_length) / count if count and total_length else 1.0)
+
+    def search(self, query, models=None, limit=50):
+        """Returns up to limit SearchResults for the query, best first.
+        models optionally restricts the results to objects of some models.
+
+        The documents are scored with BM25 by the database, which returns only
+        the best ones."""
+        # query term => (query weight, index of the query word it came from)
+        query_terms = {}
+        words = tokenize(query)
+        for i, word in enumerate(words):
+            query_terms[word[:MAX_TERM_LENGTH]] = (1.0, i)
+            for stem in stems(word):
+                query_terms.setdefault(stem[:MAX_TERM_LENGTH], (STEM_WEIGHT, i))
+        if not query_terms:
+            return []
+
+        postings = SearchTerm.objects.filter(term__in=query_terms.keys())
+        content_type_ids = None
+        if models:
+            content_type_ids = [content_type.id for content_type in
+                                ContentType.objects.get_for_models(*models).values()]
+            postings = postings.filter(document__content_type__in=content_type_ids)
+        document_frequency = dict(postings.order_by().values_list('term').annotate(Count('id')))
+        if not document_frequency:
+            return []
+        documents_count, average_length = self.corpus_stats(content_type_ids)
+
+        # term => query weight * idf
+        idf_weights = {}
+        for term, df in document_frequency.iteritems():
+            query_weight, word_index = query_terms[term]
+            idf_weights[term] = query_weight * math.log(1 + (documents_count - df + 0.5) / (df + 0.5))
+        terms = idf_weights.keys()
+        term_case = 'CASE t.term %s END' % ' '.join(['WHEN %s THEN %s'] * len(terms))
+        params = [value for term in terms for value in (term, idf_weights[term])]
+        params.extend([K1 + 1, K1 * (1 - B), K1 * B / average_length])
+        params.extend(value for term in terms for value in (term, query_terms[term][1]))
+        params.extend(terms)
+        content_type_filter = ''
+        if content_type_ids is not None:
+            content_type_filter = 'AND d.content_type_id IN (%s)' % ', '.join(['%s'] * len(content_type_ids))
+            params.extend(content_type_ids)
+        params.append(limit)
+        # the BM25 sum over the matched terms, times the number of query
+        # words matched - to prefer documents matching more of the query
+        sql = """SELECT t.document_id,
+                        SUM({term_case} * t.weight * %s / (t.weight + %s + %s * d.length))
+                        * COUNT(DISTINCT {term_case}) AS score
+                 FROM {terms_table} t INNER JOIN {documents_table} d ON d.id = t.document_id
+                 WHERE t.term IN ({terms}) {content_type_filter}
+                 GROUP BY t.document_id
+                 ORDER BY score DESC, t.document_id
+                 LIMIT %s""".format(
+            term_case=term_case, terms=', '.join(['%s'] * len(terms)), content_type_filter=content_type_filter,
+            terms_table=connection.ops.quote_name(SearchTerm._meta.db_table),
+            documents_table=connection.ops.quote_name(SearchDocument._meta.db_table))
+        cursor = connection.cursor()
+        cursor.execute(sql, params)
+        best = [(document_id, score / len(words)) for document_id, score in cursor.fetchall()]
+
+        documents = SearchDocument.objects.select_related('content_type').in_bulk([pk for pk, score in best])
+        return [SearchResult(documents[pk], score) for pk, score in best]
+
+
+search_index = SearchIndex([BillIndex(), VoteIndex(), ProtocolPartIndex(), MemberIndex(), PersonIndex()])
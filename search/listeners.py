@@ -0,0 +1,62 @@
+# encoding: utf-8
+from django.db.models.signals import post_save, post_delete
+from knesset.utils import disable_for_loaddata
+from laws.models import Bill, Vote, PrivateProposal, KnessetProposal, GovProposal
+from committees.models import ProtocolPart
+from mks.models import Member, MemberAltname
+from persons.models import Person, PersonAlias
+
+import logging
+
+logger = logging.getLogger("open-knesset.search.listeners")
+
+
+@disable_for_loaddata
+def index_object(sender, instance, **kwargs):
+    from search.index import search_index
+    search_index.index_object(instance)
+
+for model in (Bill, Vote, ProtocolPart, Member, Person):
+    post_save.connect(index_object, sender=model, dispatch_uid='search_index_%s' % model.__name__)
+
+
+@disable_for_loaddata
+def remove_object(sender, instance, **kwargs):
+    from search.index import search_index
+    search_index.remove_objects(sender, [instance.pk])
+
+for model in (Bill, Vote, ProtocolPart, Member, Person):
+    post_delete.connect(remove_object, sender=model, dispatch_uid='search_remove_%s' % model.__name__)
+
+
+def _reindex(obj):
+    from search.index import search_index
+    if obj is not None:
+        search_index.index_object(obj)
+
+
+@disable_for_loaddata
+def reindex_proposal_bill(sender, instance, **kwargs):
+    if instance.bill_id:
+        _reindex(Bill.objects.filter(pk=instance.bill_id).first())
+
+for model in (PrivateProposal, KnessetProposal, GovProposal):
+    post_save.connect(reindex_proposal_bill, sender=model, dispatch_uid='search_reindex_%s' % model.__name__)
+    post_delete.connect(reindex_proposal_bill, sender=model, dispatch_uid='search_reindex_%s_delete' % model.__name__)
+
+
+@disable_for_loaddata
+def reindex_member_altname(sender, instance, **kwargs):
+    _reindex(Member.objects.filter(pk=instance.member_id).first())
+post_save.connect(reindex_member_altname, sender=MemberAltname)
+post_delete.connect(reindex_member_altname, sender=MemberAltname)
+
+
+@disable_for_loaddata
+def reindex_person_alias(sender, instance, **kwargs):
+    person = Person.objects.filter(pk=instance.person_id).select_related('mk').first()
+    if person is not None:
+        # aliases of members' persons are indexed with the member
+        _reindex(person.mk if person.mk_id else person)
+post_save.connect(reindex_person_alias, sender=PersonAlias)
+post_delete.connect(reindex_person_alias, sender=PersonAlias)
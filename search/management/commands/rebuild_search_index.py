@@ -0,0 +1,28 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from search.api import get_search_models
+from search.index import search_index
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Rebuild the local search index"
+
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--type', action='store', dest='type', default=None,
+            help='Comma separated model names to reindex (bill,vote,protocolpart,member,person), default all'
+        ),
+    )
+
+    def handle(self, *args, **options):
+        try:
+            models = get_search_models(options['type'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        indexed = search_index.rebuild(models)
+        logger.info(u'Indexed {0} documents'.format(indexed))
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+from south.utils import datetime_utils as datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        # Adding model 'SearchDocument'
+        db.create_table(u'search_searchdocument', (
+            (u'id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('content_type', self.gf('django.db.models.fields.related.ForeignKey')(to=orm['contenttypes.ContentType'])),
+            ('object_id', self.gf('django.db.models.fields.PositiveIntegerField')()),
+            ('title', self.gf('django.db.models.fields.CharField')(max_length=1000)),
+            ('url', self.gf('django.db.models.fields.CharField')(max_length=1024, blank=True)),
+            ('snippet', self.gf('django.db.models.fields.TextField')(blank=True)),
+            ('length', self.gf('django.db.models.fields.PositiveIntegerField')(default=0)),
+            ('updated', self.gf('django.db.models.fields.DateTimeField')(auto_now=True, blank=True)),
+        ))
+        db.send_create_signal(u'search', ['SearchDocument'])
+
+        # Adding unique constraint on 'SearchDocument', fields ['content_type', 'object_id']
+        db.create_unique(u'search_searchdocument', ['content_type_id', 'object_id'])
+
+        # Adding model 'SearchTerm'
+        db.create_table(u'search_searchterm', (
+            (u'id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('term', self.gf('django.db.models.fields.CharField')(max_length=64, db_index=True)),
+            ('document', self.gf('django.db.models.fields.related.ForeignKey')(related_name='terms', to=orm['search.SearchDocument'])),
+            ('weight', self.gf('django.db.models.fields.FloatField')()),
+        ))
+        db.send_create_signal(u'search', ['SearchTerm'])
+
+
+    def backwards(self, orm):
+        # Removing unique constraint on 'SearchDocument', fields ['content_type', 'object_id']
+        db.delete_unique(u'search_searchdocument', ['content_type_id', 'object_id'])
+
+        # Deleting model 'SearchTerm'
+        db.delete_table(u'search_searchterm')
+
+        # Deleting model 'SearchDocument'
+        db.delete_table(u'search_searchdocument')
+
+
+    models = {
+        u'contenttypes.contenttype': {
+            'Meta': {'ordering': "('name',)", 'unique_together': "(('app_label', 'model'),)", 'object_name': 'ContentType', 'db_table': "'django_content_type'"},
+            'app_label': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'model': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '100'})
+        },
+        u'search.searchdocument': {
+            'Meta': {'unique_together': "(('content_type', 'object_id'),)", 'object_name': 'SearchDocument'},
+            'content_type': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['contenttypes.ContentType']"}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'length': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'object_id': ('django.db.models.fields.PositiveIntegerField', [], {}),
+            'snippet': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'title': ('django.db.models.fields.CharField', [], {'max_length': '1000'}),
+            'updated': ('django.db.models.fields.DateTimeField', [], {'auto_now': 'True', 'blank': 'True'}),
+            'url': ('django.db.models.fields.CharField', [], {'max_length': '1024', 'blank': 'True'})
+        },
+        u'search.searchterm': {
+            'Meta': {'object_name': 'SearchTerm'},
+            'document': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'terms'", 'to': u"orm['search.SearchDocument']"}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'term': ('django.db.models.fields.CharField', [], {'max_length': '64', 'db_index': 'True'}),
+            'weight': ('django.db.models.fields.FloatField', [], {})
+        }
+    }
+
+    complete_apps = ['search']
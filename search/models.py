@@ -0,0 +1,37 @@
+# encoding: utf-8
+from django.contrib.contenttypes import generic
+from django.contrib.contenttypes.models import ContentType
+from django.db import models
+
+
+class SearchDocument(models.Model):
+    """An indexed object, see search.index"""
+    content_type = models.ForeignKey(ContentType)
+    object_id = models.PositiveIntegerField()
+    content_object = generic.GenericForeignKey('content_type', 'object_id')
+    title = models.CharField(max_length=1000)
+    url = models.CharField(max_length=1024, blank=True)
+    snippet = models.TextField(blank=True)
+    # number of words indexed, used to normalize the ranking
+    length = models.PositiveIntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('content_type', 'object_id')
+
+    def __unicode__(self):
+        return self.title
+
+
+class SearchTerm(models.Model):
+    """A posting of the inverted index: the weighted number of times a
+    normalized term appears in a document"""
+    term = models.CharField(max_length=64, db_index=True)
+    document = models.ForeignKey(SearchDocument, related_name='terms')
+    weight = models.FloatField()
+
+    def __unicode__(self):
+        return u"%s %s %f" % (self.term, self.document_id, self.weight)
+
+
+from listeners import *
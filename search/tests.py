@@ -0,0 +1,109 @@
+# encoding: utf-8
+import datetime
+import json
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+
+from committees.models import Committee, ProtocolPart
+from laws.models import Bill, Vote, PrivateProposal
+from mks.models import Member, MemberAltname
+from search.index import search_index
+from search.tokenizer import tokenize, stems
+
+
+class TokenizerTest(TestCase):
+    def test_tokenize_normalizes_hebrew(self):
+        self.assertEqual(tokenize(u'חוק הגנת הצרכן (תיקון), התשע"ה'),
+                         [u'חוק', u'הגנת', u'הצרכנ', u'תיקונ', u'התשעה'])
+        self.assertEqual(tokenize(u'<p>שָׁלוֹם של</p>', html=True), [u'שלומ'])
+
+    def test_stems(self):
+        self.assertIn(u'חוק', stems(u'והחוק'))
+        self.assertIn(u'חוק', stems(u'בחוק'))
+        self.assertEqual(stems(u'law'), [])
+
+
+class SearchIndexTest(TestCase):
+    def setUp(self):
+        self.bill = Bill.objects.create(stage='1', title=u'חוק הגנת הצרכן')
+        self.other_bill = Bill.objects.create(stage='1', title=u'חוק הדיור')
+        self.vote = Vote.objects.create(title=u'הצבעה על החוק להגנת הצרכן', time=datetime.datetime(2015, 1, 1))
+        self.member = Member.objects.create(name=u'משה כהן')
+
+    def titles(self, query, **kwargs):
+        return [result.document.title for result in search_index.search(query, **kwargs)]
+
+    def test_search_ranks_matching_documents(self):
+        titles = self.titles(u'הגנת הצרכן')
+        self.assertEqual(set(titles[:2]), set([self.bill.title, self.vote.title]))
+        self.assertNotIn(self.member.name, titles)
+
+    def test_search_matches_prefixed_words(self):
+        self.assertIn(self.vote.title, self.titles(u'צרכן'))
+        self.assertIn(self.other_bill.title, self.titles(u'בדיור'))
+
+    def test_search_by_model(self):
+        self.assertEqual(self.titles(u'הצרכן', models=[Vote]), [self.vote.title])
+
+    def test_search_limit(self):
+        self.assertEqual(len(self.titles(u'חוק', limit=1)), 1)
+        self.assertGreater(len(self.titles(u'חוק')), 1)
+
+    def test_corpus_stats_follow_the_index(self):
+        count, average_length = search_index.corpus_stats()
+        self.assertEqual(count, 4)
+        vote_content_type = ContentType.objects.get_for_model(Vote)
+        self.assertEqual(search_index.corpus_stats([vote_content_type.id])[0], 1)
+        Vote.objects.create(title=u'הצבעה שניה', time=datetime.datetime(2015, 1, 2))
+        self.assertEqual(search_index.corpus_stats([vote_content_type.id])[0], 2)
+        self.vote.delete()
+        self.assertEqual(search_index.corpus_stats()[0], 4)
+
+    def test_index_follows_changes(self):
+        self.other_bill.title = u'חוק החינוך'
+        self.other_bill.save()
+        self.assertEqual(self.titles(u'דיור'), [])
+
+        PrivateProposal.objects.create(title=u'הצעת חוק', bill=self.other_bill,
+                                       content_html=u'<p>דיור ציבורי</p>')
+        self.assertEqual(self.titles(u'דיור'), [self.other_bill.title])
+
+        MemberAltname.objects.create(member=self.member, name=u'מוישה')
+        self.assertEqual(self.titles(u'מוישה'), [self.member.name])
+
+        self.vote.delete()
+        self.assertEqual(self.titles(u'הצבעה'), [])
+
+    def test_reparsed_protocol_is_indexed(self):
+        committee = Committee.objects.create(name=u'ועדת הכלכלה')
+        meeting = committee.meetings.create(date=datetime.datetime(2015, 1, 1),
+                                            protocol_text=u'משה כהן:\nהגנת הצרכן')
+        meeting.create_protocol_parts()
+        part_ids = [result.document.object_id for result in search_index.search(u'הצרכן', models=[ProtocolPart])]
+        self.assertTrue(part_ids)
+        self.assertEqual(part_ids, list(meeting.parts.filter(body__contains=u'הצרכן').values_list('id', flat=True)))
+
+        meeting.protocol_text = u'משה כהן:\nמחירי הדיור'
+        meeting.save()
+        meeting.reparse_protocol(redownload=False)
+        self.assertEqual(search_index.search(u'הצרכן', models=[ProtocolPart]), [])
+        part_ids = [result.document.object_id for result in search_index.search(u'הדיור', models=[ProtocolPart])]
+        self.assertTrue(part_ids)
+        self.assertEqual(part_ids, list(meeting.parts.filter(body__contains=u'הדיור').values_list('id', flat=True)))
+
+    def test_rebuild(self):
+        self.assertEqual(search_index.rebuild([Bill, Member]), 3)
+        self.assertIn(self.bill.title, self.titles(u'הצרכן'))
+
+    def test_api(self):
+        res = self.client.get('/api/v2/search/', {'q': u'הצרכן', 'type': 'bill', 'format': 'json'})
+        self.assertEqual(res.status_code, 200)
+        objects = json.loads(res.content)['objects']
+        self.assertEqual([(o['type'], o['id']) for o in objects], [('bill', self.bill.id)])
+
+    def test_view(self):
+        res = self.client.get(reverse('local-search'), {'q': u'משה'})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([result.document.object_id for result in res.context['results']], [self.member.id])
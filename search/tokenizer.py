@@ -0,0 +1,61 @@
+# encoding: utf-8
+"""
+Hebrew aware tokenization for the search index.
+
+Text is normalized (lower case, no niqqud, no final letter forms, no
+geresh/gershayim inside abbreviations) and split into words. Hebrew words
+often carry one or more prefix letters (ו, ה, ב, כ, ל, מ, ש), so every
+word also yields the stems left after stripping its possible prefixes,
+e.g. "והחוק" yields "חוק" as well.
+"""
+import re
+
+from django.utils.html import strip_tags
+
+NIQQUD_RE = re.compile(u'[\u0591-\u05c7]')
+# quotes inside words are abbreviation marks, e.g. צה"ל or ח'כ
+ABBREVIATION_MARK_RE = re.compile(u'(?<=\\w)[\'"\u05f3\u05f4](?=\\w)', re.UNICODE)
+WORD_RE = re.compile(u'\\w+', re.UNICODE)
+HEBREW_WORD_RE = re.compile(u'^[\u05d0-\u05ea]')
+
+FINAL_LETTERS = dict((ord(final), regular) for final, regular in (
+    (u'ך', u'כ'), (u'ם', u'מ'), (u'ן', u'נ'), (u'ף', u'פ'), (u'ץ', u'צ')))
+
+# longest first, so a word yields its shortest stem last
+PREFIXES = sorted([
+    u'ו', u'ה', u'ב', u'כ', u'ל', u'מ', u'ש',
+    u'וה', u'וב', u'וכ', u'ול', u'ומ', u'וש',
+    u'שה', u'שב', u'שכ', u'של', u'שמ', u'מה', u'כש', u'לכש', u'מש',
+    u'ושה', u'ושב', u'ושל', u'ושמ', u'וכש', u'ולכש', u'ומה',
+], key=len, reverse=True)
+MIN_STEM_LENGTH = 2
+
+STOP_WORDS = frozenset(u'''
+של את על עם זה זו זאת לא כי גם הוא היא הם הן אני אנחנו אתה אם או יש אין כל מה
+אבל רק עוד כבר אשר כמו לפי בין עד אל
+'''.translate(FINAL_LETTERS).split())
+
+
+def normalize(text):
+    text = NIQQUD_RE.sub(u'', text.lower())
+    text = ABBREVIATION_MARK_RE.sub(u'', text)
+    return text.translate(FINAL_LETTERS)
+
+
+def tokenize(text, html=False):
+    """Returns the normalized words of the given text, without stop words"""
+    if not text:
+        return []
+    if html:
+        text = strip_tags(text)
+    return [word for word in WORD_RE.findall(normalize(text))
+            if (len(word) > 1 or word.isdigit()) and word not in STOP_WORDS]
+
+
+def stems(word):
+    """Returns the stems of a normalized word after stripping each of its
+    possible Hebrew prefixes"""
+    if not HEBREW_WORD_RE.match(word):
+        return []
+    return [word[len(prefix):] for prefix in PREFIXES
+            if word.startswith(prefix) and len(word) - len(prefix) >= MIN_STEM_LENGTH]
@@ -0,0 +1,36 @@
+from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.shortcuts import render_to_response
+from django.template import RequestContext
+
+from search.api import get_search_models
+from search.index import search_index
+
+RESULTS_PER_PAGE = 20
+MAX_RESULTS = 200
+
+
+def local_search(request):
+    ''' ranked search over the site's own data, using the local search index '''
+    query = request.GET.get('q', '').strip()
+    try:
+        models = get_search_models(request.GET.get('type'))
+    except ValueError:
+        models = None
+    results = search_index.search(query, models=models, limit=MAX_RESULTS) if query else []
+
+    paginator = Paginator(results, RESULTS_PER_PAGE)
+    try:
+        page = paginator.page(request.GET.get('page', 1))
+    except PageNotAnInteger:
+        page = paginator.page(1)
+    except EmptyPage:
+        page = paginator.page(paginator.num_pages)
+
+    return render_to_response('search/local_search.html', RequestContext(request, {
+        'query': query,
+        'type': request.GET.get('type', ''),
+        'paginator': paginator,
+        'page_obj': page,
+        'results': page.object_list,
+        'has_search': True,
+    }))
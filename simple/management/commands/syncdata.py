@@ -24,8 +24,12 @@ from knesset.utils import cannonize
 from knesset.utils import send_chat_notification
 from laws.models import (Vote, Bill, Law, PrivateProposal,
                          KnessetProposal, GovProposal, GovLegislationCommitteeDecision)
+from laws.duplicates import plan_duplicate_merges
+from laws.voting_statistics import rebuild_voting_statistics
 from links.models import Link
-from mks.models import Member, WeeklyPresence, Knesset
+from mks.models import Member, Knesset
+from mks.party_stats import refresh_party_stats
+from mks.rankings import refresh_member_rankings
 
 from persons.models import Person, PersonAlias
 
@@ -37,7 +41,8 @@ from simple.parsers import parse_laws
 from simple.parsers import parse_remote
 from simple.parsers.parse_gov_legislation_comm import ParseGLC
 
-from simple.parsers import parse_presence
+from simple.presence import update_presence as update_weekly_presence
+from simple.proposal_matcher import find_proposals_in_other_data
 from syncdata_globals import p_explanation, strong_explanation, explanation
 
 ENCODING = 'utf8'
@@ -70,7 +75,9 @@ class Command(NoArgsDbLogCommand):
         make_option('--update', action='store_true', dest='update',
                     help="online update of data."),
         make_option('--update-run-only', action='store', dest='update-run-only',
-                    help="only run update for the provided functions. Should contain comma-seperated list of functions to run.")
+                    help="only run update for the provided functions. Should contain comma-seperated list of functions to run."),
+        make_option('--proposals-days', action='store', type='int', dest='proposals_days', default=60,
+                    help="look for proposals in the committee meetings of this many last days (0 for all of them)."),
     )
     help = "Downloads data from sources, parses it and loads it to the Django DB."
 
@@ -80,6 +87,7 @@ class Command(NoArgsDbLogCommand):
 
     last_downloaded_vote_id = 0
     last_downloaded_member_id = 0
+    proposals_days = 60
 
     def _handle_noargs(self, **options):
         global logger
@@ -92,6 +100,7 @@ class Command(NoArgsDbLogCommand):
         update = options.get('update', False)
         laws = options.get('laws', False)
         presence = options.get('presence', False)
+        self.proposals_days = options.get('proposals_days', self.proposals_days)
 
         if all_options:
             process = True
@@ -132,7 +141,10 @@ class Command(NoArgsDbLogCommand):
                          'update_mk_role_descriptions',
                          'update_mks_is_current',
                          # 'update_gov_law_decisions',
-                         'correct_votes_matching']:
+                         'correct_votes_matching',
+                         'rebuild_voting_statistics',
+                         'update_member_rankings',
+                         'update_party_stats']:
                 # in case update_run_only is none, we run all stages
                 if (update_run_only is None) or (func in update_run_only):
                     try:
@@ -247,6 +259,19 @@ class Command(NoArgsDbLogCommand):
         updated = Member.objects.exclude(id__in=mks_ids).update(is_current=False)
         logger.info('updated %d mks to is_current=False' % updated)
 
+    def rebuild_voting_statistics(self):
+        """Recompute the member and party vote counters, the party ones
+        change when members switch parties or a new knesset starts"""
+        rebuild_voting_statistics()
+
+    def update_member_rankings(self):
+        """Recompute the current knesset rankings shown in the members list"""
+        refresh_member_rankings()
+
+    def update_party_stats(self):
+        """Recompute the cached statistics of the party list pages"""
+        refresh_party_stats()
+
     def get_search_string(self, s):
         if isinstance(s, unicode):
             s = s.replace(u'\u201d', '').replace(u'\u2013', '')
@@ -441,45 +466,10 @@ class Command(NoArgsDbLogCommand):
     def update_presence(self):
         logger.info("Starting to update presence")
         try:
-            (presence, valid_weeks) = parse_presence.parse_presence(filename=os.path.join(DATA_ROOT, 'presence.txt.gz'))
-
+            update_weekly_presence(os.path.join(DATA_ROOT, 'presence.txt.gz'))
         except IOError:
             logger.error('Can\'t find presence file')
             return
-        todays_timestamp = datetime.date.today().isocalendar()[:2]
-        c = [b[0][0] for b in presence.values()]
-        c.sort()
-        min_timestamp = c[0]
-        c = None
-
-        for member in Member.current_members.all():
-            logger.info("Trying to update presence for %s" % member.pk)
-            if member.id not in presence:
-                logger.error('member %s (id=%d) not found in presence data', member.name, member.id)
-                continue
-            member_presence = dict(zip([b[0] for b in presence[member.id]], [b[1] for b in presence[member.id]]))
-
-            end_timestamp = todays_timestamp
-
-            start_date = member.start_date or datetime.datetime.utcnow()
-            current_timestamp = (start_date + datetime.timedelta(7)).isocalendar()[
-                                :2]  # start searching on the monday after member joined the knesset
-            if current_timestamp < min_timestamp:  # we don't have info in the current file that goes back so far
-                current_timestamp = min_timestamp
-
-            while current_timestamp <= end_timestamp:  # loop over weeks
-                if current_timestamp in valid_weeks:  # if we have valid data for this week
-                    if current_timestamp in member_presence:  # if this member was present this week
-                        hours = member_presence[current_timestamp]  # check how many hours
-                    else:
-                        hours = 0.0  # not present at all this week = 0 hours
-                    date = iso_to_gregorian(*current_timestamp, iso_day=0)  # get real date of the week's monday
-                    (wp, created) = WeeklyPresence.objects.get_or_create(member=member, date=date,
-                                                                         defaults={'hours': hours})
-                    wp.save()
-                else:
-                    date = iso_to_gregorian(*current_timestamp, iso_day=0)
-                current_timestamp = (date + datetime.timedelta(8)).isocalendar()[:2]
         logger.info('Finished updating presence')
 
     def update_private_proposal_content_html(self, pp):
@@ -701,135 +691,17 @@ class Command(NoArgsDbLogCommand):
 
     def find_proposals_in_other_data(self):
         """
-        Find proposals in other data (committee meetings, votes).
-        Calculates the cannonical names and then calls specific functions to do the actual work
-        """
-        gps = GovProposal.objects.values('id', 'title', 'law__title')
-        for gp in gps:
-            gp['t1'] = gp['law__title'] + ' ' + gp['title']
-            gp['c1'] = cannonize(gp['law__title'] + gp['title'])
-            gp['c2'] = cannonize(gp['title'] + gp['law__title'])
-
-        kps = KnessetProposal.objects.values('id', 'title', 'law__title')
-        for kp in kps:
-            kp['t1'] = kp['law__title'] + ' ' + kp['title']
-            kp['c1'] = cannonize(kp['law__title'] + kp['title'])
-            kp['c2'] = cannonize(kp['title'] + kp['law__title'])
-
-        pps = PrivateProposal.objects.values('id', 'title', 'law__title')
-        for pp in pps:
-            if pp['title'] == 'חוק חדש'.decode('utf8'):
-                pp['c1'] = cannonize(pp['law__title'])
-                pp['t1'] = pp['law__title']
-            else:
-                pp['c1'] = cannonize(pp['law__title'] + pp['title'])
-                pp['t1'] = pp['law__title'] + ' ' + pp['title']
-            pp['c2'] = cannonize(pp['title'] + pp['law__title'])
-
-        self.find_proposals_in_committee_meetings(gps, kps, pps)
-        self.find_proposals_in_votes(gps, kps, pps)
-
-    def find_proposals_in_committee_meetings(self, gps, kps, pps):
-        """
-        Find Private proposals and Knesset proposals in committee meetings. update bills that are connected.
-        kps and pps are dicts computed by find_proposals_in_other_data with canonical names.
+        Find proposals in other data (committee meetings, votes), and link them and their bills.
+        Only the committee meetings of the last proposals_days days are scanned (all of them if 0).
         """
-
-        d = datetime.date.today() - datetime.timedelta(60)  # only look through cms in last 60 days.
-        for cm in CommitteeMeeting.objects.filter(date__gt=d, committee__type='committee').exclude(protocol_text=None):
-            c = cannonize(cm.protocol_text)
-            for gp in gps:
-                if c.find(gp['c1']) >= 0 or c.find(gp['c2']) >= 0:
-                    p = GovProposal.objects.get(pk=gp['id'])
-                    if cm not in p.committee_meetings.all():
-                        p.committee_meetings.add(cm)
-                        if p.bill:
-                            p.bill.second_committee_meetings.add(cm)
-                            p.bill.update_stage()
-                        logger.debug('gov proposal %d found in cm %d' % (p.id, cm.id))
-            for kp in kps:
-                if c.find(kp['c1']) >= 0 or c.find(kp['c2']) >= 0:
-                    p = KnessetProposal.objects.get(pk=kp['id'])
-                    if cm not in p.committee_meetings.all():
-                        p.committee_meetings.add(cm)
-                        if p.bill:
-                            p.bill.second_committee_meetings.add(cm)
-                            p.bill.update_stage()
-
-            for pp in pps:
-                if c.find(pp['c1']) >= 0 or c.find(pp['c2']) >= 0:
-                    p = PrivateProposal.objects.get(pk=pp['id'])
-                    if cm not in p.committee_meetings.all():
-                        p.committee_meetings.add(cm)
-                        if p.bill:
-                            p.bill.first_committee_meetings.add(cm)
-                            p.bill.update_stage()
-
-    def find_proposals_in_votes(self, gps, kps, pps):
-        """
-        Find Private proposals and Knesset proposals in votes. update bills that are connected.
-        kps and pps are dicts computed by find_proposals_in_other_data with canonical names.
-        """
-        votes = Vote.objects.filter(title__contains='חוק').values('id', 'title')
-
-        for v in votes:
-            v['c'] = cannonize(v['title'])
-
-            for gp in gps:
-                if v['c'].find(gp['c1']) >= 0:
-                    p = GovProposal.objects.get(pk=gp['id'])
-                    this_v = Vote.objects.get(pk=v['id'])
-                    if this_v not in p.votes.all():
-                        p.votes.add(this_v)
-                        if p.bill:
-                            p.bill.update_votes()
-                        logger.debug('gov proposal %d found in vote %s' % (p.id, this_v.title))
-
-            for kp in kps:
-                if v['c'].find(kp['c1']) >= 0:
-                    p = KnessetProposal.objects.get(pk=kp['id'])
-                    this_v = Vote.objects.get(pk=v['id'])
-                    if this_v not in p.votes.all():
-                        p.votes.add(this_v)
-                        # print "add KP %d to Vote %d" % (kp['id'], this_v.id)
-                        if p.bill:
-                            p.bill.update_votes()
-
-            for pp in pps:
-                if v['c'].find(pp['c1']) >= 0:
-                    p = PrivateProposal.objects.get(pk=pp['id'])
-                    this_v = Vote.objects.get(pk=v['id'])
-                    if this_v not in p.votes.all():
-                        p.votes.add(this_v)
-
-                        if p.bill:
-                            p.bill.update_votes()
+        find_proposals_in_other_data(days=self.proposals_days or None)
 
     def merge_duplicate_laws(self):
         """Find and merge duplicate laws, and identical bills of each law"""
-
-        laws = Law.objects.values('id', 'title', 'merged_into')
-
-        for l in laws:
-            l['c'] = cannonize(l['title'])
-
-        for (i, l) in enumerate(laws):
-            for j in range(i + 1, len(laws)):
-                l2 = laws[j]
-                if l2['c'] == l['c'] and l2['merged_into'] == None and None == l['merged_into']:
-                    law1 = Law.objects.get(pk=l['id'])
-                    law2 = Law.objects.get(pk=l2['id'])
-                    if law1.bills.count() > law2.bills.count():
-                        law1.merge(law2)
-                    else:
-                        law2.merge(law1)
-
-        for l in Law.objects.all():
-            bills = l.bills.all()
-            for (i, b) in enumerate(bills):
-                for i2 in range(i + 1, len(bills)):
-                    if cannonize(b.title) == cannonize(bills[i2].title):
-                        b.merge(bills[i2])
+        plan = plan_duplicate_merges()
+        for line in plan.report():
+            logger.debug(line)
+        plan.apply()
 
     def correct_votes_matching(self):
         """tries to find votes that are matched to bills in incorrect places
@@ -937,16 +809,3 @@ class Command(NoArgsDbLogCommand):
                         'PrivateProposal %d not found but referenced in GovLegDecision %d' % (pp_id, decision.id))
                 except PrivateProposal.MultipleObjectsReturned:
                     logger.warn('More than 1 PrivateProposal with proposal_id=%d' % pp_id)
-
-
-def iso_year_start(iso_year):
-    "The gregorian calendar date of the first day of the given ISO year"
-    fourth_jan = datetime.date(iso_year, 1, 4)
-    delta = datetime.timedelta(fourth_jan.isoweekday() - 1)
-    return fourth_jan - delta
-
-
-def iso_to_gregorian(iso_year, iso_week, iso_day):
-    "Gregorian calendar date for the given ISO year, week and day"
-    year_start = iso_year_start(iso_year)
-    return year_start + datetime.timedelta(iso_day - 1, 0, 0, 0, 0, 0, iso_week - 1)
@@ -5,6 +5,94 @@ WORKING_HOURS_PER_WEEK = 48.0
 KNESSET_WORKING_DAYS = [0, 1, 2]
 WORKDAY_START = 6.0
 WORKDAY_END = 22.0
+# only weeks with more reports than this (~50 hours sampled) have enough data
+MIN_WEEKLY_REPORTS = 200
+# each report is valid for maximum of 15 minutes
+MAX_REPORT_MINUTES = 15
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def parse_time(s):
+    return datetime.strptime(s, TIME_FORMAT)
+
+
+class PresenceReader(object):
+    """Reads the presence reports file one week at a time.
+
+    Each line of the file is a report: the scrape time, followed by the ids of
+    the members present at that time. Only the per member minutes of the
+    current week are kept in memory.
+
+    After weeks() is consumed, checkpoint holds the (offset, scrape time
+    string, time of the previous line) of the first line of the week that was
+    not finished yet, so a later run can seek there, verify the line is still
+    the same and continue with previous_time.
+    """
+
+    def __init__(self, f, previous_time=None, today=None, first_line=None):
+        """first_line is an (offset, line) already read from f"""
+        self.f = f
+        self.previous_time = previous_time
+        self.todays_timestamp = (today or date.today()).isocalendar()[:2]
+        self.first_line = first_line
+        self.checkpoint = None
+
+    def _lines(self):
+        """Yields (offset, line) for the lines of the file"""
+        if self.first_line is not None:
+            yield self.first_line
+        while True:
+            offset = self.f.tell()
+            line = self.f.readline()
+            if not line:
+                return
+            yield offset, line
+
+    def weeks(self):
+        """Yields (week timestamp, {member id: weekly hours}) for every
+        finished week that had enough reports. a timestamp is a tuple (year,
+        iso week number)"""
+        lines = self._lines()
+        last_time = self.previous_time
+        if last_time is None:
+            try:
+                offset, line = next(lines)
+            except StopIteration:
+                return
+            last_time = parse_time(line.split(',')[0])
+        week = None
+        reports = 0
+        total_minutes = 0
+        member_minutes = {}
+        for offset, line in lines:
+            data = line.split(',')
+            if self.checkpoint is None:
+                self.checkpoint = (offset, data[0], last_time)
+            previous_time, last_time = last_time, parse_time(data[0])
+            scrape_time = last_time
+            time_in_day = scrape_time.hour + scrape_time.minute / 60.0
+            if scrape_time.weekday() not in KNESSET_WORKING_DAYS or not WORKDAY_START <= time_in_day <= WORKDAY_END:
+                continue
+            current_timestamp = scrape_time.isocalendar()[:2]
+            if current_timestamp == self.todays_timestamp:
+                break
+            if current_timestamp != week:  # when we move to the next week, the last one is finished
+                if reports > MIN_WEEKLY_REPORTS and total_minutes:
+                    yield week, dict((member_id, round(float(minutes) / total_minutes * WORKING_HOURS_PER_WEEK))
+                                     for member_id, minutes in member_minutes.iteritems())
+                week = current_timestamp
+                reports = 0
+                total_minutes = 0
+                member_minutes = {}
+                self.checkpoint = (offset, data[0], previous_time)
+
+            minutes = min((scrape_time - previous_time).seconds / 60, MAX_REPORT_MINUTES)
+            reports += 1
+            total_minutes += minutes
+            for x in data[1:]:
+                if x.strip():
+                    member_id = int(x)
+                    member_minutes[member_id] = member_minutes.get(member_id, 0) + minutes
 
 
 def parse_presence(filename=None):
@@ -19,67 +107,13 @@ def parse_presence(filename=None):
     if filename is None:
         filename = 'presence.txt'
     member_totals = dict()
-    totals = dict()
-    total_time = 0.0
-    f = gzip.open(filename, 'r')
-
-    workdays = KNESSET_WORKING_DAYS
-    last_timestamp = None
-    todays_timestamp = date.today().isocalendar()[:2]
-    reports = []
     enough_data = []
-    line = f.readline()
-    data = line.split(',')
-    scrape_time = datetime.strptime(data[0], '%Y-%m-%d %H:%M:%S')
-
-    for line in f:
-        data = line.split(',')
-        last_time = scrape_time
-        scrape_time = datetime.strptime(data[0], '%Y-%m-%d %H:%M:%S')
-        time_in_day = scrape_time.hour + scrape_time.minute / 60.0
-        current_timestamp = scrape_time.isocalendar()[:2]
-
-        if scrape_time.weekday() not in workdays or (time_in_day < WORKDAY_START) or (time_in_day > WORKDAY_END):
-            continue
-        if current_timestamp == todays_timestamp:
-            break
-        if current_timestamp != last_timestamp:  # when we move to next timestamp (week), parse the last weeks data
-            if len(reports) > 200:  # only if we have enough reports from this week (~50 hours sampled)
-                enough_data.append(last_timestamp)  # record that we had enough reports this week
-                subtotals = dict()
-                subtotal_time = 0
-                for presence_report in reports:
-                    minutes = min(presence_report[0], 15)  # each report is valid for maximum of 15 minutes
-                    subtotal_time += minutes
-                    for i in presence_report[1]:
-                        if i in subtotals:
-                            subtotals[i] += minutes
-                        else:
-                            subtotals[i] = minutes
-                for sub_total in subtotals:
-                    if sub_total in totals:
-                        totals[sub_total] += float(subtotals[sub_total])
-                    else:
-                        totals[sub_total] = float(subtotals[sub_total])
-                total_time += subtotal_time
-            else:  # not enough data this week.
-                # if last_timestamp!=None:
-                #    not_enough_data.append(last_timestamp)
-                pass
-            # delete the reports list
-            reports = []
-
-            for total in totals:
-                d = last_timestamp
-                weekly_hours_for_member = round(float(totals[total]) / total_time * WORKING_HOURS_PER_WEEK)
-                if total in member_totals:
-                    member_totals[total].append((d, weekly_hours_for_member))
-                else:
-                    member_totals[total] = [(d, weekly_hours_for_member)]
-            totals = {}
-            total_time = 0.0
-            last_timestamp = scrape_time.isocalendar()[:2]
-
-        # for every report in the file, add it to the array as a tuple: (time, [list of member ids])
-        reports.append(((scrape_time - last_time).seconds / 60, [int(x) for x in data[1:] if len(x.strip()) > 0]))
+    f = gzip.open(filename, 'r')
+    try:
+        for week, hours in PresenceReader(f).weeks():
+            enough_data.append(week)
+            for member_id, member_hours in hours.iteritems():
+                member_totals.setdefault(member_id, []).append((week, member_hours))
+    finally:
+        f.close()
     return member_totals, enough_data
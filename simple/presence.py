@@ -0,0 +1,179 @@
+# encoding: utf-8
+"""
+Incremental update of the members' weekly presence.
+
+The presence reports file only grows, and finished weeks never change, so
+each run continues from the first unfinished week of the previous run (kept
+in a small state file next to the reports file). Only the WeeklyPresence
+rows of the newly finished weeks are created or updated, in bulk, and the
+average weekly presence hours of the affected members are then recalculated
+together.
+"""
+import datetime
+import gzip
+import json
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Avg
+
+from knesset.utils import QUERY_CHUNK_SIZE, chunks
+from mks.distributions import refresh_member_distributions
+from mks.models import Knesset, Member, WeeklyPresence
+from simple.parsers.parse_presence import PresenceReader, parse_time, TIME_FORMAT
+import logging
+
+logger = logging.getLogger("open-knesset.simple.presence")
+
+
+def iso_year_start(iso_year):
+    "The gregorian calendar date of the first day of the given ISO year"
+    fourth_jan = datetime.date(iso_year, 1, 4)
+    delta = datetime.timedelta(fourth_jan.isoweekday() - 1)
+    return fourth_jan - delta
+
+
+def iso_to_gregorian(iso_year, iso_week, iso_day):
+    "Gregorian calendar date for the given ISO year, week and day"
+    year_start = iso_year_start(iso_year)
+    return year_start + datetime.timedelta(iso_day - 1, 0, 0, 0, 0, 0, iso_week - 1)
+
+
+def week_date(timestamp):
+    """The date WeeklyPresence rows of a week timestamp are stored with"""
+    return iso_to_gregorian(*timestamp, iso_day=0)
+
+
+class PresenceState(object):
+    """Where the previous run stopped: the offset of the first line of the
+    unfinished week, that line's scrape time (to verify the file was only
+    appended to), and the scrape time of the line before it"""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.offset = 0
+        self.line_time = None
+        self.previous_time = None
+
+    def load(self):
+        try:
+            with open(self.filename) as f:
+                state = json.load(f)
+        except (IOError, ValueError):
+            return self
+        self.offset = state['offset']
+        self.line_time = state['line_time']
+        self.previous_time = parse_time(state['previous_time'])
+        return self
+
+    def save(self, offset, line_time, previous_time):
+        with open(self.filename, 'w') as f:
+            json.dump({'offset': offset, 'line_time': line_time,
+                       'previous_time': previous_time.strftime(TIME_FORMAT)}, f)
+
+    def reader(self, f, today=None):
+        """Returns a PresenceReader continuing where the previous run stopped,
+        or reading from the start if the file was replaced"""
+        if self.line_time is not None:
+            f.seek(self.offset)
+            line = f.readline()
+            if line.startswith(self.line_time):
+                return PresenceReader(f, previous_time=self.previous_time, today=today,
+                                      first_line=(self.offset, line))
+            logger.warn('presence file changed since the last update, reading it from the start')
+            f.rewind()
+        return PresenceReader(f, today=today)
+
+
+def _member_start_timestamps(members):
+    # start on the monday after the member joined the knesset
+    return dict((member.id, (member.start_date + datetime.timedelta(7)).isocalendar()[:2])
+                for member in members if member.start_date)
+
+
+def upsert_weekly_presence(weeks, members):
+    """Creates or updates the WeeklyPresence rows of the given members for
+    the given weeks. weeks is a list of (week timestamp, {member id: hours}),
+    and members absent from a week get 0 hours - unless they have no presence
+    data at all. Returns the ids of the members whose rows changed"""
+    start_timestamps = _member_start_timestamps(members)
+    present = set(member_id for timestamp, hours in weeks for member_id in hours)
+    present.update(WeeklyPresence.objects.filter(member__in=start_timestamps.keys())
+                   .values_list('member_id', flat=True).distinct())
+
+    desired = {}  # (member id, date) => hours
+    for timestamp, hours in weeks:
+        date = week_date(timestamp)
+        for member_id, start_timestamp in start_timestamps.iteritems():
+            if member_id in present and timestamp >= start_timestamp:
+                desired[(member_id, date)] = hours.get(member_id, 0.0)
+    if not desired:
+        return set()
+
+    dates = set(date for member_id, date in desired)
+    existing = defaultdict(list)
+    for chunk in chunks(dates):
+        for wp_id, member_id, date, hours in WeeklyPresence.objects.filter(date__in=chunk).values_list(
+                'id', 'member_id', 'date', 'hours'):
+            existing[(member_id, date)].append((wp_id, hours))
+
+    changed_members = set()
+    new_rows = []
+    updates = defaultdict(list)  # hours => [WeeklyPresence ids]
+    for key, hours in desired.iteritems():
+        rows = existing.get(key)
+        if not rows:
+            new_rows.append(WeeklyPresence(member_id=key[0], date=key[1], hours=hours))
+            changed_members.add(key[0])
+            continue
+        for wp_id, old_hours in rows:
+            if old_hours != hours:
+                updates[hours].append(wp_id)
+                changed_members.add(key[0])
+
+    with transaction.atomic():
+        WeeklyPresence.objects.bulk_create(new_rows, batch_size=QUERY_CHUNK_SIZE)
+        for hours, ids in updates.iteritems():
+            for chunk in chunks(ids):
+                WeeklyPresence.objects.filter(id__in=chunk).update(hours=hours)
+    logger.info('created %d and updated %d weekly presence rows' % (
+        len(new_rows), sum(len(ids) for ids in updates.itervalues())))
+    return changed_members
+
+
+def recalc_average_weekly_presence_hours(member_ids):
+    """Recalculates Member.average_weekly_presence_hours (over the current
+    knesset) of the given members, with a single aggregate query"""
+    knesset = Knesset.objects.current_knesset()
+    averages = {}
+    for chunk in chunks(member_ids):
+        averages.update(WeeklyPresence.objects.filter(member__in=chunk, date__gte=knesset.start_date)
+                        .values_list('member').annotate(Avg('hours')))
+    by_average = defaultdict(list)
+    for member_id in member_ids:
+        average = averages.get(member_id)
+        by_average[round(average, 1) if average is not None else None].append(member_id)
+    for average, ids in by_average.iteritems():
+        for chunk in chunks(ids):
+            Member.objects.filter(id__in=chunk).update(average_weekly_presence_hours=average)
+
+
+def update_presence(filename, state_filename=None, today=None):
+    """Updates the weekly presence of the current members from the reports
+    that were added to filename since the last update"""
+    state = PresenceState(state_filename or filename + '.state').load()
+    f = gzip.open(filename, 'r')
+    try:
+        reader = state.reader(f, today=today)
+        weeks = list(reader.weeks())
+    finally:
+        f.close()
+
+    if weeks:
+        changed = upsert_weekly_presence(weeks, Member.current_members.all())
+        recalc_average_weekly_presence_hours(changed)
+        refresh_member_distributions()
+    if reader.checkpoint is not None:
+        state.save(*reader.checkpoint)
+    logger.info('updated presence of %d weeks' % len(weeks))
+    return len(weeks)
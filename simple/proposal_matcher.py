@@ -0,0 +1,150 @@
+# encoding: utf-8
+"""
+Finds the bill proposals mentioned in committee meeting protocols and in vote
+titles, and links them.
+
+The cannonized titles of all the proposals are compiled into one
+PatternMatcher, so each protocol or vote title is scanned once for all of
+them. The new links are then created in bulk, and each affected bill is
+updated once.
+"""
+import datetime
+from collections import defaultdict
+
+from committees.models import CommitteeMeeting
+from knesset.pattern_matcher import PatternMatcher
+from knesset.utils import QUERY_CHUNK_SIZE, cannonize, chunks
+from laws.models import Bill, Vote, PrivateProposal, KnessetProposal, GovProposal
+import logging
+
+logger = logging.getLogger("open-knesset.simple.proposal_matcher")
+
+PROPOSAL_MODELS = (GovProposal, KnessetProposal, PrivateProposal)
+NEW_LAW_TITLE = u'חוק חדש'
+# the bill committee meetings linked to a proposal's meetings
+BILL_MEETINGS_FIELDS = {
+    GovProposal: 'second_committee_meetings',
+    KnessetProposal: 'second_committee_meetings',
+    PrivateProposal: 'first_committee_meetings',
+}
+def proposal_titles(model, title, law_title):
+    """Returns the (primary, alternative) cannonized titles of a proposal.
+    Committee meetings are matched by both, votes only by the primary"""
+    law_title = law_title or u''
+    if model is PrivateProposal and title == NEW_LAW_TITLE:
+        primary = cannonize(law_title)
+    else:
+        primary = cannonize(law_title + title)
+    return primary, cannonize(title + law_title)
+
+
+def add_m2m_links(model, field_name, pairs):
+    """Adds the (model id, related id) pairs to the many to many field, in
+    bulk. Returns the pairs that were not linked already"""
+    field = model._meta.get_field(field_name)
+    through = field.rel.through
+    source, target = '%s_id' % field.m2m_field_name(), '%s_id' % field.m2m_reverse_field_name()
+    pairs = set(pairs)
+    existing = set()
+    for chunk in chunks(set(source_id for source_id, target_id in pairs)):
+        existing.update(through.objects.filter(**{'%s__in' % source: chunk}).values_list(source, target))
+    new_pairs = pairs - existing
+    through.objects.bulk_create([through(**{source: source_id, target: target_id})
+                                 for source_id, target_id in new_pairs], batch_size=QUERY_CHUNK_SIZE)
+    return new_pairs
+
+
+class ProposalMatcher(object):
+    def __init__(self):
+        # (model, proposal id) => bill id
+        self.bills = {}
+        self.primary = PatternMatcher()
+        self.alternative = PatternMatcher()
+        for model in PROPOSAL_MODELS:
+            for proposal_id, title, law_title, bill_id in model.objects.values_list('id', 'title', 'law__title',
+                                                                                   'bill_id'):
+                key = (model, proposal_id)
+                self.bills[key] = bill_id
+                primary, alternative = proposal_titles(model, title, law_title)
+                self.primary.add(primary, key)
+                self.alternative.add(alternative, key)
+
+    def find_in_text(self, text):
+        """Returns the (model, proposal id) of the proposals mentioned in
+        text, by either of their titles"""
+        text = cannonize(text)
+        return self.primary.find_all(text) | self.alternative.find_all(text)
+
+    def find_in_title(self, title):
+        """Returns the (model, proposal id) of the proposals mentioned in a
+        vote title, by their primary title"""
+        return self.primary.find_all(cannonize(title))
+
+    def _group_by_model(self, matches):
+        pairs = defaultdict(set)
+        for (model, proposal_id), object_id in matches:
+            pairs[model].add((proposal_id, object_id))
+        return pairs
+
+    def link_committee_meetings(self, meetings):
+        """Links the proposals mentioned in the protocols of the given
+        meetings, and the proposals' bills, to the meetings. Returns the
+        number of new proposal links"""
+        matches = set()
+        for meeting_id, protocol_text in meetings.values_list('id', 'protocol_text').iterator():
+            for key in self.find_in_text(protocol_text or u''):
+                matches.add((key, meeting_id))
+
+        linked = 0
+        bill_pairs = defaultdict(set)
+        for model, pairs in self._group_by_model(matches).iteritems():
+            new_pairs = add_m2m_links(model, 'committee_meetings', pairs)
+            linked += len(new_pairs)
+            for proposal_id, meeting_id in new_pairs:
+                logger.debug('%s %d found in cm %d' % (model._meta.verbose_name, proposal_id, meeting_id))
+                bill_id = self.bills[(model, proposal_id)]
+                if bill_id:
+                    bill_pairs[BILL_MEETINGS_FIELDS[model]].add((bill_id, meeting_id))
+
+        bill_ids = set()
+        for field_name, pairs in bill_pairs.iteritems():
+            add_m2m_links(Bill, field_name, pairs)
+            bill_ids.update(bill_id for bill_id, meeting_id in pairs)
+        for chunk in chunks(bill_ids):
+            for bill in Bill.objects.filter(id__in=chunk):
+                bill.update_stage()
+        return linked
+
+    def link_votes(self, votes):
+        """Links the proposals mentioned in the titles of the given votes to
+        the votes, and updates the votes of the proposals' bills. Returns the
+        number of new proposal links"""
+        matches = set()
+        for vote_id, title in votes.values_list('id', 'title').iterator():
+            for key in self.find_in_title(title):
+                matches.add((key, vote_id))
+
+        linked = 0
+        bill_ids = set()
+        for model, pairs in self._group_by_model(matches).iteritems():
+            new_pairs = add_m2m_links(model, 'votes', pairs)
+            linked += len(new_pairs)
+            bill_ids.update(self.bills[(model, proposal_id)] for proposal_id, vote_id in new_pairs)
+        bill_ids.discard(None)
+        for chunk in chunks(bill_ids):
+            for bill in Bill.objects.filter(id__in=chunk):
+                bill.update_votes()
+        return linked
+
+
+def find_proposals_in_other_data(days=60):
+    """Links proposals to the committee meetings of the last days (or of
+    all time, if days is None) and to the law votes mentioning them"""
+    matcher = ProposalMatcher()
+    meetings = CommitteeMeeting.objects.filter(committee__type='committee').exclude(protocol_text=None)
+    if days is not None:
+        meetings = meetings.filter(date__gt=datetime.date.today() - datetime.timedelta(days))
+    linked_meetings = matcher.link_committee_meetings(meetings)
+    linked_votes = matcher.link_votes(Vote.objects.filter(title__contains=u'חוק'))
+    logger.info('linked proposals to %d committee meetings and %d votes' % (linked_meetings, linked_votes))
+    return linked_meetings, linked_votes
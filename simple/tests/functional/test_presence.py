@@ -0,0 +1,94 @@
+# encoding: utf-8
+import datetime
+import gzip
+import json
+import os
+import shutil
+import tempfile
+
+from django.test import TestCase
+
+from mks.models import Knesset, Member, Party, WeeklyPresence
+from simple.parsers.parse_presence import parse_presence
+from simple.presence import update_presence
+
+# mondays of three consecutive weeks
+WEEKS = [datetime.date(2016, 1, 4), datetime.date(2016, 1, 11), datetime.date(2016, 1, 18)]
+
+
+def write_reports(filename, weeks, member_ids):
+    """Writes a report every 10 minutes of the knesset working days of the
+    given weeks, with the first member always present and the second only in
+    the mornings"""
+    with gzip.open(filename, 'ab') as f:
+        for monday in weeks:
+            for day in xrange(3):
+                start = datetime.datetime.combine(monday + datetime.timedelta(day), datetime.time(6))
+                for i in xrange(97):
+                    scrape_time = start + datetime.timedelta(minutes=10 * i)
+                    present = [member_ids[0]]
+                    if scrape_time.hour < 14:
+                        present.append(member_ids[1])
+                    f.write('%s,%s\n' % (scrape_time.strftime('%Y-%m-%d %H:%M:%S'),
+                                         ','.join(str(member_id) for member_id in present)))
+
+
+class UpdatePresenceTest(TestCase):
+    def setUp(self):
+        super(UpdatePresenceTest, self).setUp()
+        knesset = Knesset.objects.create(number=1, start_date=datetime.date(2015, 1, 1))
+        party = Party.objects.create(name='party', knesset=knesset)
+        self.mk_1 = Member.objects.create(name='mk 1', current_party=party, start_date=datetime.date(2015, 1, 1))
+        self.mk_2 = Member.objects.create(name='mk 2', current_party=party, start_date=datetime.date(2015, 1, 1))
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'presence.txt.gz')
+        self.today = datetime.date(2016, 2, 1)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        super(UpdatePresenceTest, self).tearDown()
+
+    def test_reader_matches_full_parse(self):
+        write_reports(self.filename, WEEKS, [self.mk_1.id, self.mk_2.id])
+        member_totals, enough_data = parse_presence(self.filename)
+        # the last week is only finished when the next week starts
+        self.assertEqual(enough_data, [(2016, 1), (2016, 2)])
+        self.assertEqual(member_totals[self.mk_1.id], [((2016, 1), 48.0), ((2016, 2), 48.0)])
+
+    def test_continues_from_the_unfinished_week(self):
+        member_ids = [self.mk_1.id, self.mk_2.id]
+        write_reports(self.filename, WEEKS[:2], member_ids)
+        self.assertEqual(update_presence(self.filename, today=self.today), 1)
+        self.assertEqual(WeeklyPresence.objects.count(), 2)
+
+        write_reports(self.filename, WEEKS[2:] + [datetime.date(2016, 1, 25)], member_ids)
+        self.assertEqual(update_presence(self.filename, today=self.today), 2)
+        self.assertEqual(WeeklyPresence.objects.filter(member=self.mk_1).count(), 3)
+        self.assertEqual(update_presence(self.filename, today=self.today), 0)
+        self.assertEqual(WeeklyPresence.objects.count(), 6)
+
+        mk_1 = Member.objects.get(pk=self.mk_1.pk)
+        mk_2 = Member.objects.get(pk=self.mk_2.pk)
+        self.assertEqual(mk_1.average_weekly_presence_hours, 48.0)
+        self.assertEqual(mk_2.average_weekly_presence_hours, mk_2.average_weekly_presence())
+        self.assertTrue(0 < mk_2.average_weekly_presence_hours < 48.0)
+
+    def test_second_run_on_the_same_file(self):
+        write_reports(self.filename, WEEKS, [self.mk_1.id, self.mk_2.id])
+        self.assertEqual(update_presence(self.filename, today=self.today), 2)
+        # the state file points at the first report of the unfinished week
+        with open(self.filename + '.state') as f:
+            state = json.load(f)
+        self.assertEqual(state['line_time'], '2016-01-18 06:00:00')
+        self.assertEqual(state['previous_time'], '2016-01-13 22:00:00')
+        self.assertEqual(update_presence(self.filename, today=self.today), 0)
+        self.assertEqual(WeeklyPresence.objects.count(), 4)
+
+    def test_replaced_file_is_read_from_the_start(self):
+        member_ids = [self.mk_1.id, self.mk_2.id]
+        write_reports(self.filename, WEEKS, member_ids)
+        update_presence(self.filename, today=self.today)
+        os.remove(self.filename)
+        write_reports(self.filename, WEEKS[1:] + [datetime.date(2016, 1, 25)], member_ids)
+        self.assertEqual(update_presence(self.filename, today=self.today), 2)
+        self.assertEqual(WeeklyPresence.objects.filter(member=self.mk_1).count(), 3)
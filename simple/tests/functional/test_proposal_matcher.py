@@ -0,0 +1,43 @@
+# encoding: utf-8
+import datetime
+
+from django.test import TestCase
+
+from committees.models import Committee
+from laws.models import Bill, Law, Vote, PrivateProposal, GovProposal
+from simple.proposal_matcher import ProposalMatcher, find_proposals_in_other_data
+
+
+class ProposalMatcherTest(TestCase):
+    def setUp(self):
+        super(ProposalMatcherTest, self).setUp()
+        self.education_law = Law.objects.create(title=u'חוק החינוך')
+        self.tax_law = Law.objects.create(title=u'חוק מס הכנסה')
+        self.bill = Bill.objects.create(stage='1', title=u'חוק החינוך')
+        self.private_proposal = PrivateProposal.objects.create(title=u'חוק חדש', law=self.education_law,
+                                                               bill=self.bill)
+        self.gov_proposal = GovProposal.objects.create(title=u'(תיקון מס\' 3)', law=self.tax_law)
+        self.committee = Committee.objects.create(name=u'ועדת החינוך')
+        self.meeting = self.committee.meetings.create(date=datetime.date.today(),
+                                                      protocol_text=u'סדר היום: הצעת חוק החינוך, התשע"ו-2016')
+        self.old_meeting = self.committee.meetings.create(date=datetime.date.today() - datetime.timedelta(100),
+                                                          protocol_text=u'חוק מס הכנסה (תיקון מס\' 3)')
+        self.vote = Vote.objects.create(title=u'להעביר את הצעת חוק מס הכנסה (תיקון מס\' 3) לוועדה',
+                                        time=datetime.datetime.now())
+
+    def test_find_in_text(self):
+        matcher = ProposalMatcher()
+        self.assertEqual(matcher.find_in_text(self.meeting.protocol_text),
+                         set([(PrivateProposal, self.private_proposal.id)]))
+        self.assertEqual(matcher.find_in_title(self.vote.title), set([(GovProposal, self.gov_proposal.id)]))
+
+    def test_links_recent_meetings_and_votes(self):
+        self.assertEqual(find_proposals_in_other_data(days=60), (1, 1))
+        self.assertEqual(list(self.private_proposal.committee_meetings.all()), [self.meeting])
+        self.assertEqual(list(self.bill.first_committee_meetings.all()), [self.meeting])
+        self.assertEqual(list(self.gov_proposal.committee_meetings.all()), [])
+        self.assertEqual(list(self.gov_proposal.votes.all()), [self.vote])
+
+        # already linked proposals are not linked again
+        self.assertEqual(find_proposals_in_other_data(days=None), (1, 0))
+        self.assertEqual(list(self.gov_proposal.committee_meetings.all()), [self.old_meeting])
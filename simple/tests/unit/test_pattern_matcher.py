@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*
+import unittest
+
+from knesset.pattern_matcher import PatternMatcher
+
+
+class TestPatternMatcher(unittest.TestCase):
+
+    def test_finds_overlapping_patterns(self):
+        matcher = PatternMatcher([('he', 1), ('she', 2), ('his', 3), ('hers', 4)])
+        self.assertEqual(sorted(matcher.iter_matches('ushers')), [(1, 4, 2), (2, 4, 1), (2, 6, 4)])
+        self.assertEqual(matcher.find_all('ahishers'), set([1, 2, 3, 4]))
+
+    def test_patterns_added_after_a_scan(self):
+        matcher = PatternMatcher([(u'חוק', 1)])
+        self.assertEqual(matcher.find_all(u'הצעתחוקהחינוך'), set([1]))
+        matcher.add(u'החינוך', 2)
+        matcher.add(u'', 3)
+        self.assertEqual(matcher.find_all(u'הצעתחוקהחינוך'), set([1, 2]))
+
+    def test_matches_word_sequences(self):
+        matcher = PatternMatcher([(('a', 'b'), 'ab'), (('b',), 'b')])
+        self.assertEqual(matcher.find_all(['x', 'a', 'b']), set(['ab', 'b']))
+        self.assertEqual(matcher.find_all(['a', 'x', 'b']), set(['b']))
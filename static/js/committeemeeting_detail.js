@@ -92,7 +92,7 @@ $(function () {
         } else {
             if (!$("#annotationform-" + annoid).length) {
                 var speech_part = {id: annoid, length: window.parts_lengths[annoid]};
-                $("#annotations-" + annoid).before(tmpl("annotationform", {speech_part: speech_part}))
+                $("#annotations-" + annoid).before(tmpl("annotationform", {speech_part: speech_part, csrf_token: window.csrf_token}))
                 $(".annotationform-cancel").click(function (e) {
                     e.preventDefault();
                     var annoid = $(this).attr("id").split("-")[1];
@@ -137,6 +137,10 @@ $(function () {
         }
         return confirm(gettext('Delete can not be un-done. Are you sure?'));
     });
+    // the protocol is cached for all users, so its forms take the token from the page
+    $(document).on("submit", ".reallydelete", function (e) {
+        $(this).children('[name=csrfmiddlewaretoken]').val(window.csrf_token);
+    });
     $(".annotationflagselect").change(function (e) {
         var id = $(this).parents("form").attr("id").split("-")[1];
         var val = parseInt($(this).val());